@@ -1,5 +1,20 @@
 """RepoRelay package."""
 
 __all__ = [
+    "admission",
+    "automations",
+    "diffs",
+    "dispatch",
+    "fairshare",
+    "metrics",
+    "outbox",
+    "processed",
+    "profiling",
+    "projects",
+    "records",
+    "related",
+    "throttle",
+    "tracing",
     "watcher",
+    "webhook",
 ]
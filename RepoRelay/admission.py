@@ -0,0 +1,126 @@
+"""
+Host-aware admission control for runner processes.
+
+Before a job's command is started, ``Admission.check`` looks at the 1-minute
+load average per CPU, ``MemAvailable`` from ``/proc/meminfo`` and the number
+of runner processes already on the host (any user of the same command,
+found by scanning ``/proc``). When the host is past a threshold the job is
+deferred: its triggers stay queued and are retried on a later pass, so
+nothing is dropped and the poll loop keeps running.
+
+``resource_limits`` builds the ``preexec_fn`` that applies optional
+``RLIMIT_AS``/``RLIMIT_CPU`` limits and a ``nice`` increment to each job.
+"""
+
+import os
+import resource
+from pathlib import Path
+from typing import Callable, Optional
+
+from . import metrics
+
+DEFERRED = metrics.REGISTRY.counter("reporelay_admission_deferred_total", "Job starts deferred by admission control, by reason.")
+
+_PROC = Path("/proc")
+
+
+def load_per_cpu() -> Optional[float]:
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return None
+
+
+def mem_available_mb(meminfo: Path = _PROC / "meminfo") -> Optional[float]:
+    try:
+        with open(meminfo) as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024.0
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def running_processes(command: str, proc: Path = _PROC) -> int:
+    """Processes whose program (or script, under an interpreter) has the basename of ``command``."""
+    name = os.path.basename(command)
+    if not name:
+        return 0
+    count = 0
+    try:
+        entries = os.scandir(proc)
+    except OSError:
+        return 0
+    with entries:
+        for entry in entries:
+            if not entry.name.isdigit():
+                continue
+            try:
+                with open(os.path.join(entry.path, "cmdline"), "rb") as f:
+                    argv = f.read().split(b"\0")[:2]
+            except OSError:
+                continue
+            if any(os.path.basename(arg.decode("utf-8", errors="replace")) == name for arg in argv if arg):
+                count += 1
+    return count
+
+
+class Admission:
+    """Thresholds for starting another job; a threshold of 0 is not checked."""
+
+    def __init__(self, max_load: float = 0.0, min_mem_mb: float = 0.0, max_running: int = 0, command: str = ""):
+        self.max_load = max_load
+        self.min_mem_mb = min_mem_mb
+        self.max_running = max_running
+        self.command = command
+
+    def __bool__(self) -> bool:
+        return bool(self.max_load > 0 or self.min_mem_mb > 0 or self.max_running > 0)
+
+    def check(self) -> Optional[str]:
+        """None when a job may start, otherwise a reason whose first word (load, memory, running) is the metric label."""
+        if self.max_load > 0:
+            load = load_per_cpu()
+            if load is not None and load > self.max_load:
+                return f"load {load:.2f}/cpu > {self.max_load:g}"
+        if self.min_mem_mb > 0:
+            available = mem_available_mb()
+            if available is not None and available < self.min_mem_mb:
+                return f"memory {available:.0f} MB available < {self.min_mem_mb:g} MB"
+        if self.max_running > 0:
+            running = running_processes(self.command)
+            if running >= self.max_running:
+                return f"running {running} runner process(es) >= {self.max_running}"
+        return None
+
+
+def resource_limits(as_mb: int = 0, cpu_seconds: int = 0, nice: int = 0) -> Optional[Callable[[], None]]:
+    """``preexec_fn`` applying the given limits in the child, or None when none are set.
+
+    The function only makes plain system calls, which keeps it safe to run
+    between fork and exec while other threads (outbox, cancel watch) are alive.
+    """
+    if not (as_mb > 0 or cpu_seconds > 0 or nice):
+        return None
+    limits = []
+    if as_mb > 0:
+        limits.append((resource.RLIMIT_AS, as_mb * 1024 * 1024, as_mb * 1024 * 1024))
+    if cpu_seconds > 0:
+        # SIGXCPU at the soft limit, SIGKILL a little later
+        limits.append((resource.RLIMIT_CPU, cpu_seconds, cpu_seconds + 5))
+    # an unprivileged child cannot raise its hard limits, so stay under the current ones
+    capped = []
+    for which, soft, hard in limits:
+        current = resource.getrlimit(which)[1]
+        if current != resource.RLIM_INFINITY:
+            soft, hard = min(soft, current), min(hard, current)
+        capped.append((which, soft, hard))
+
+    def apply() -> None:
+        for which, soft, hard in capped:
+            resource.setrlimit(which, (soft, hard))
+        if nice:
+            os.nice(nice)
+
+    return apply
@@ -0,0 +1,620 @@
+"""
+``.automations/`` orchestrator support: loading, validation and scheduling.
+
+Each discovered repo may carry ``.automations/*.yaml`` (or ``*.yml``) files
+as described in ``docs/automation/README.md``. This module parses them,
+validates them against ``docs/automation/schema/automation.schema.json``
+and keeps every ``schedule`` automation of the fleet in one heap ordered by
+next fire time, so an idle loop only sleeps until the earliest timer.
+Firing (running the command and reporting back) lives in ``watcher.py`` so
+automations share the runner path with comment triggers.
+
+Validation uses a small built-in implementation of the JSON Schema keywords
+the automation schema relies on, so ``jsonschema`` is not required. PyYAML
+is needed to read the files; without it automations are reported as
+unavailable and skipped.
+"""
+
+import calendar
+import datetime as _dt
+import fnmatch
+import hashlib
+import heapq
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    import yaml
+except ImportError:  # pragma: no cover - exercised only without PyYAML
+    yaml = None
+
+AUTOMATIONS_DIR = ".automations"
+DEFAULT_SCHEMA = Path(__file__).resolve().parent.parent / "docs" / "automation" / "schema" / "automation.schema.json"
+DEFAULT_MODEL = {"name": "gpt-5-5", "variant": "gpt-5-codecs", "reasoning": "medium"}
+
+
+class AutomationError(Exception):
+    """An automation file could not be read, parsed or validated."""
+
+
+# ---------------------------------------------------------------------------
+# JSON Schema (the subset used by automation.schema.json)
+# ---------------------------------------------------------------------------
+
+Validator = Callable[[object, str], Tuple[List[str], Set[str]]]
+
+_TYPES = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None,
+}
+
+
+def compile_schema(schema: dict) -> Validator:
+    """Compile ``schema`` into ``validate(value, path) -> (errors, evaluated_property_names)``.
+
+    Supports type, const, enum, required, properties, patternProperties,
+    additionalProperties, unevaluatedProperties, min/maxProperties, items,
+    minItems, uniqueItems, minLength, pattern, minimum, maximum, allOf, anyOf,
+    oneOf, not and if/then/else. Annotation keywords are ignored.
+    """
+    checks: List[Validator] = []
+
+    if "type" in schema:
+        names = schema["type"] if isinstance(schema["type"], list) else [schema["type"]]
+        tests = [_TYPES[n] for n in names]
+
+        def check_type(v, path):
+            if any(t(v) for t in tests):
+                return [], set()
+            return [f"{path}: expected {' or '.join(names)}"], set()
+        checks.append(check_type)
+
+    if "const" in schema:
+        const = schema["const"]
+        checks.append(lambda v, path: ([] if v == const else [f"{path}: must be {const!r}"], set()))
+
+    if "enum" in schema:
+        allowed = schema["enum"]
+        checks.append(lambda v, path: ([] if v in allowed else [f"{path}: must be one of {', '.join(map(str, allowed))}"], set()))
+
+    if "minLength" in schema:
+        n = schema["minLength"]
+        checks.append(lambda v, path: ([f"{path}: shorter than {n}"] if isinstance(v, str) and len(v) < n else [], set()))
+
+    if "pattern" in schema:
+        rx = re.compile(schema["pattern"])
+        checks.append(lambda v, path: ([f"{path}: does not match {rx.pattern}"] if isinstance(v, str) and not rx.search(v) else [], set()))
+
+    if "minimum" in schema or "maximum" in schema:
+        lo, hi = schema.get("minimum"), schema.get("maximum")
+
+        def check_range(v, path):
+            if not _TYPES["number"](v):
+                return [], set()
+            if lo is not None and v < lo:
+                return [f"{path}: below minimum {lo}"], set()
+            if hi is not None and v > hi:
+                return [f"{path}: above maximum {hi}"], set()
+            return [], set()
+        checks.append(check_range)
+
+    if "items" in schema or "minItems" in schema or "uniqueItems" in schema:
+        item_check = compile_schema(schema["items"]) if "items" in schema else None
+        min_items, unique = schema.get("minItems"), schema.get("uniqueItems")
+
+        def check_array(v, path):
+            if not isinstance(v, list):
+                return [], set()
+            errors = []
+            if min_items is not None and len(v) < min_items:
+                errors.append(f"{path}: needs at least {min_items} item(s)")
+            if unique and len({json.dumps(i, sort_keys=True) for i in v}) != len(v):
+                errors.append(f"{path}: items must be unique")
+            if item_check is not None:
+                for i, item in enumerate(v):
+                    errors.extend(item_check(item, f"{path}[{i}]")[0])
+            return errors, set()
+        checks.append(check_array)
+
+    object_keys = ("properties", "patternProperties", "additionalProperties", "required", "minProperties", "maxProperties")
+    if any(k in schema for k in object_keys):
+        props = {k: compile_schema(s) for k, s in schema.get("properties", {}).items()}
+        patterns = [(re.compile(p), compile_schema(s)) for p, s in schema.get("patternProperties", {}).items()]
+        additional = schema.get("additionalProperties", True)
+        additional_check = compile_schema(additional) if isinstance(additional, dict) else None
+        required = schema.get("required", [])
+        min_props, max_props = schema.get("minProperties"), schema.get("maxProperties")
+
+        def check_object(v, path):
+            if not isinstance(v, dict):
+                return [], set()
+            errors = [f"{path}: missing required property {r!r}" for r in required if r not in v]
+            if min_props is not None and len(v) < min_props:
+                errors.append(f"{path}: needs at least {min_props} propert{'y' if min_props == 1 else 'ies'}")
+            if max_props is not None and len(v) > max_props:
+                errors.append(f"{path}: allows at most {max_props} propert{'y' if max_props == 1 else 'ies'}")
+            evaluated = set()
+            for key, value in v.items():
+                sub = f"{path}.{key}"
+                matched = False
+                if key in props:
+                    errors.extend(props[key](value, sub)[0])
+                    matched = True
+                for rx, check in patterns:
+                    if rx.search(str(key)):
+                        errors.extend(check(value, sub)[0])
+                        matched = True
+                if matched:
+                    evaluated.add(key)
+                elif additional is False:
+                    errors.append(f"{path}: unexpected property {key!r}")
+                elif additional_check is not None:
+                    errors.extend(additional_check(value, sub)[0])
+                    evaluated.add(key)
+            return errors, evaluated
+        checks.append(check_object)
+
+    for sub in schema.get("allOf", []):
+        checks.append(compile_schema(sub))
+
+    if "anyOf" in schema:
+        options = [compile_schema(s) for s in schema["anyOf"]]
+
+        def check_any(v, path):
+            results = [o(v, path) for o in options]
+            passing = [r for r in results if not r[0]]
+            if passing:
+                return [], set().union(*(r[1] for r in passing))
+            return [f"{path}: does not match any allowed form"], set()
+        checks.append(check_any)
+
+    if "oneOf" in schema:
+        options = [compile_schema(s) for s in schema["oneOf"]]
+
+        def check_one(v, path):
+            results = [o(v, path) for o in options]
+            passing = [r for r in results if not r[0]]
+            if len(passing) == 1:
+                return [], passing[0][1]
+            if not passing:
+                # report the branch that got furthest: fewest errors, then most properties recognised
+                closest = min(results, key=lambda r: (len(r[0]), -len(r[1])))
+                return [f"{path}: does not match exactly one allowed form"] + closest[0], set()
+            return [f"{path}: matches more than one allowed form"], set()
+        checks.append(check_one)
+
+    if "not" in schema:
+        negated = compile_schema(schema["not"])
+        checks.append(lambda v, path: ([f"{path}: has a disallowed combination of properties"] if not negated(v, path)[0] else [], set()))
+
+    if "if" in schema:
+        cond = compile_schema(schema["if"])
+        then = compile_schema(schema["then"]) if "then" in schema else None
+        other = compile_schema(schema["else"]) if "else" in schema else None
+
+        def check_if(v, path):
+            branch = then if not cond(v, path)[0] else other
+            return branch(v, path) if branch is not None else ([], set())
+        checks.append(check_if)
+
+    unevaluated = schema.get("unevaluatedProperties", True)
+
+    def validate(value, path="$"):
+        errors: List[str] = []
+        evaluated: Set[str] = set()
+        for check in checks:
+            errs, seen = check(value, path)
+            errors.extend(errs)
+            evaluated |= seen
+        # only once everything else passed; a failed branch would otherwise flag every key it owns
+        if unevaluated is False and isinstance(value, dict) and not errors:
+            errors.extend(f"{path}: unexpected property {k!r}" for k in value if k not in evaluated)
+        return errors, evaluated
+
+    return validate
+
+
+def load_validator(schema_path: Path = DEFAULT_SCHEMA) -> Validator:
+    with open(schema_path, "r", encoding="utf-8") as f:
+        return compile_schema(json.load(f))
+
+
+# ---------------------------------------------------------------------------
+# Cron
+# ---------------------------------------------------------------------------
+
+_MONTHS = {m.lower(): i for i, m in enumerate(calendar.month_abbr) if m}
+_DAYS = {"sun": 0, "mon": 1, "tue": 2, "wed": 3, "thu": 4, "fri": 5, "sat": 6}
+
+
+def _cron_field(text: str, lo: int, hi: int, names: Dict[str, int]) -> Tuple[frozenset, bool]:
+    """Expand one cron field; returns ``(values, restricted)`` where ``*`` is unrestricted."""
+    values = set()
+    for part in text.lower().split(","):
+        base, _, step_text = part.partition("/")
+        step = int(step_text) if step_text else 1
+        if step < 1:
+            raise ValueError(f"bad step in {part!r}")
+        if base == "*":
+            start, end = lo, hi
+        elif "-" in base:
+            a, b = base.split("-", 1)
+            start, end = names.get(a, None), names.get(b, None)
+            start = int(a) if start is None else start
+            end = int(b) if end is None else end
+        else:
+            start = names[base] if base in names else int(base)
+            end = hi if step_text else start
+        if not (lo <= start <= hi and lo <= end <= hi) or start > end:
+            raise ValueError(f"{part!r} is outside {lo}-{hi}")
+        values.update(range(start, end + 1, step))
+    return frozenset(values), text != "*"
+
+
+class CronExpr:
+    """A five-field UTC cron expression (``minute hour day month weekday``).
+
+    Lists, ranges, steps and month/weekday names are supported; weekday 7 is
+    Sunday. When both day fields are restricted a day matches either one, as
+    in Vixie cron.
+    """
+
+    __slots__ = ("text", "minutes", "hours", "days", "months", "weekdays", "_dom_any", "_dow_any")
+
+    def __init__(self, text: str):
+        fields = text.split()
+        if len(fields) != 5:
+            raise ValueError(f"cron needs 5 fields, got {len(fields)}: {text!r}")
+        self.text = text
+        self.minutes = sorted(_cron_field(fields[0], 0, 59, {})[0])
+        self.hours = sorted(_cron_field(fields[1], 0, 23, {})[0])
+        self.days, dom_restricted = _cron_field(fields[2], 1, 31, {})
+        self.months = _cron_field(fields[3], 1, 12, _MONTHS)[0]
+        weekdays, dow_restricted = _cron_field(fields[4], 0, 7, _DAYS)
+        self.weekdays = frozenset(d % 7 for d in weekdays)
+        self._dom_any, self._dow_any = not dom_restricted, not dow_restricted
+
+    def _day_matches(self, d: _dt.date) -> bool:
+        if d.month not in self.months:
+            return False
+        dom = d.day in self.days
+        dow = (d.isoweekday() % 7) in self.weekdays
+        if self._dom_any or self._dow_any:
+            return dom and dow
+        return dom or dow
+
+    def next_after(self, ts: float) -> Optional[float]:
+        """First matching minute strictly after epoch ``ts``, or None within five years."""
+        start = _dt.datetime.fromtimestamp(int(ts) // 60 * 60 + 60, _dt.timezone.utc).replace(tzinfo=None)
+        day = start.date()
+        for offset in range(366 * 5):
+            d = day + _dt.timedelta(days=offset)
+            if not self._day_matches(d):
+                continue
+            first = offset == 0
+            for h in self.hours:
+                if first and h < start.hour:
+                    continue
+                for m in self.minutes:
+                    if first and h == start.hour and m < start.minute:
+                        continue
+                    moment = _dt.datetime(d.year, d.month, d.day, h, m, tzinfo=_dt.timezone.utc)
+                    return moment.timestamp()
+        return None
+
+
+def schedule_cron(spec: dict) -> CronExpr:
+    """Turn an ``on.schedule`` block (``cron`` or ``frequency``/``at``) into a ``CronExpr``."""
+    if "cron" in spec:
+        return CronExpr(spec["cron"])
+    hour, minute = (int(x) for x in str(spec.get("at") or "00:00").split(":"))
+    frequency = spec["frequency"]
+    if frequency == "daily":
+        return CronExpr(f"{minute} {hour} * * *")
+    if frequency == "weekly":
+        return CronExpr(f"{minute} {hour} * * {spec['day_of_week']}")
+    # monthly: months without that day are skipped, like cron
+    return CronExpr(f"{minute} {hour} {spec['day_of_month']} * *")
+
+
+# ---------------------------------------------------------------------------
+# Definitions
+# ---------------------------------------------------------------------------
+
+@dataclass
+class Automation:
+    repo: str
+    path: Path
+    name: str
+    trigger: str  # "schedule", "github_issue" or "pull_request"
+    spec: dict
+    run: dict
+    digest: str
+    cron: Optional[CronExpr] = None
+
+    @property
+    def key(self) -> str:
+        """Stable id: repo plus the file's path inside ``.automations/``."""
+        return f"{self.repo}:{self.path.name}"
+
+    @property
+    def target_repo(self) -> str:
+        return self.run.get("repo") or self.repo
+
+    @property
+    def instructions(self) -> str:
+        return self.run["instructions"]
+
+    @property
+    def model(self) -> Dict[str, str]:
+        return {**DEFAULT_MODEL, **(self.run.get("model") or {})}
+
+    @property
+    def command(self) -> Optional[str]:
+        return self.run.get("command")
+
+    def env(self, environ: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """``run.env`` with ``${VAR}`` expanded from the watcher's environment."""
+        environ = os.environ if environ is None else environ
+        return {
+            k: re.sub(r"\$\{([A-Za-z_][A-Za-z0-9_]*)\}", lambda m: environ.get(m.group(1), ""), str(v))
+            for k, v in (self.run.get("env") or {}).items()
+        }
+
+
+def automation_files(repo_path: Path) -> List[Tuple[Path, os.stat_result]]:
+    """``(path, stat)`` of the ``*.yaml``/``*.yml`` files in a repo's ``.automations/``, sorted."""
+    try:
+        entries = list(os.scandir(Path(repo_path) / AUTOMATIONS_DIR))
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+    files = []
+    for entry in entries:
+        if entry.name.endswith((".yaml", ".yml")) and entry.is_file():
+            files.append((Path(entry.path), entry.stat()))
+    return sorted(files, key=lambda f: f[0].name)
+
+
+def parse_automation(repo: str, path: Path, text: str, validate: Validator) -> Automation:
+    """Parse and validate one file; raises ``AutomationError`` with every problem found."""
+    if yaml is None:
+        raise AutomationError("PyYAML is not installed (pip install PyYAML)")
+    try:
+        doc = yaml.safe_load(text)
+    except yaml.YAMLError as e:
+        raise AutomationError(f"invalid YAML: {e}") from None
+    if isinstance(doc, dict) and True in doc and "on" not in doc:
+        # YAML 1.1 reads a bare ``on:`` key as boolean true
+        doc["on"] = doc.pop(True)
+    errors, _ = validate(doc, "$")
+    if errors:
+        raise AutomationError("; ".join(errors))
+    trigger, spec = next(iter(doc["on"].items()))
+    cron = None
+    if trigger == "schedule":
+        try:
+            cron = schedule_cron(spec)
+        except (ValueError, KeyError) as e:
+            raise AutomationError(f"invalid schedule: {e}") from None
+    return Automation(
+        repo=repo,
+        path=path,
+        name=doc["name"],
+        trigger=trigger,
+        spec=spec,
+        run=doc["run"],
+        digest=hashlib.sha1(text.encode("utf-8")).hexdigest(),
+        cron=cron,
+    )
+
+
+def _glob(pattern: str, value: str) -> bool:
+    """Workflow-style glob: ``*`` and ``**`` span directories, and a leading ``**/`` also matches the top level."""
+    if fnmatch.fnmatchcase(value, pattern):
+        return True
+    return pattern.startswith("**/") and fnmatch.fnmatchcase(value, pattern[3:])
+
+
+def pull_request_matches(automation: Automation, base_ref: str, changed_files: Callable[[], List[str]]) -> bool:
+    """Apply the ``branches`` (base branch) and ``paths`` filters of a ``pull_request`` automation.
+
+    Both filters must match when given; any entry of a list may match.
+    ``changed_files`` is only called when a ``paths`` filter needs it.
+    """
+    branches = automation.spec.get("branches")
+    if branches and not any(_glob(b, base_ref) for b in branches):
+        return False
+    paths = automation.spec.get("paths")
+    if paths:
+        files = changed_files()
+        if not any(_glob(p, f) for p in paths for f in files):
+            return False
+    return True
+
+
+# ---------------------------------------------------------------------------
+# Scheduler
+# ---------------------------------------------------------------------------
+
+@dataclass(order=True)
+class _Timer:
+    due: float
+    seq: int
+    key: str = field(compare=False)
+    digest: str = field(compare=False)
+
+
+class Scheduler:
+    """One min-heap of schedule timers for the whole fleet.
+
+    ``sync`` installs, replaces or drops automations; superseded heap entries
+    are skipped lazily when they reach the top. ``last_fired`` (epoch seconds
+    by key, with the digest of the definition that fired) lets one missed slot
+    be caught up after a restart.
+    """
+
+    def __init__(self):
+        self._heap: List[_Timer] = []
+        self._live: Dict[str, Automation] = {}
+        self._seq = 0
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def _push(self, automation: Automation, due: float) -> None:
+        self._seq += 1
+        heapq.heappush(self._heap, _Timer(due, self._seq, automation.key, automation.digest))
+
+    def sync(self, automations: List[Automation], now: float, last_fired: Optional[Dict[str, dict]] = None) -> None:
+        """Make the schedule match ``automations``; ``last_fired`` maps keys to ``{"at", "digest"}``."""
+        last_fired = last_fired or {}
+        wanted = {a.key: a for a in automations if a.trigger == "schedule" and a.cron is not None}
+        for key in list(self._live):
+            if key not in wanted:
+                del self._live[key]
+        for key, automation in wanted.items():
+            current = self._live.get(key)
+            if current is not None and current.digest == automation.digest:
+                continue
+            self._live[key] = automation
+            record = last_fired.get(key) or {}
+            base = record.get("at") if record.get("digest") == automation.digest else None
+            due = automation.cron.next_after(base if base is not None else now)
+            if due is not None:
+                self._push(automation, due)
+
+    def next_due(self) -> Optional[float]:
+        self._drop_stale()
+        return self._heap[0].due if self._heap else None
+
+    def _drop_stale(self) -> None:
+        while self._heap:
+            top = self._heap[0]
+            live = self._live.get(top.key)
+            if live is not None and live.digest == top.digest:
+                return
+            heapq.heappop(self._heap)
+
+    def pop_due(self, now: float) -> List[Tuple[Automation, float]]:
+        """Remove and return ``(automation, scheduled_time)`` for every timer at or before ``now``."""
+        fired = []
+        while True:
+            self._drop_stale()
+            if not self._heap or self._heap[0].due > now:
+                return fired
+            timer = heapq.heappop(self._heap)
+            automation = self._live[timer.key]
+            fired.append((automation, timer.due))
+            nxt = automation.cron.next_after(max(now, timer.due))
+            if nxt is not None:
+                self._push(automation, nxt)
+
+
+# A file modified this recently may change again within the same mtime tick
+# without changing size, so its cache entry is not trusted yet
+_RACY_SECONDS = 2.0
+
+
+@dataclass
+class _Compiled:
+    __slots__ = ("repo", "mtime_ns", "size", "racy", "automation", "error")
+    repo: str
+    mtime_ns: int
+    size: int
+    racy: bool
+    automation: Optional[Automation]
+    error: str
+
+
+class AutomationRegistry:
+    """The automations of every watched repo, plus the fleet-wide schedule.
+
+    Compiled definitions (parsed YAML, validation result, parsed cron) are
+    cached by file path and only rebuilt when the file's mtime or size
+    changes, so a refresh of an unchanged fleet costs one ``scandir`` per
+    repo. Invalid files are cached with their error, which ``refresh``
+    returns once per version of the file.
+    """
+
+    def __init__(self, validate: Validator):
+        self.validate = validate
+        self.by_repo: Dict[str, List[Automation]] = {}
+        self.scheduler = Scheduler()
+        self._cache: Dict[Path, _Compiled] = {}
+        self.compiled = 0
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def _compile(self, repo: str, path: Path, stat: os.stat_result, now: float) -> _Compiled:
+        self.compiled += 1
+        racy = now - stat.st_mtime < _RACY_SECONDS
+        try:
+            automation = parse_automation(repo, path, path.read_text(encoding="utf-8"), self.validate)
+        except (AutomationError, OSError, UnicodeDecodeError) as e:
+            return _Compiled(repo, stat.st_mtime_ns, stat.st_size, racy, None, str(e))
+        return _Compiled(repo, stat.st_mtime_ns, stat.st_size, racy, automation, "")
+
+    def refresh(self, repos: Dict[str, Path], now: float, last_fired: Optional[Dict[str, dict]] = None) -> Dict[Path, str]:
+        """Pick up changes in the ``.automations/`` of ``repos`` and resync the schedule.
+
+        Returns the errors of files that were (re)compiled in this call, so each
+        broken version of a file is reported once.
+        """
+        errors: Dict[Path, str] = {}
+        by_repo: Dict[str, List[Automation]] = {}
+        seen = set()
+        changed = False
+        for repo, repo_path in repos.items():
+            found = []
+            for path, stat in automation_files(repo_path):
+                seen.add(path)
+                entry = self._cache.get(path)
+                if (entry is None or entry.racy or entry.repo != repo
+                        or entry.mtime_ns != stat.st_mtime_ns or entry.size != stat.st_size):
+                    previous = entry
+                    entry = self._cache[path] = self._compile(repo, path, stat, now)
+                    changed = True
+                    # a racy entry re-read unchanged keeps quiet about an error already reported
+                    same = previous is not None and (previous.mtime_ns, previous.size, previous.error) == (
+                        entry.mtime_ns, entry.size, entry.error)
+                    if entry.error and not same:
+                        errors[path] = entry.error
+                if entry.automation is not None:
+                    found.append(entry.automation)
+            if found:
+                by_repo[repo] = found
+        for path in [p for p in self._cache if p not in seen]:
+            del self._cache[path]
+            changed = True
+        self.by_repo = by_repo
+        if changed:
+            self.scheduler.sync([a for found in by_repo.values() for a in found], now, last_fired)
+        return errors
+
+    def matching(self, repo: str, trigger: str, action: Optional[str] = None) -> List[Automation]:
+        """Automations of ``repo`` listening for ``trigger`` (and ``action``, when given)."""
+        return [
+            a for a in self.by_repo.get(repo, ())
+            if a.trigger == trigger and (action is None or action in a.spec.get("types", ()))
+        ]
+
+
+_SECRET_NAME_RE = re.compile(r"[A-Z0-9_]*(TOKEN|SECRET|KEY)")
+
+
+def redact(text: str, envs: Iterable[Dict[str, str]]) -> str:
+    """Mask the values of secret-looking variables (``*TOKEN``, ``*SECRET``, ``*KEY``) in ``text``."""
+    secrets = {v for env in envs for k, v in env.items() if _SECRET_NAME_RE.search(k) and len(v) >= 4}
+    for value in sorted(secrets, key=len, reverse=True):
+        text = text.replace(value, "***")
+    return text
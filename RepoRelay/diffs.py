@@ -0,0 +1,191 @@
+"""
+Pull request diffs for job payloads.
+
+With ``REPORELAY_PR_DIFF`` set, jobs on a pull request get the PR's unified
+diff (``full``) or a per-file change summary (``summary``) appended to the
+payload, capped at ``REPORELAY_PR_DIFF_MAX_BYTES``. The diff is taken from
+the local clone when both commits are already present there, otherwise
+from the GitHub compare API. Either way it is stored in a
+content-addressed cache keyed by ``<base_sha>..<head_sha>``. The two SHAs
+pin the diff exactly, so further triggers on an unchanged PR cost no
+fetch or ``git diff``, and entries never need invalidating.
+"""
+
+import gzip
+import logging
+import os
+import re
+import subprocess
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from . import metrics
+
+MODES = ("off", "summary", "full")
+SOURCES = ("auto", "local", "api")
+
+PR_DIFFS = metrics.REGISTRY.counter("reporelay_pr_diff_total", "PR diffs attached, by where they came from.")
+
+_SHA_RE = re.compile(r"^[0-9a-f]{7,64}$")
+_FILE_HEADER_RE = re.compile(r"^diff --git a/(.*) b/(.*)$")
+
+
+def split_files(diff: str) -> List[Tuple[str, str]]:
+    """Split a unified git diff into ``(path, chunk)`` per file, in order."""
+    files: List[Tuple[str, str]] = []
+    path, start = None, 0
+    lines = diff.splitlines(keepends=True)
+    offset = 0
+    for line in lines:
+        m = _FILE_HEADER_RE.match(line.rstrip("\n"))
+        if m:
+            if path is not None:
+                files.append((path, diff[start:offset]))
+            path, start = m.group(2), offset
+        offset += len(line)
+    if path is not None:
+        files.append((path, diff[start:]))
+    return files
+
+
+def file_stats(chunk: str) -> Tuple[int, int, bool]:
+    """``(added, removed, binary)`` line counts of one file's diff chunk."""
+    added = removed = 0
+    binary = False
+    for line in chunk.splitlines():
+        if line.startswith("+") and not line.startswith("+++"):
+            added += 1
+        elif line.startswith("-") and not line.startswith("---"):
+            removed += 1
+        elif line.startswith("Binary files ") or line == "GIT binary patch":
+            binary = True
+    return added, removed, binary
+
+
+def _summary_line(path: str, chunk: str) -> str:
+    added, removed, binary = file_stats(chunk)
+    return f"{path} (binary)" if binary else f"{path} (+{added} -{removed})"
+
+
+def render(diff: str, mode: str, max_bytes: int) -> str:
+    """Render ``diff`` as a change summary or as the diff itself, within ``max_bytes``.
+
+    A ``full`` diff over the cap keeps whole files while they fit and lists
+    the rest in the summary form.
+    """
+    files = split_files(diff)
+    if not files:
+        return "(no changes)"
+    totals = [file_stats(chunk) for _, chunk in files]
+    header = f"{len(files)} file(s) changed, +{sum(t[0] for t in totals)} -{sum(t[1] for t in totals)}"
+    parts, used, rest = [], len(header) + 1, files
+    if mode == "full":
+        rest = []
+        for path, chunk in files:
+            size = len(chunk.encode("utf-8"))
+            if rest or used + size > max_bytes:
+                rest.append((path, chunk))
+                continue
+            parts.append(chunk.rstrip("\n"))
+            used += size + 1
+        if not rest:
+            return "\n".join([header] + parts)
+        parts.append(f"(diff truncated at {max_bytes} bytes; {len(rest)} more file(s):)")
+    lines = []
+    for i, (path, chunk) in enumerate(rest):
+        line = _summary_line(path, chunk)
+        if used + len(line) + 1 > max_bytes:
+            lines.append(f"... and {len(rest) - i} more file(s)")
+            break
+        lines.append(line)
+        used += len(line) + 1
+    return "\n".join([header] + parts + lines)
+
+
+def local_diff(path: Path, base: str, head: str) -> Optional[str]:
+    """``git diff base...head`` in the local clone, or None when either commit is missing."""
+    git = ["git", "-C", str(path)]
+    try:
+        for sha in (base, head):
+            if subprocess.run(git + ["cat-file", "-e", f"{sha}^{{commit}}"], capture_output=True, timeout=30).returncode:
+                return None
+        proc = subprocess.run(
+            git + ["diff", "--no-color", "--no-ext-diff", f"{base}...{head}"], capture_output=True, timeout=120
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if proc.returncode != 0:
+        return None
+    return proc.stdout.decode("utf-8", errors="replace")
+
+
+class DiffCache:
+    """Gzipped diffs on disk by ``<base>..<head>``, with a few hot entries in memory.
+
+    Entries are immutable; the oldest files (by last use) are removed
+    beyond ``max_entries``.
+    """
+
+    def __init__(self, directory: Path, max_entries: int = 256, memory_entries: int = 16):
+        self.directory = Path(directory)
+        self.max_entries = max(1, max_entries)
+        self.memory_entries = max(0, memory_entries)
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+
+    @staticmethod
+    def key(base: str, head: str) -> Optional[str]:
+        if not (_SHA_RE.match(base or "") and _SHA_RE.match(head or "")):
+            return None
+        return f"{base}..{head}"
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.diff.gz"
+
+    def _remember(self, key: str, diff: str) -> None:
+        if not self.memory_entries:
+            return
+        self._memory[key] = diff
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, base: str, head: str) -> Optional[str]:
+        key = self.key(base, head)
+        if key is None:
+            return None
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+        path = self._path(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                diff = f.read()
+            os.utime(path)
+        except (OSError, EOFError):
+            return None
+        self._remember(key, diff)
+        return diff
+
+    def put(self, base: str, head: str, diff: str) -> None:
+        key = self.key(base, head)
+        if key is None:
+            return
+        self._remember(key, diff)
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp = self._path(key).with_suffix(".tmp")
+            with gzip.open(tmp, "wt", encoding="utf-8") as f:
+                f.write(diff)
+            os.replace(tmp, self._path(key))
+            self._evict()
+        except OSError as e:
+            logging.getLogger("reporelay").warning("Could not cache diff %s: %r", key, e)
+
+    def _evict(self) -> None:
+        entries = sorted(self.directory.glob("*.diff.gz"), key=lambda p: p.stat().st_mtime)
+        for path in entries[: max(0, len(entries) - self.max_entries)]:
+            try:
+                path.unlink()
+            except OSError:
+                pass
@@ -0,0 +1,184 @@
+"""
+Batched ``repository_dispatch`` emitter for the Projects hub repository.
+
+Run lifecycle events (``task_started``, ``pr_opened``, ``task_done`` /
+``task_failed``) are buffered and sent as a single ``task_batch`` dispatch
+per flush interval or size threshold, so the hub runs one Actions workflow
+per batch instead of one per event. A start that is still buffered when its
+run finishes is merged with the later events into one ``task_completed``
+entry. Events are spooled to a local JSONL file until the hub accepts them,
+so an unreachable hub loses nothing across restarts.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+BATCH_EVENT = "task_batch"
+_FINISH_EVENTS = {"task_done": "Done", "task_failed": "Failed"}
+
+
+def _coalesce(events: List[dict]) -> List[Tuple[dict, List[int]]]:
+    """Merge each run's buffered start with its later events; keep the source indices of every entry."""
+    merged: List[Tuple[dict, List[int]]] = []
+    open_starts = {}
+    for idx, event in enumerate(events):
+        kind = event["event_type"]
+        payload = dict(event["client_payload"])
+        run_id = payload.get("run_id")
+        start = open_starts.get(run_id) if run_id else None
+        if kind == "task_started" and run_id:
+            entry = ({"event_type": kind, "client_payload": payload}, [idx])
+            open_starts[run_id] = entry
+            merged.append(entry)
+        elif start is not None and kind == "pr_opened":
+            start[0]["client_payload"]["pr_url"] = payload.get("pr_url", "")
+            start[1].append(idx)
+        elif start is not None and kind in _FINISH_EVENTS:
+            start[0]["event_type"] = "task_completed"
+            start[0]["client_payload"].update({k: v for k, v in payload.items() if k not in ("title", "body")})
+            start[0]["client_payload"]["status"] = _FINISH_EVENTS[kind]
+            start[1].append(idx)
+            open_starts.pop(run_id, None)
+        else:
+            merged.append(({"event_type": kind, "client_payload": payload}, [idx]))
+    return merged
+
+
+def coalesce_events(events: List[dict]) -> List[dict]:
+    """Merge each run's buffered start with its later ``pr_opened``/finish events."""
+    return [entry for entry, _ in _coalesce(events)]
+
+
+class DispatchBatcher:
+    def __init__(
+        self,
+        send: Callable[[dict], None],
+        spool_path: Optional[str],
+        interval: float = 30.0,
+        max_batch: int = 20,
+        max_backoff: float = 600.0,
+    ):
+        self.send = send
+        self.spool_path = str(spool_path) if spool_path else None
+        self.interval = max(0.0, interval)
+        self.max_batch = max(1, max_batch)
+        self.max_backoff = max_backoff
+        self._events: List[dict] = []
+        self._lock = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._failures = 0
+        self._next_flush = time.time() + self.interval
+        self._load()
+
+    def _load(self) -> None:
+        if not self.spool_path:
+            return
+        try:
+            with open(self.spool_path, "r") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                self._events.append(json.loads(line))
+            except ValueError:
+                logging.getLogger("reporelay").warning("Skipping corrupt dispatch spool line in %s", self.spool_path)
+
+    def _rewrite_spool(self) -> None:
+        if not self.spool_path:
+            return
+        tmp = self.spool_path + ".tmp"
+        with open(tmp, "w") as f:
+            for event in self._events:
+                f.write(json.dumps(event) + "\n")
+        os.replace(tmp, self.spool_path)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._events)
+
+    def emit(self, event_type: str, payload: dict) -> None:
+        """Buffer an event; never blocks on the network."""
+        event = {"event_type": event_type, "client_payload": payload, "at": time.time()}
+        with self._lock:
+            self._events.append(event)
+            if self.spool_path:
+                with open(self.spool_path, "a") as f:
+                    f.write(json.dumps(event) + "\n")
+            if len(self._events) >= self.max_batch:
+                self._lock.notify_all()
+
+    def flush(self) -> bool:
+        """Send buffered events as batches; returns False if the hub could not be reached."""
+        with self._lock:
+            snapshot = list(self._events)
+        if not snapshot:
+            return True
+        groups = _coalesce(snapshot)
+        delivered = set()
+        ok = True
+        try:
+            for start in range(0, len(groups), self.max_batch):
+                chunk = groups[start:start + self.max_batch]
+                entries = [entry for entry, _ in chunk]
+                digest = hashlib.sha1(json.dumps(entries, sort_keys=True).encode("utf-8")).hexdigest()
+                self.send({"batch_id": digest, "events": entries})
+                for _, sources in chunk:
+                    delivered.update(sources)
+        except Exception as e:
+            ok = False
+            self._failures += 1
+            logging.getLogger("reporelay").warning(
+                "Dispatch batch failed (%d event(s) kept in spool, attempt %d): %r",
+                len(snapshot) - len(delivered),
+                self._failures,
+                e,
+            )
+        else:
+            self._failures = 0
+        with self._lock:
+            kept = [event for idx, event in enumerate(snapshot) if idx not in delivered]
+            self._events = kept + self._events[len(snapshot):]
+            self._rewrite_spool()
+        return ok
+
+    # -- background flusher ------------------------------------------------
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="reporelay-dispatch", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        with self._lock:
+            self._stopping = True
+            self._lock.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        # last attempt; whatever fails stays in the spool for the next start
+        self.flush()
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if self._stopping:
+                    return
+                now = time.time()
+                full = len(self._events) >= self.max_batch and self._failures == 0
+                if now < self._next_flush and not full:
+                    self._lock.wait(self._next_flush - now)
+                    continue
+            ok = self.flush()
+            delay = self.interval if ok else min(self.max_backoff, max(self.interval, 1.0) * (2 ** self._failures))
+            self._next_flush = time.time() + delay
@@ -0,0 +1,139 @@
+"""
+Fair-share ordering of ready conversation jobs.
+
+Jobs run one at a time, and without a scheduler they run in discovery
+order, so one busy repo or one prolific author can hold the runner.
+``FairShare`` picks the next job by start-time fair queuing over two kinds
+of flows: the repo and the author of the newest trigger. Every flow has a
+virtual clock that advances by each job's runtime divided by the flow's
+weight. A flow coming back from idle starts at the system virtual time, so
+being idle earns no credit. The job with the smallest sum of both clocks,
+less its priority boost (labels, review comments) and its aging credit
+(per second waited, which rules out starvation), runs next. All of these
+are measured in seconds of runner time.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from . import metrics
+
+QUEUE_WAIT = metrics.REGISTRY.histogram(
+    "reporelay_queue_wait_seconds",
+    "Time from a conversation's first pending trigger to its job starting, per repo and per author queue.",
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200),
+)
+
+REVIEW_SOURCE = "pr_review_comment"
+
+# Every job is charged at least this much, so quickly failing jobs still take turns
+MIN_CHARGE_SECONDS = 1.0
+
+
+def parse_weights(text: str) -> Dict[str, float]:
+    """``"a=2,b=0.5"`` as ``{"a": 2.0, "b": 0.5}``; raises ValueError on malformed entries."""
+    out: Dict[str, float] = {}
+    for item in text.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, sep, value = item.rpartition("=")
+        if not sep or not name.strip():
+            raise ValueError(f"expected NAME=NUMBER, got {item!r}")
+        out[name.strip()] = float(value)
+    return out
+
+
+@dataclass
+class Candidate:
+    """A conversation with ready triggers, as seen by the scheduler."""
+
+    __slots__ = ("repo", "number", "author", "sources", "labels", "queued_at")
+    repo: str
+    number: str
+    author: str
+    sources: Tuple[str, ...]
+    labels: Tuple[str, ...]
+    queued_at: float
+
+
+class _Flows:
+    """Virtual clocks of one kind of flow (repos or authors)."""
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None):
+        self.weights = dict(weights or {})
+        self.clock: Dict[str, float] = {}
+        self.vtime = 0.0
+
+    def start(self, key: str) -> float:
+        return max(self.clock.get(key, 0.0), self.vtime)
+
+    def charge(self, key: str, seconds: float) -> None:
+        start = self.start(key)
+        self.vtime = start
+        self.clock[key] = start + seconds / max(self.weights.get(key, 1.0), 1e-3)
+        # clocks at or behind the system time would restart there anyway
+        for stale in [k for k, v in self.clock.items() if v <= self.vtime]:
+            del self.clock[stale]
+
+
+class FairShare:
+    """Weighted fair queuing of jobs per repo and per author, with boosts and aging."""
+
+    def __init__(
+        self,
+        repo_weights: Optional[Dict[str, float]] = None,
+        author_weights: Optional[Dict[str, float]] = None,
+        label_boosts: Optional[Dict[str, float]] = None,
+        review_boost: float = 0.0,
+        aging: float = 1.0,
+    ):
+        self.repos = _Flows(repo_weights)
+        self.authors = _Flows(author_weights)
+        self.label_boosts = {k.lower(): v for k, v in (label_boosts or {}).items()}
+        self.review_boost = review_boost
+        self.aging = max(0.0, aging)
+        # queue -> [jobs, total wait, max wait]
+        self.waits: Dict[str, List[float]] = {}
+
+    def boost(self, c: Candidate) -> float:
+        labels = {label.lower() for label in c.labels}
+        boost = sum(v for k, v in self.label_boosts.items() if k in labels)
+        if REVIEW_SOURCE in c.sources:
+            boost += self.review_boost
+        return boost
+
+    def score(self, c: Candidate, now: float) -> float:
+        return (
+            self.repos.start(c.repo)
+            + self.authors.start(c.author)
+            - self.boost(c)
+            - self.aging * max(0.0, now - c.queued_at)
+        )
+
+    def pick(self, candidates: Iterable[Candidate], now: float) -> Candidate:
+        """The candidate that runs next (ties go to the longest waiting)."""
+        return min(candidates, key=lambda c: (self.score(c, now), c.queued_at, c.repo, c.number))
+
+    def started(self, c: Candidate, now: float) -> float:
+        """Record ``c``'s wait in its repo and author queues; returns the wait."""
+        waited = max(0.0, now - c.queued_at)
+        for queue in (f"repo:{c.repo}", f"author:{c.author}"):
+            QUEUE_WAIT.observe(waited, queue=queue)
+            entry = self.waits.setdefault(queue, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += waited
+            entry[2] = max(entry[2], waited)
+        return waited
+
+    def finished(self, c: Candidate, runtime: float) -> None:
+        """Charge ``runtime`` seconds (at least ``MIN_CHARGE_SECONDS``) to the job's repo and author."""
+        self.repos.charge(c.repo, max(MIN_CHARGE_SECONDS, runtime))
+        self.authors.charge(c.author, max(MIN_CHARGE_SECONDS, runtime))
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Per-queue ``jobs``, ``wait_mean`` and ``wait_max`` (seconds) since startup."""
+        return {
+            queue: {"jobs": jobs, "wait_mean": total / jobs, "wait_max": worst}
+            for queue, (jobs, total, worst) in sorted(self.waits.items())
+        }
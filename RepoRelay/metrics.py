@@ -0,0 +1,220 @@
+"""
+Prometheus-format metrics for RepoRelay.
+
+A small in-process registry of counters, gauges and histograms recorded by
+the poll loop, the GitHub client and the job runner. Recording is always on
+and cheap; the text exposition is only served when ``REPORELAY_METRICS_PORT``
+is set (see ``serve``), so no client library is required.
+"""
+
+import logging
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+JOB_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+LATENCY_BUCKETS = (1.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(key: LabelKey, extra: Sequence[Tuple[str, str]] = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _fmt_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(_key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_fmt_labels(k)} {_fmt_value(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[_key(labels)] = float(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = DURATION_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [bucket counts..., sum, count]
+        self._values: Dict[LabelKey, List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = _key(labels)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for idx, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[idx] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def count(self, **labels) -> float:
+        with self._lock:
+            row = self._values.get(_key(labels))
+            return row[-1] if row else 0.0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = self.header()
+        for key, row in items:
+            for bound, hits in zip(self.buckets, row):
+                lines.append(f"{self.name}_bucket{_fmt_labels(key, [('le', _fmt_value(bound))])} {_fmt_value(hits)}")
+            lines.append(f"{self.name}_bucket{_fmt_labels(key, [('le', '+Inf')])} {_fmt_value(row[-1])}")
+            lines.append(f"{self.name}_sum{_fmt_labels(key)} {_fmt_value(row[-2])}")
+            lines.append(f"{self.name}_count{_fmt_labels(key)} {_fmt_value(row[-1])}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self.register(Counter(name, help_text))
+
+    def gauge(self, name: str, help_text: str) -> Gauge:
+        return self.register(Gauge(name, help_text))
+
+    def histogram(self, name: str, help_text: str, buckets: Sequence[float] = DURATION_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+POLL_DURATION = REGISTRY.histogram("reporelay_poll_duration_seconds", "Time spent polling one repository.")
+API_REQUESTS = REGISTRY.counter("reporelay_api_requests_total", "GitHub API responses by method, endpoint and status.")
+API_NOT_MODIFIED_RATIO = REGISTRY.gauge(
+    "reporelay_api_not_modified_ratio", "Share of GitHub API GETs answered with 304 Not Modified."
+)
+RATE_LIMIT_REMAINING = REGISTRY.gauge("reporelay_rate_limit_remaining", "Last X-RateLimit-Remaining seen, by resource.")
+TRIGGER_LATENCY = REGISTRY.histogram(
+    "reporelay_trigger_to_start_seconds", "Time from a trigger's creation on GitHub to its job starting.", LATENCY_BUCKETS
+)
+JOB_DURATION = REGISTRY.histogram("reporelay_job_duration_seconds", "Wall time of the external command.", JOB_BUCKETS)
+JOB_EXITS = REGISTRY.counter("reporelay_job_exit_total", "External command exits by return code.")
+PAYLOAD_BYTES = REGISTRY.histogram("reporelay_payload_bytes", "Size of the context sent on stdin.", BYTES_BUCKETS)
+COMMENT_PARTS = REGISTRY.counter("reporelay_comment_parts_total", "Result comment parts queued for posting.")
+AUTOMATION_RUNS = REGISTRY.counter("reporelay_automation_runs_total", "Automation runs by trigger and outcome.")
+JOBS_CANCELLED = REGISTRY.counter("reporelay_jobs_cancelled_total", "Cancel requests by whether they stopped a running job or dropped queued triggers.")
+
+_NUMBER_SEGMENT = re.compile(r"/\d+(?=/|$)")
+_REPO_PATH = re.compile(r"^/repos/[^/]+/[^/]+")
+_gets = {"total": 0, "not_modified": 0}
+_gets_lock = threading.Lock()
+
+
+def endpoint_label(path: str) -> str:
+    """Collapse repo names and numeric ids so each API route is a single label value."""
+    path = _REPO_PATH.sub("/repos/{repo}", path.split("?", 1)[0])
+    return _NUMBER_SEGMENT.sub("/{id}", path)
+
+
+def record_response(method: str, path: str, status: int, headers) -> None:
+    """Account one GitHub API response (called from the session's response hook)."""
+    API_REQUESTS.inc(method=method, endpoint=endpoint_label(path), status=status)
+    remaining = (headers or {}).get("X-RateLimit-Remaining")
+    if remaining is not None and str(remaining).isdigit():
+        RATE_LIMIT_REMAINING.set(int(remaining), resource=(headers.get("X-RateLimit-Resource") or "core"))
+    if method == "GET":
+        with _gets_lock:
+            _gets["total"] += 1
+            if status == 304:
+                _gets["not_modified"] += 1
+            API_NOT_MODIFIED_RATIO.set(_gets["not_modified"] / _gets["total"])
+
+
+class _Handler(BaseHTTPRequestHandler):
+    registry: Registry = REGISTRY
+
+    def do_GET(self):  # noqa: N802 - http.server API
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        logging.getLogger("reporelay").debug("metrics: " + fmt, *args)
+
+
+def serve(port: int, host: str = "127.0.0.1", registry: Optional[Registry] = None) -> ThreadingHTTPServer:
+    """Serve ``/metrics`` from a daemon thread; call ``shutdown()`` on the result to stop."""
+    handler = type("MetricsHandler", (_Handler,), {"registry": registry or REGISTRY})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="reporelay-metrics", daemon=True).start()
+    return server
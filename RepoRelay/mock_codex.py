@@ -1,8 +1,195 @@
 #!/usr/bin/env python3
-"""Minimal stub command for RepoRelay watcher tests."""
+"""Stub command for RepoRelay watcher tests, dry runs and load simulation.
+
+With no environment set it prints one fixed ``## Result`` message and exits
+0 immediately. ``MOCK_CODEX_*`` variables turn it into a load simulator:
+
+- ``MOCK_CODEX_LATENCY``: seconds to sleep, as ``2``, ``fixed:2``,
+  ``uniform:0.5,3``, ``exp:1.5`` (mean), ``normal:2,0.5`` or
+  ``lognormal:0.5,0.8`` (mu, sigma of the log). Negative draws become 0.
+- ``MOCK_CODEX_SEED``: seed for every random choice (reproducible runs).
+- ``MOCK_CODEX_OUTPUT_BYTES``: pad the final message to about this many bytes.
+- ``MOCK_CODEX_STDERR_BYTES``: also write this many bytes to stderr.
+- ``MOCK_CODEX_CHATTER=1``: wrap the message in Codex CLI transcript noise
+  (banner, settings, ``thinking``/``exec`` blocks, ``tokens used``), as
+  trimmed by ``postprocess_stdout`` when ``CODEX_CMD`` is named ``codex``.
+- ``MOCK_CODEX_ANSI=1``: colour the output with ANSI escape sequences.
+- ``MOCK_CODEX_SESSION_ID``: ``auto`` for a fresh uuid, or a fixed id.
+- ``MOCK_CODEX_SESSION_STYLE``: how the id is printed for
+  ``extract_codex_run_id``: ``run-id`` (default), ``session``, ``resume``
+  or ``json``.
+- ``MOCK_CODEX_EXIT_CODES``: weighted exit-code mix, e.g. ``0:90,1:8,124:2``.
+- ``MOCK_CODEX_EXPECT_STDIN``: ``any`` (must be non-empty), ``none`` (must
+  be empty) or ``contains:TEXT``; on mismatch exit 3 with a message on
+  stderr. Stdin is only read when this or ``MOCK_CODEX_READ_STDIN=1`` is set,
+  so resumed runs with an inherited terminal do not block.
+- ``MOCK_CODEX_MESSAGE``: replace the fixed message.
+"""
+import math
+import os
+import random
 import sys
+import time
+import uuid
 
 MESSAGE = "## Result\nWatcher stub completed successfully."
 
-sys.stdout.write(MESSAGE)
-sys.stdout.flush()
+_ANSI = {"bold": "\x1b[1m", "dim": "\x1b[2m", "cyan": "\x1b[36m", "magenta": "\x1b[35m", "reset": "\x1b[0m"}
+
+
+def _env(key: str, default: str = "") -> str:
+    return os.environ.get(f"MOCK_CODEX_{key}", default)
+
+
+def sample_latency(spec: str, rng: random.Random) -> float:
+    """Draw a delay in seconds from a ``kind:params`` distribution spec."""
+    spec = (spec or "").strip()
+    if not spec:
+        return 0.0
+    kind, _, params = spec.partition(":")
+    if not params:
+        kind, params = "fixed", kind
+    args = [float(p) for p in params.split(",") if p.strip()]
+    kind = kind.lower()
+    if kind == "fixed":
+        value = args[0]
+    elif kind == "uniform":
+        value = rng.uniform(args[0], args[1])
+    elif kind == "exp":
+        value = rng.expovariate(1.0 / args[0]) if args[0] > 0 else 0.0
+    elif kind == "normal":
+        value = rng.gauss(args[0], args[1])
+    elif kind == "lognormal":
+        value = rng.lognormvariate(args[0], args[1])
+    else:
+        raise ValueError(f"unknown latency distribution {kind!r}")
+    return max(0.0, value)
+
+
+def pick_exit_code(spec: str, rng: random.Random) -> int:
+    """Choose an exit code from a ``code:weight,...`` mix (bare codes weigh 1)."""
+    spec = (spec or "").strip()
+    if not spec:
+        return 0
+    codes, weights = [], []
+    for part in spec.split(","):
+        code, _, weight = part.strip().partition(":")
+        codes.append(int(code))
+        weights.append(float(weight) if weight else 1.0)
+    return rng.choices(codes, weights=weights, k=1)[0]
+
+
+def check_stdin(expect: str, data: str):
+    """Return an error message when stdin does not match the expectation, else None."""
+    if not expect:
+        return None
+    if expect == "any" and not data.strip():
+        return "expected a payload on stdin but it was empty"
+    if expect == "none" and data:
+        return f"expected no stdin but received {len(data)} bytes"
+    if expect.startswith("contains:") and expect[len("contains:"):] not in data:
+        return f"stdin does not contain {expect[len('contains:'):]!r}"
+    return None
+
+
+def session_line(session_id: str, style: str) -> str:
+    if style == "session":
+        return f"session: {session_id}"
+    if style == "resume":
+        return f"To continue this session, resume with: codex resume {session_id}"
+    if style == "json":
+        return '{"type": "session", "id": "%s"}' % session_id
+    return f"Run ID: {session_id}"
+
+
+def _padding(target: int, current: int) -> str:
+    missing = target - current
+    if missing <= 0:
+        return ""
+    line = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. "
+    text = (line * (math.ceil(missing / len(line)))).strip()
+    # break into paragraphs so comment splitting has natural cut points
+    words = text[:missing].split(". ")
+    return "\n\n" + ".\n\n".join(". ".join(words[i:i + 20]) for i in range(0, len(words), 20))
+
+
+def _chatter(message: str, session_id: str, stdin_bytes: int, colour) -> str:
+    header = [
+        colour("OpenAI Codex v0.0.0 (mock)", "bold"),
+        "--------",
+        f"workdir: {os.getcwd()}",
+        "model: gpt-5-codex",
+        "provider: openai",
+        "approval: never",
+        "sandbox: workspace-write",
+        "reasoning effort: medium",
+    ]
+    if session_id:
+        header.append(f"session id: {session_id}")
+    header.append("--------")
+    body = [
+        colour("user", "cyan"),
+        f"(payload of {stdin_bytes} bytes)",
+        "",
+        colour("thinking", "magenta"),
+        colour("Inspecting the repository layout before answering.", "dim"),
+        "",
+        colour("exec", "magenta"),
+        "bash -lc 'ls -la' in " + os.getcwd(),
+        colour("succeeded in 12ms:", "dim"),
+        "README.md",
+        "",
+        colour("codex", "magenta"),
+        message,
+        "",
+        colour("tokens used", "dim"),
+        "1234",
+    ]
+    return "\n".join(header + body) + "\n"
+
+
+def main() -> int:
+    seed = _env("SEED")
+    rng = random.Random(int(seed)) if seed else random.Random()
+    ansi = _env("ANSI") == "1"
+
+    def colour(text: str, style: str) -> str:
+        return f"{_ANSI[style]}{text}{_ANSI['reset']}" if ansi else text
+
+    expect = _env("EXPECT_STDIN")
+    data = sys.stdin.read() if (expect or _env("READ_STDIN") == "1") and sys.stdin else ""
+    problem = check_stdin(expect, data)
+    if problem:
+        sys.stderr.write(f"mock_codex: {problem}\n")
+        return 3
+
+    time.sleep(sample_latency(_env("LATENCY"), rng))
+
+    session_id = _env("SESSION_ID")
+    if session_id == "auto":
+        session_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+    message = _env("MESSAGE", MESSAGE)
+    target = int(_env("OUTPUT_BYTES", "0") or 0)
+    message += _padding(target, len(message.encode("utf-8")))
+    if session_id:
+        message += "\n\n" + session_line(session_id, _env("SESSION_STYLE", "run-id"))
+    if ansi:
+        message = colour(message, "bold")
+
+    if _env("CHATTER") == "1":
+        out = _chatter(message, session_id, len(data.encode("utf-8")), colour)
+    else:
+        out = message
+    sys.stdout.write(out)
+    sys.stdout.flush()
+
+    stderr_bytes = int(_env("STDERR_BYTES", "0") or 0)
+    if stderr_bytes > 0:
+        sys.stderr.write(("mock_codex: warning: simulated diagnostic\n" * (stderr_bytes // 42 + 1))[:stderr_bytes])
+        sys.stderr.flush()
+
+    return pick_exit_code(_env("EXIT_CODES"), rng)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,241 @@
+"""
+Durable outbound write queue for RepoRelay.
+
+GitHub writes (comments, reactions, project logging)
+are submitted as small JSON operations and delivered by a dedicated writer
+thread, so the poll loop never waits on write latency. Operations are
+persisted to disk until delivered, paced to stay under GitHub's secondary
+rate limits, retried with exponential backoff, and delivered in submission
+order per ``key`` (typically one conversation thread).
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+Handler = Callable[[dict], Optional[dict]]
+
+# 4xx statuses worth retrying: secondary rate limits (403/429), timeouts and conflicts
+_RETRYABLE_CLIENT_STATUSES = {403, 408, 409, 429}
+
+
+def _http_status(exc: BaseException) -> Optional[int]:
+    resp = getattr(exc, "response", None)
+    return getattr(resp, "status_code", None)
+
+
+def _retry_after_seconds(exc: BaseException) -> Optional[float]:
+    resp = getattr(exc, "response", None)
+    headers = getattr(resp, "headers", None) or {}
+    raw = headers.get("Retry-After")
+    if raw and str(raw).isdigit():
+        return float(raw)
+    if headers.get("X-RateLimit-Remaining") == "0" and str(headers.get("X-RateLimit-Reset", "")).isdigit():
+        return max(0.0, float(headers["X-RateLimit-Reset"]) - time.time())
+    return None
+
+
+def comment_marker(op_id: str) -> str:
+    """Hidden HTML marker embedded in posted comments so retries can detect earlier deliveries."""
+    return f"<!-- reporelay:{op_id} -->"
+
+
+class Outbox:
+    def __init__(
+        self,
+        path: Optional[str],
+        min_interval: float = 1.0,
+        max_attempts: int = 8,
+        backoff: float = 2.0,
+        max_backoff: float = 300.0,
+    ):
+        self.path = str(path) if path else None
+        self.min_interval = max(0.0, min_interval)
+        self.max_attempts = max(1, max_attempts)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._handlers: Dict[str, Handler] = {}
+        self._ops: List[dict] = []
+        self._results: Dict[str, dict] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._last_write = 0.0
+        self._paused_until = 0.0
+        self._load()
+
+    # -- persistence -------------------------------------------------------
+    def _load(self) -> None:
+        if not self.path:
+            return
+        try:
+            with open(self.path, "r") as f:
+                loaded = json.load(f)
+        except FileNotFoundError:
+            return
+        except ValueError:
+            logging.getLogger("reporelay").warning("Ignoring unreadable outbox file %s", self.path)
+            return
+        self._ops = list(loaded.get("ops", []))
+        # a crash may have come after delivery but before removal, so handlers treat these as retries
+        for op in self._ops:
+            op["replayed"] = True
+        self._results = dict(loaded.get("results", {}))
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        # keep results only for a day; they exist so dependent ops can look them up
+        cutoff = time.time() - 86400
+        self._results = {k: v for k, v in self._results.items() if v.get("at", 0) >= cutoff}
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"ops": self._ops, "results": self._results}, f)
+        os.replace(tmp, self.path)
+
+    # -- public API --------------------------------------------------------
+    def register(self, kind: str, handler: Handler) -> None:
+        self._handlers[kind] = handler
+
+    def submit(self, kind: str, key: str, payload: dict, after: Optional[str] = None) -> str:
+        """Queue a write and return its operation id immediately."""
+        op_id = uuid.uuid4().hex
+        op = {
+            "id": op_id,
+            "kind": kind,
+            "key": key,
+            "payload": payload,
+            "after": after,
+            "attempts": 0,
+            "not_before": 0.0,
+            "created": time.time(),
+        }
+        with self._cond:
+            self._ops.append(op)
+            self._save()
+            self._cond.notify_all()
+        return op_id
+
+    def result(self, op_id: Optional[str]) -> Optional[dict]:
+        if not op_id:
+            return None
+        with self._cond:
+            entry = self._results.get(op_id)
+        return None if entry is None else entry.get("value")
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._ops)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="reporelay-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Try to deliver what is queued within ``timeout``; the rest stays on disk for next start."""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self._cond:
+                if self._next_ready(time.time()) is None:
+                    break
+            time.sleep(0.05)
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(max(0.0, deadline - time.time()) + 1.0)
+            self._thread = None
+
+    def drain(self, max_ops: int = 1000) -> int:
+        """Deliver every eligible op on the calling thread, ignoring pacing and backoff.
+
+        Meant for tests and one-shot tools; do not combine with a started writer.
+        Returns the number of delivery attempts made.
+        """
+        attempted = 0
+        while attempted < max_ops:
+            with self._cond:
+                op = self._next_ready(float("inf"))
+            if op is None:
+                break
+            self._deliver(op)
+            attempted += 1
+        return attempted
+
+    # -- writer ------------------------------------------------------------
+    def _next_ready(self, now: float) -> Optional[dict]:
+        """Oldest op whose key is not blocked by an earlier op of the same key."""
+        blocked = set()
+        for op in self._ops:
+            if op["key"] in blocked:
+                continue
+            blocked.add(op["key"])
+            if op.get("not_before", 0.0) <= now:
+                return op
+        return None
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if self._stopping:
+                    return
+                now = time.time()
+                gate = max(self._paused_until, self._last_write + self.min_interval)
+                op = self._next_ready(now) if now >= gate else None
+                if op is None:
+                    timeout = None
+                    if self._ops:
+                        wakeups = [gate] + [o.get("not_before", 0.0) for o in self._ops]
+                        future = [w - now for w in wakeups if w > now]
+                        timeout = min(future) if future else 1.0
+                    self._cond.wait(timeout)
+                    continue
+            self._deliver(op)
+
+    def _deliver(self, op: dict) -> None:
+        log = logging.getLogger("reporelay")
+        handler = self._handlers.get(op["kind"])
+        self._last_write = time.time()
+        try:
+            if handler is None:
+                raise LookupError(f"no outbox handler registered for {op['kind']!r}")
+            value = handler(op)
+        except Exception as e:
+            status = _http_status(e)
+            op["attempts"] = op.get("attempts", 0) + 1
+            permanent = isinstance(e, LookupError) or (
+                status is not None and 400 <= status < 500 and status not in _RETRYABLE_CLIENT_STATUSES
+            )
+            with self._cond:
+                if permanent or op["attempts"] >= self.max_attempts:
+                    log.error("Dropping outbound %s for %s after %d attempt(s): %r", op["kind"], op["key"], op["attempts"], e)
+                    self._remove(op)
+                else:
+                    delay = _retry_after_seconds(e)
+                    if delay is not None:
+                        # secondary limits apply to the whole token: pause every write
+                        self._paused_until = time.time() + delay
+                    else:
+                        delay = min(self.max_backoff, self.backoff ** op["attempts"])
+                    op["not_before"] = time.time() + delay
+                    log.warning("Outbound %s for %s failed (attempt %d), retrying in %.1fs: %r", op["kind"], op["key"], op["attempts"], delay, e)
+                    self._save()
+            return
+        with self._cond:
+            self._results[op["id"]] = {"value": value, "at": time.time()}
+            self._remove(op)
+
+    def _remove(self, op: dict) -> None:
+        try:
+            self._ops.remove(op)
+        except ValueError:
+            pass
+        self._save()
+        self._cond.notify_all()
@@ -0,0 +1,110 @@
+"""
+Compact set of processed GitHub comment ids.
+
+Ids are kept in a sorted ``array('q')`` with a parallel array of epoch
+timestamps (the comment's ``updated_at``, or when it was marked). Instead of
+truncating by count, ``prune`` drops entries older than the poll watermark
+and raises ``floor`` to the largest dropped id. GitHub ids only grow, so any
+id at or below the floor belongs to a comment that was already seen, and an
+edit to an old comment that brings it back into the ``since`` window does
+not fire it again.
+
+In the state file the structure is stored as zlib-compressed, base64-encoded
+little-endian int64 arrays. Plain JSON lists from older state files load
+through ``ProcessedIds.load`` unchanged.
+"""
+
+import base64
+import sys
+import time
+import zlib
+from array import array
+from bisect import bisect_left
+from typing import Iterable, Iterator, Optional, Union
+
+FORMAT_VERSION = 1
+
+
+def _pack(values: array) -> str:
+    data = array("q", values)
+    if sys.byteorder == "big":
+        data.byteswap()
+    return base64.b64encode(zlib.compress(data.tobytes())).decode("ascii")
+
+
+def _unpack(text: str) -> array:
+    data = array("q")
+    if text:
+        data.frombytes(zlib.decompress(base64.b64decode(text)))
+        if sys.byteorder == "big":
+            data.byteswap()
+    return data
+
+
+class ProcessedIds:
+    __slots__ = ("ids", "stamps", "floor")
+
+    def __init__(self, ids: Iterable[int] = (), stamp: Optional[float] = None, floor: int = 0):
+        self.ids = array("q")
+        self.stamps = array("q")
+        self.floor = int(floor)
+        for value in ids:
+            self.add(value, stamp)
+
+    @classmethod
+    def load(cls, value: Union[None, list, dict, "ProcessedIds"]) -> "ProcessedIds":
+        """Build from a persisted value: a legacy id list, an encoded dict, or an instance."""
+        if isinstance(value, ProcessedIds):
+            return value
+        if isinstance(value, dict):
+            out = cls(floor=value.get("floor", 0))
+            out.ids = _unpack(value.get("ids", ""))
+            out.stamps = _unpack(value.get("stamps", ""))
+            if len(out.ids) != len(out.stamps):
+                raise ValueError("processed ids and stamps differ in length")
+            return out
+        # legacy list: ids only, stamped now so they age out with the next watermarks
+        return cls((v for v in value or () if isinstance(v, int)), stamp=time.time())
+
+    def to_json(self) -> dict:
+        return {"v": FORMAT_VERSION, "floor": self.floor, "ids": _pack(self.ids), "stamps": _pack(self.stamps)}
+
+    def __contains__(self, value) -> bool:
+        if not isinstance(value, int):
+            return False
+        if value <= self.floor:
+            return True
+        i = bisect_left(self.ids, value)
+        return i < len(self.ids) and self.ids[i] == value
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.ids)
+
+    def add(self, value, stamp: Optional[float] = None) -> None:
+        """Record ``value`` (non-integer ids are ignored); ``stamp`` defaults to now."""
+        if not isinstance(value, int) or value <= self.floor:
+            return
+        i = bisect_left(self.ids, value)
+        if i < len(self.ids) and self.ids[i] == value:
+            return
+        self.ids.insert(i, value)
+        self.stamps.insert(i, int(time.time() if stamp is None else stamp))
+
+    def prune(self, before: float) -> int:
+        """Drop entries stamped before ``before`` (epoch seconds), raising ``floor``; returns how many went."""
+        cutoff = int(before)
+        dropped = [v for v, ts in zip(self.ids, self.stamps) if ts < cutoff]
+        if not dropped:
+            return 0
+        self.floor = max(self.floor, max(dropped))
+        ids, stamps = array("q"), array("q")
+        for v, ts in zip(self.ids, self.stamps):
+            if v > self.floor:
+                ids.append(v)
+                stamps.append(ts)
+        removed = len(self.ids) - len(ids)
+        self.ids, self.stamps = ids, stamps
+        return removed
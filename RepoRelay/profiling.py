@@ -0,0 +1,122 @@
+"""
+On-demand profiling for a running RepoRelay watcher.
+
+``SIGUSR1`` profiles the next N poll cycles with cProfile and writes a
+``.pstats`` file next to the state file (a second ``SIGUSR1`` while
+profiling stops early). ``SIGUSR2`` writes a memory report: the top
+tracemalloc allocation sites plus the sizes of the watcher's state,
+caches and queues. Neither needs a restart, so the state is kept.
+"""
+
+import cProfile
+import datetime as _dt
+import logging
+import os
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+
+def _stamp() -> str:
+    return _dt.datetime.utcnow().strftime("%Y%m%dT%H%M%S.%fZ")
+
+
+class Profiler:
+    def __init__(
+        self,
+        out_dir: Path,
+        cycles: int = 5,
+        sizes: Optional[Callable[[], Dict[str, int]]] = None,
+        top: int = 25,
+    ):
+        self.out_dir = Path(out_dir)
+        self.cycles = max(1, cycles)
+        self.sizes = sizes
+        self.top = top
+        self._requested = False
+        self._profile: Optional[cProfile.Profile] = None
+        self._remaining = 0
+
+    @property
+    def active(self) -> bool:
+        return self._profile is not None
+
+    # -- signal handlers (run on the main thread between bytecodes) ---------
+    def on_sigusr1(self, *_a) -> None:
+        """Arm profiling for the next cycles, or stop a running profile early."""
+        log = logging.getLogger("reporelay")
+        if self.active:
+            log.info("SIGUSR1: stopping profile early")
+            self._remaining = 0
+            self._finish()
+            return
+        self._requested = True
+        log.info("SIGUSR1: profiling the next %d poll cycle(s)", self.cycles)
+
+    def on_sigusr2(self, *_a) -> None:
+        try:
+            path = self.memory_report()
+        except Exception as e:
+            logging.getLogger("reporelay").warning("SIGUSR2: memory report failed: %r", e)
+            return
+        logging.getLogger("reporelay").info("SIGUSR2: memory report written to %s", path)
+
+    # -- poll loop hooks ---------------------------------------------------
+    def cycle_started(self) -> None:
+        if self._requested and not self.active:
+            self._requested = False
+            self._remaining = self.cycles
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def cycle_finished(self) -> None:
+        if not self.active:
+            return
+        self._remaining -= 1
+        if self._remaining <= 0:
+            self._finish()
+
+    def close(self) -> None:
+        """Flush a profile that is still running (e.g. on shutdown)."""
+        if self.active:
+            self._finish()
+
+    # -- output ------------------------------------------------------------
+    def _finish(self) -> Optional[Path]:
+        profile, self._profile = self._profile, None
+        if profile is None:
+            return None
+        profile.disable()
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        path = self.out_dir / f"reporelay-profile-{_stamp()}-{os.getpid()}.pstats"
+        profile.dump_stats(str(path))
+        logging.getLogger("reporelay").info(
+            "Profile written to %s (inspect with: python -m pstats %s)", path, path
+        )
+        return path
+
+    def memory_report(self) -> Path:
+        lines = [f"# RepoRelay memory report {_stamp()} pid={os.getpid()}", ""]
+        if self.sizes is not None:
+            lines.append("## Watcher structures")
+            for name, value in sorted(self.sizes().items()):
+                lines.append(f"{name:<48} {value}")
+            lines.append("")
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            lines.append(f"## tracemalloc: current={current} bytes peak={peak} bytes")
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            ))
+            for stat in snapshot.statistics("lineno")[: self.top]:
+                lines.append(str(stat))
+        else:
+            # allocations made before tracing starts are invisible, so begin now for next time
+            tracemalloc.start()
+            lines.append("## tracemalloc was not running; started now. Send SIGUSR2 again for allocation sites,")
+            lines.append("## or set REPORELAY_TRACEMALLOC=1 to trace from startup.")
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        path = self.out_dir / f"reporelay-memory-{_stamp()}-{os.getpid()}.txt"
+        path.write_text("\n".join(lines) + "\n")
+        return path
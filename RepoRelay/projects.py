@@ -0,0 +1,230 @@
+"""
+In-process GitHub Projects v2 client for RepoRelay run logging.
+
+Feature parity with ``scripts/project-logger.sh`` (``start``, ``link``, ``pr``
+and ``finish``) without forking ``gh``/``jq``: the project id, its fields and
+single-select options are resolved once per client and cached, and every
+field update for an item is sent as one aliased GraphQL mutation.
+"""
+
+import datetime as _dt
+import logging
+from typing import Dict, List, Optional, Tuple
+
+AGENT_STATUS_FIELD = "Agent Status"
+AGENT_STATUS_OPTIONS = ["Todo", "In Progress", "PR open", "Done", "Failed"]
+
+_FIELDS_FRAGMENT = """
+      id
+      fields(first: 100) {
+        nodes {
+          ... on ProjectV2FieldCommon { id name dataType }
+          ... on ProjectV2SingleSelectField { options { id name } }
+        }
+      }
+"""
+
+
+class ProjectsError(RuntimeError):
+    """Raised when the GraphQL API reports errors for a Projects request."""
+
+
+def _to_epoch(value) -> Optional[int]:
+    """Accept ``now``, epoch seconds or an ISO 8601 timestamp, like the logger script."""
+    if value is None or value == "":
+        return None
+    if value == "now":
+        return int(_dt.datetime.now(_dt.timezone.utc).timestamp())
+    text = str(value).strip()
+    if text.isdigit():
+        return int(text)
+    try:
+        parsed = _dt.datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=_dt.timezone.utc)
+    return int(parsed.timestamp())
+
+
+def _today() -> str:
+    return _dt.datetime.now(_dt.timezone.utc).strftime("%Y-%m-%d")
+
+
+class ProjectsClient:
+    def __init__(self, session, owner: str, number, api: str = "https://api.github.com"):
+        self.session = session
+        self.owner = owner or "@me"
+        self.number = int(number)
+        self.url = f"{api}/graphql"
+        self._project_id: Optional[str] = None
+        self._fields: Optional[Dict[str, dict]] = None
+
+    # -- transport ---------------------------------------------------------
+    def _graphql(self, query: str, variables: dict, allow_partial: bool = False) -> dict:
+        r = self.session.post(self.url, json={"query": query, "variables": variables}, timeout=30)
+        r.raise_for_status()
+        body = r.json() or {}
+        errors = body.get("errors")
+        if errors and not allow_partial:
+            raise ProjectsError("; ".join(e.get("message", "") for e in errors))
+        return body.get("data") or {}
+
+    # -- resolution (cached) -----------------------------------------------
+    def _load_project(self) -> None:
+        if self.owner == "@me":
+            query = "query($number: Int!) { viewer { projectV2(number: $number) {%s} } }" % _FIELDS_FRAGMENT
+            data = self._graphql(query, {"number": self.number})
+            project = (data.get("viewer") or {}).get("projectV2")
+        else:
+            # the owner may be an org or a user; one of the two lookups errors and is ignored
+            query = (
+                "query($login: String!, $number: Int!) {"
+                " organization(login: $login) { projectV2(number: $number) {%s} }"
+                " user(login: $login) { projectV2(number: $number) {%s} } }"
+            ) % (_FIELDS_FRAGMENT, _FIELDS_FRAGMENT)
+            data = self._graphql(query, {"login": self.owner, "number": self.number}, allow_partial=True)
+            project = ((data.get("organization") or {}).get("projectV2")
+                       or (data.get("user") or {}).get("projectV2"))
+        if not project:
+            raise ProjectsError(f"Project {self.owner}#{self.number} not found or not accessible")
+        self._project_id = project["id"]
+        self._fields = {}
+        for node in (project.get("fields") or {}).get("nodes") or []:
+            if node and node.get("name"):
+                self._remember_field(node)
+
+    def _remember_field(self, node: dict) -> None:
+        self._fields[node["name"]] = {
+            "id": node["id"],
+            "type": node.get("dataType"),
+            "options": {o["name"].lower(): o["id"] for o in node.get("options") or []},
+        }
+
+    def project_id(self) -> str:
+        if self._project_id is None:
+            self._load_project()
+        return self._project_id
+
+    def fields(self) -> Dict[str, dict]:
+        if self._fields is None:
+            self._load_project()
+        return self._fields
+
+    def refresh(self) -> None:
+        """Forget cached ids, e.g. after fields were edited in the Project UI."""
+        self._project_id = None
+        self._fields = None
+
+    def _ensure_agent_status_field(self) -> None:
+        if AGENT_STATUS_FIELD in self.fields():
+            return
+        query = """
+        mutation($project: ID!, $name: String!, $options: [ProjectV2SingleSelectFieldOptionInput!]) {
+          createProjectV2Field(input: {projectId: $project, dataType: SINGLE_SELECT, name: $name, singleSelectOptions: $options}) {
+            projectV2Field { ... on ProjectV2SingleSelectField { id name dataType options { id name } } }
+          }
+        }"""
+        options = [{"name": name, "color": "GRAY", "description": ""} for name in AGENT_STATUS_OPTIONS]
+        try:
+            data = self._graphql(query, {"project": self.project_id(), "name": AGENT_STATUS_FIELD, "options": options})
+        except Exception as e:
+            logging.getLogger("reporelay").warning("Could not create %r project field: %r", AGENT_STATUS_FIELD, e)
+            return
+        node = ((data.get("createProjectV2Field") or {}).get("projectV2Field")) or {}
+        if node.get("id"):
+            self._remember_field(node)
+
+    # -- field updates -----------------------------------------------------
+    def _status_values(self, status: str) -> List[Tuple[str, dict]]:
+        want = "In Progress" if status == "In progress" else status
+        self._ensure_agent_status_field()
+        values = []
+        for name in ("Status", AGENT_STATUS_FIELD):
+            field = self.fields().get(name)
+            if not field:
+                continue
+            option = field["options"].get(want.lower())
+            if option:
+                values.append((name, {"singleSelectOptionId": option}))
+        return values
+
+    def _update_fields(self, item_id: str, values: List[Tuple[str, dict]]) -> None:
+        """Apply every ``(field name, value)`` pair in a single aliased mutation."""
+        log = logging.getLogger("reporelay")
+        params = ["$project: ID!", "$item: ID!"]
+        calls = []
+        variables = {"project": self.project_id(), "item": item_id}
+        for idx, (name, value) in enumerate(values):
+            field = self.fields().get(name)
+            if not field:
+                log.warning("Project field %r not found; skipping", name)
+                continue
+            params.append(f"$f{idx}: ID!, $v{idx}: ProjectV2FieldValue!")
+            calls.append(
+                f"u{idx}: updateProjectV2ItemFieldValue(input: {{projectId: $project, itemId: $item, "
+                f"fieldId: $f{idx}, value: $v{idx}}}) {{ projectV2Item {{ id }} }}"
+            )
+            variables[f"f{idx}"] = field["id"]
+            variables[f"v{idx}"] = value
+        if not calls:
+            return
+        self._graphql(f"mutation({', '.join(params)}) {{ {' '.join(calls)} }}", variables)
+
+    # -- logger commands ---------------------------------------------------
+    def start(
+        self,
+        title: str,
+        body: str = "",
+        run_id: str = "",
+        branch: str = "",
+        repo: str = "",
+        issue_url: str = "",
+    ) -> str:
+        """Create a draft item marked in progress and return its item id (``project-logger.sh start``)."""
+        query = """
+        mutation($project: ID!, $title: String!, $body: String) {
+          addProjectV2DraftIssue(input: {projectId: $project, title: $title, body: $body}) { projectItem { id } }
+        }"""
+        data = self._graphql(query, {"project": self.project_id(), "title": title, "body": body or ""})
+        item_id = data["addProjectV2DraftIssue"]["projectItem"]["id"]
+        values = self._status_values("In progress")
+        values.append(("Start date", {"date": _today()}))
+        if run_id:
+            values.append(("Run ID", {"text": run_id}))
+        if branch:
+            values.append(("Branch", {"text": branch}))
+        if issue_url:
+            values.append(("Issue URL", {"text": issue_url}))
+        # the built-in Repository field is not API-editable; ``repo`` is accepted for parity only
+        self._update_fields(item_id, values)
+        return item_id
+
+    def link(self, item_id: str, issue_url: str) -> None:
+        """Record the issue URL on the item (``project-logger.sh link``)."""
+        self._update_fields(item_id, [("Issue URL", {"text": issue_url})])
+
+    def pr(self, item_id: str, pr_url: str) -> None:
+        """Record the PR URL and mark the item ``PR open`` (``project-logger.sh pr``)."""
+        self._update_fields(item_id, [("PR URL", {"text": pr_url})] + self._status_values("PR open"))
+
+    def finish(
+        self,
+        item_id: str,
+        status: str = "Done",
+        tokens_total: Optional[int] = None,
+        start_ts=None,
+        end_ts="now",
+        run_id: str = "",
+    ) -> None:
+        """Set the final status, end date, tokens and duration (``project-logger.sh finish``)."""
+        values = self._status_values(status)
+        values.append(("End date", {"date": _today()}))
+        if tokens_total is not None and tokens_total != "":
+            values.append(("Tokens total", {"number": float(tokens_total)}))
+        if run_id:
+            values.append(("Run ID", {"text": run_id}))
+        start, end = _to_epoch(start_ts), _to_epoch(end_ts)
+        if start is not None and end is not None:
+            values.append(("Duration minutes", {"number": float(max(0, (end - start) // 60))}))
+        self._update_fields(item_id, values)
@@ -0,0 +1,198 @@
+"""
+Compact records for the GitHub objects the watcher keeps.
+
+The REST API returns large JSON objects (URLs, reaction counts, full user
+blobs) for every comment and issue, but the poll loop only reads a handful
+of fields. The GitHub client projects each response item into one of these
+slotted records as soon as it is parsed, so backfills hold a few small
+objects instead of thousands of nested dicts.
+
+Records keep the read side of the dict interface (``get``, ``[]``) for the
+fields they carry, with ``user`` rebuilt as ``{"login": author}``. Code that
+also handles plain dicts (persisted pending triggers, tests) works with
+either.
+"""
+
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+
+class _Record:
+    __slots__ = ()
+
+    def get(self, key: str, default=None):
+        if key == "user":
+            author = getattr(self, "author", "")
+            return {"login": author} if author else default
+        value = getattr(self, key, None)
+        return default if value is None else value
+
+    def __getitem__(self, key: str):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def _login(item: dict) -> str:
+    return (item.get("user") or {}).get("login") or ""
+
+
+@dataclass
+class CommentRecord(_Record):
+    """An issue or pull request conversation comment."""
+
+    __slots__ = ("id", "body", "author", "created_at", "updated_at", "issue_url", "html_url")
+    id: int
+    body: str
+    author: str
+    created_at: str
+    updated_at: str
+    issue_url: str
+    html_url: str
+
+    @classmethod
+    def from_api(cls, item: dict) -> "CommentRecord":
+        return cls(
+            item.get("id"),
+            item.get("body") or "",
+            _login(item),
+            item.get("created_at") or "",
+            item.get("updated_at") or "",
+            item.get("issue_url") or "",
+            item.get("html_url") or "",
+        )
+
+
+@dataclass
+class ReviewCommentRecord(_Record):
+    """A pull request review (diff) comment."""
+
+    __slots__ = (
+        "id", "body", "author", "created_at", "updated_at", "pull_request_url", "html_url",
+        "path", "line", "original_line", "side",
+    )
+    id: int
+    body: str
+    author: str
+    created_at: str
+    updated_at: str
+    pull_request_url: str
+    html_url: str
+    path: str
+    line: Optional[int]
+    original_line: Optional[int]
+    side: str
+
+    @classmethod
+    def from_api(cls, item: dict) -> "ReviewCommentRecord":
+        return cls(
+            item.get("id"),
+            item.get("body") or "",
+            _login(item),
+            item.get("created_at") or "",
+            item.get("updated_at") or "",
+            item.get("pull_request_url") or "",
+            item.get("html_url") or "",
+            item.get("path") or "",
+            item.get("line"),
+            item.get("original_line"),
+            item.get("side") or "",
+        )
+
+
+@dataclass
+class IssueRecord(_Record):
+    """An issue, or the issue view of a pull request (``pull_request`` is then True)."""
+
+    __slots__ = (
+        "id", "number", "title", "body", "author", "state", "created_at", "updated_at", "html_url",
+        "pull_request", "labels",
+    )
+    id: int
+    number: int
+    title: str
+    body: str
+    author: str
+    state: str
+    created_at: str
+    updated_at: str
+    html_url: str
+    pull_request: bool
+    labels: Tuple[str, ...]
+
+    @classmethod
+    def from_api(cls, item: dict) -> "IssueRecord":
+        return cls(
+            item.get("id"),
+            item.get("number"),
+            item.get("title") or "",
+            item.get("body") or "",
+            _login(item),
+            item.get("state") or "",
+            item.get("created_at") or "",
+            item.get("updated_at") or "",
+            item.get("html_url") or "",
+            "pull_request" in item,
+            tuple(label.get("name") or "" for label in item.get("labels") or () if isinstance(label, dict)),
+        )
+
+
+@dataclass
+class IssueEventRecord(_Record):
+    """An issue lifecycle event (``closed``, ``reopened``, ``labeled``, ...) with its issue."""
+
+    __slots__ = ("id", "event", "created_at", "label", "issue")
+    id: int
+    event: str
+    created_at: str
+    label: str
+    issue: IssueRecord
+
+    @classmethod
+    def from_api(cls, item: dict) -> "IssueEventRecord":
+        return cls(
+            item.get("id"),
+            item.get("event") or "",
+            item.get("created_at") or "",
+            (item.get("label") or {}).get("name") or "",
+            IssueRecord.from_api(item.get("issue") or {}),
+        )
+
+
+@dataclass
+class PullRecord(_Record):
+    """A pull request with its head and base."""
+
+    __slots__ = (
+        "id", "number", "title", "author", "head_sha", "head_ref", "base_ref", "base_sha", "created_at", "updated_at",
+    )
+    id: int
+    number: int
+    title: str
+    author: str
+    head_sha: str
+    head_ref: str
+    base_ref: str
+    base_sha: str
+    created_at: str
+    updated_at: str
+
+    @classmethod
+    def from_api(cls, item: dict) -> "PullRecord":
+        head, base = item.get("head") or {}, item.get("base") or {}
+        return cls(
+            item.get("id"),
+            item.get("number"),
+            item.get("title") or "",
+            _login(item),
+            head.get("sha") or "",
+            head.get("ref") or "",
+            base.get("ref") or "",
+            base.get("sha") or "",
+            item.get("created_at") or "",
+            item.get("updated_at") or "",
+        )
@@ -0,0 +1,212 @@
+"""
+Local full-text index of issue and pull request conversations.
+
+The poll loop feeds this index with the comments, review comments and
+issues it already downloads, and jobs add the issue and comments they
+fetch. At trigger time ``ConversationIndex.related`` ranks other threads
+of the same repo against the conversation text with SQLite FTS5 (BM25,
+titles weighted up) and ``render_related`` fits the best ones into a byte
+budget, so a payload can carry related context without extra API calls.
+"""
+
+import logging
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    repo TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    item_id INTEGER NOT NULL,
+    title TEXT NOT NULL DEFAULT '',
+    body TEXT NOT NULL DEFAULT '',
+    author TEXT NOT NULL DEFAULT '',
+    updated_at TEXT NOT NULL DEFAULT '',
+    UNIQUE (repo, kind, item_id)
+);
+CREATE INDEX IF NOT EXISTS items_thread ON items (repo, number);
+CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+    title, body, content='items', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS items_ai AFTER INSERT ON items BEGIN
+    INSERT INTO items_fts (rowid, title, body) VALUES (new.id, new.title, new.body);
+END;
+CREATE TRIGGER IF NOT EXISTS items_ad AFTER DELETE ON items BEGIN
+    INSERT INTO items_fts (items_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+END;
+CREATE TRIGGER IF NOT EXISTS items_au AFTER UPDATE ON items BEGIN
+    INSERT INTO items_fts (items_fts, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+    INSERT INTO items_fts (rowid, title, body) VALUES (new.id, new.title, new.body);
+END;
+"""
+
+_UPSERT = """
+INSERT INTO items (repo, number, kind, item_id, title, body, author, updated_at)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (repo, kind, item_id) DO UPDATE SET
+    number = excluded.number, title = excluded.title, body = excluded.body,
+    author = excluded.author, updated_at = excluded.updated_at
+WHERE items.updated_at != excluded.updated_at OR items.body != excluded.body OR items.title != excluded.title
+"""
+
+# Thread titles count this much more than bodies and comments in BM25
+TITLE_WEIGHT = 5.0
+MAX_QUERY_TERMS = 24
+# Matching items read per requested thread before grouping them by thread
+ITEMS_PER_THREAD = 20
+
+_WORD_RE = re.compile(r"[^\W_]{3,}", re.UNICODE)
+_STOPWORDS = frozenset("""
+    the and for are but not you all any can had her was one our out has have him his how its may new now
+    old see two way who did get let put say she too use that this with from they will would there their what
+    about which when make like just over such into than them then some could these other been were also only
+    should more most very your does here where while after before because being codexe please thanks
+""".split())
+
+_NUMBER_RE = re.compile(r"/(?:issues|pulls)/(\d+)$")
+
+
+def fts5_available() -> bool:
+    try:
+        sqlite3.connect(":memory:").execute("CREATE VIRTUAL TABLE t USING fts5(x)")
+    except sqlite3.OperationalError:
+        return False
+    return True
+
+
+def thread_number(url: str) -> Optional[int]:
+    """Issue/PR number from a comment's ``issue_url`` or ``pull_request_url``."""
+    m = _NUMBER_RE.search(url or "")
+    return int(m.group(1)) if m else None
+
+
+def query_terms(text: str, limit: int = MAX_QUERY_TERMS) -> List[str]:
+    """Distinct content words of ``text``, longest first (a cheap stand-in for rarity)."""
+    seen: Dict[str, None] = {}
+    for word in _WORD_RE.findall(text.lower()):
+        if word not in _STOPWORDS and not word.isdigit():
+            seen.setdefault(word, None)
+    return sorted(seen, key=len, reverse=True)[:limit]
+
+
+class ConversationIndex:
+    """SQLite FTS5 index of issue/PR titles, bodies and comments, per repo."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT count(*) FROM items").fetchone()[0]
+
+    def _upsert(self, rows: Iterable[tuple]) -> None:
+        rows = list(rows)
+        if not rows:
+            return
+        with self._lock:
+            try:
+                with self._db:
+                    self._db.executemany(_UPSERT, rows)
+            except sqlite3.Error as e:
+                logging.getLogger("reporelay").warning("Could not update the conversation index: %r", e)
+
+    def add_issues(self, repo: str, issues: Iterable[dict]) -> None:
+        """Index issue/PR titles and bodies (``IssueRecord`` or API dicts)."""
+        self._upsert(
+            (repo, i.get("number"), "issue", i.get("number"), i.get("title") or "", i.get("body") or "",
+             (i.get("user") or {}).get("login", ""), i.get("updated_at") or "")
+            for i in issues if i.get("number") is not None
+        )
+
+    def add_comments(self, repo: str, comments: Iterable[dict], number: Optional[int] = None) -> None:
+        """Index conversation or review comments; the thread comes from ``number`` or the comment's URL."""
+        rows = []
+        for c in comments:
+            thread = number if number is not None else thread_number(c.get("issue_url") or c.get("pull_request_url") or "")
+            if thread is None or not isinstance(c.get("id"), int):
+                continue
+            kind = "review" if c.get("pull_request_url") else "comment"
+            rows.append((repo, thread, kind, c["id"], "", c.get("body") or "",
+                         (c.get("user") or {}).get("login", ""), c.get("updated_at") or c.get("created_at") or ""))
+        self._upsert(rows)
+
+    def related(self, repo: str, text: str, k: int, exclude: Iterable[int] = ()) -> List[Tuple[int, float]]:
+        """Top ``k`` other threads of ``repo`` for ``text`` as ``(number, score)``, best first."""
+        terms = query_terms(text)
+        if not terms or k <= 0:
+            return []
+        excluded = sorted({int(n) for n in exclude})
+        query = " OR ".join(f'"{t}"' for t in terms)
+        # bm25() cannot be aggregated, so rank matching items and keep each thread's best one
+        sql = f"""
+            SELECT items.number, bm25(items_fts, {TITLE_WEIGHT}, 1.0) AS score
+            FROM items_fts JOIN items ON items.id = items_fts.rowid
+            WHERE items_fts MATCH ? AND items.repo = ?
+            {"AND items.number NOT IN (%s)" % ",".join("?" * len(excluded)) if excluded else ""}
+            ORDER BY score LIMIT ?
+        """
+        with self._lock:
+            try:
+                rows = self._db.execute(sql, [query, repo, *excluded, k * ITEMS_PER_THREAD]).fetchall()
+            except sqlite3.Error as e:
+                logging.getLogger("reporelay").warning("Related-thread lookup failed: %r", e)
+                return []
+        best: Dict[int, float] = {}
+        for number, score in rows:
+            best.setdefault(number, -score)
+        return list(best.items())[:k]
+
+    def thread(self, repo: str, number: int) -> Tuple[str, str, List[Tuple[str, str]]]:
+        """``(title, body, [(author, comment_body), ...])`` of an indexed thread, comments oldest first."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT kind, title, body, author FROM items WHERE repo = ? AND number = ? ORDER BY updated_at, id",
+                (repo, number),
+            ).fetchall()
+        title = body = ""
+        comments = []
+        for kind, t, b, author in rows:
+            if kind == "issue":
+                title, body = t, b
+            else:
+                comments.append((author, b))
+        return title, body, comments
+
+
+def _clip(text: str, limit: int) -> str:
+    data = text.encode("utf-8")
+    if len(data) <= limit:
+        return text
+    return data[: max(0, limit - 3)].decode("utf-8", errors="ignore") + "..."
+
+
+def render_related(index: ConversationIndex, repo: str, matches: List[Tuple[int, float]], max_bytes: int) -> str:
+    """Render matched threads within ``max_bytes``, sharing the budget evenly and passing on what a thread leaves."""
+    parts: List[str] = []
+    remaining = max_bytes
+    for i, (number, _score) in enumerate(matches):
+        share = remaining // (len(matches) - i)
+        title, body, comments = index.thread(repo, number)
+        lines = [f"#{number}: {title.strip() or '(title not indexed)'}"]
+        if body.strip():
+            lines.append(body.strip())
+        for author, text in comments[-5:]:
+            lines.append(f"@{author or 'unknown'}: {text.strip()}")
+        block = _clip("\n".join(lines), share)
+        parts.append(block)
+        remaining -= len(block.encode("utf-8")) + 2
+    return "\n\n".join(parts)
@@ -0,0 +1,88 @@
+"""
+Token-bucket limits on how many runs authors and repos can trigger.
+
+Intake checks a trigger against one bucket per author and one per repo
+right after the trigger pattern matches, before anything is fetched for
+it. A bucket holds up to ``capacity`` runs and refills continuously at
+``capacity / period``; a trigger needs one token from every bucket it
+draws on. Buckets live in a plain dict inside the state file, so a
+restart neither resets nor refills budgets early. A bucket that has
+refilled completely is dropped, since a missing bucket means a full one.
+"""
+
+import math
+import re
+from typing import Dict, Iterable, Optional, Tuple
+
+from . import metrics
+
+THROTTLED = metrics.REGISTRY.counter("reporelay_throttled_triggers_total", "Triggers dropped by intake rate limits, by bucket kind.")
+
+_RATE_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*/\s*(\d+(?:\.\d+)?)?\s*([smhd]?)\s*$", re.I)
+_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(text: str) -> Optional[Tuple[float, float]]:
+    """``"10/h"``, ``"3/15m"`` or ``"20/3600"`` as ``(capacity, period_seconds)``; empty means unlimited.
+
+    Raises ValueError for anything else.
+    """
+    if not text.strip():
+        return None
+    m = _RATE_RE.match(text)
+    if not m or (not m.group(2) and not m.group(3)):
+        raise ValueError(f"expected COUNT/PERIOD such as 10/h or 3/15m, got {text!r}")
+    capacity = float(m.group(1))
+    period = float(m.group(2) or 1) * _UNITS[m.group(3).lower()]
+    if capacity < 1 or period <= 0:
+        raise ValueError(f"rate {text!r} must allow at least one run per positive period")
+    return capacity, period
+
+
+class TokenBuckets:
+    """Named buckets over ``store`` (``{name: {"tokens", "ts", "noticed"}}``) with per-kind limits.
+
+    Names are ``"<kind>:<key>"``; ``limits`` maps a kind to ``(capacity, period)``.
+    """
+
+    def __init__(self, store: dict, limits: Dict[str, Tuple[float, float]]):
+        self.store = store
+        self.limits = limits
+
+    def _level(self, name: str, now: float) -> float:
+        capacity, period = self.limits[name.split(":", 1)[0]]
+        entry = self.store.get(name)
+        if entry is None:
+            return capacity
+        return min(capacity, entry["tokens"] + max(0.0, now - entry["ts"]) * capacity / period)
+
+    def take(self, names: Iterable[str], now: float) -> Optional[Tuple[str, float]]:
+        """Take a token from every limited bucket in ``names``.
+
+        Returns None when the trigger may run, otherwise ``(bucket, seconds until it has a token)``
+        and nothing is taken.
+        """
+        names = [n for n in names if n.split(":", 1)[0] in self.limits]
+        for name in names:
+            level = self._level(name, now)
+            if level < 1:
+                capacity, period = self.limits[name.split(":", 1)[0]]
+                return name, math.ceil((1 - level) * period / capacity)
+        for name in names:
+            self.store[name] = {"tokens": self._level(name, now) - 1, "ts": now, "noticed": False}
+        self.prune(now)
+        return None
+
+    def should_notice(self, name: str) -> bool:
+        """True the first time ``name`` throttles since it last let a trigger through."""
+        entry = self.store.get(name)
+        if entry is None or entry.get("noticed"):
+            return False
+        entry["noticed"] = True
+        return True
+
+    def prune(self, now: float) -> None:
+        for name in list(self.store):
+            kind = name.split(":", 1)[0]
+            if kind not in self.limits or self._level(name, now) >= self.limits[kind][0]:
+                del self.store[name]
@@ -0,0 +1,188 @@
+"""
+Per-job phase tracing for RepoRelay.
+
+Each job collects spans (``get_issue``, ``list_issue_comments``,
+``assemble_payload``, ``run_external``, ``postprocess_stdout``, posting, ...)
+keyed by its ``run_id`` and appends them to a size-rotated JSONL file, one
+span per line. Convert a trace file for chrome://tracing or Perfetto with::
+
+    python -m RepoRelay.tracing .reporelay_trace.jsonl > trace.json
+
+Only a sampled share of jobs is traced, and spans shorter than a threshold
+can be dropped, to bound overhead on busy fleets.
+"""
+
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional
+
+
+class _NullTrace:
+    """Stand-in used when tracing is off or a job was not sampled."""
+
+    sampled = False
+
+    @property
+    def run_id(self) -> str:
+        return ""
+
+    @run_id.setter
+    def run_id(self, value: str) -> None:
+        # shared singleton: never keep per-job state
+        return None
+
+    @contextmanager
+    def span(self, name: str, **attrs) -> Iterator[None]:
+        yield
+
+    def finish(self) -> None:
+        return None
+
+
+NULL_TRACE = _NullTrace()
+
+
+class Trace:
+    sampled = True
+
+    def __init__(self, tracer: "Tracer", attrs: Dict[str, object]):
+        self.tracer = tracer
+        # the job assigns its run_id once known; spans are written on finish()
+        self.run_id = ""
+        self.attrs = attrs
+        self._spans: List[dict] = []
+
+    @contextmanager
+    def span(self, name: str, **attrs) -> Iterator[None]:
+        start = time.time()
+        t0 = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            attrs["error"] = type(e).__name__
+            raise
+        finally:
+            self._spans.append({"span": name, "ts": start, "dur_ms": (time.perf_counter() - t0) * 1000.0, "attrs": attrs})
+
+    def finish(self) -> None:
+        spans, self._spans = self._spans, []
+        for span in spans:
+            span["run_id"] = self.run_id
+            if span["span"] == "job":
+                span["attrs"] = dict(self.attrs, **span["attrs"])
+        self.tracer.write(spans)
+
+
+class Tracer:
+    def __init__(
+        self,
+        path: Optional[str],
+        sample_rate: float = 1.0,
+        min_ms: float = 0.0,
+        max_bytes: int = 10 * 1024 * 1024,
+        backups: int = 3,
+    ):
+        self.path = str(path) if path else None
+        self.sample_rate = min(1.0, max(0.0, sample_rate))
+        self.min_ms = max(0.0, min_ms)
+        self.max_bytes = max_bytes
+        self.backups = max(0, backups)
+        self._lock = threading.Lock()
+
+    def begin(self, **attrs) -> object:
+        """Start a job trace, or return ``NULL_TRACE`` when this job is not sampled."""
+        if not self.path or self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return NULL_TRACE
+        return Trace(self, attrs)
+
+    def record(self, run_id: str, name: str, start: float, end: float, **attrs) -> None:
+        """Write one span that finished outside its job (e.g. a delayed outbound write)."""
+        self.write([{"run_id": run_id, "span": name, "ts": start, "dur_ms": (end - start) * 1000.0, "attrs": attrs}])
+
+    def write(self, spans: Iterable[dict]) -> None:
+        if not self.path:
+            return
+        lines = [json.dumps(s, sort_keys=True) for s in spans if s["span"] == "job" or s["dur_ms"] >= self.min_ms]
+        if not lines:
+            return
+        data = "\n".join(lines) + "\n"
+        with self._lock:
+            try:
+                self._rotate_if_needed(len(data))
+                with open(self.path, "a") as f:
+                    f.write(data)
+            except OSError as e:
+                logging.getLogger("reporelay").warning("Could not write trace to %s: %r", self.path, e)
+
+    def _rotate_if_needed(self, incoming: int) -> None:
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        if size == 0 or size + incoming <= self.max_bytes:
+            return
+        if self.backups == 0:
+            os.remove(self.path)
+            return
+        for idx in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{idx}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{idx + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+
+def to_chrome_trace(records: Iterable[dict]) -> dict:
+    """Convert JSONL span records to the Chrome trace-viewer JSON format (one row per run)."""
+    rows: Dict[str, int] = {}
+    events = []
+    for rec in records:
+        run_id = rec.get("run_id") or "unknown"
+        tid = rows.setdefault(run_id, len(rows) + 1)
+        events.append({
+            "name": rec["span"],
+            "cat": "reporelay",
+            "ph": "X",
+            "ts": int(rec["ts"] * 1_000_000),
+            "dur": int(rec["dur_ms"] * 1000),
+            "pid": 1,
+            "tid": tid,
+            "args": dict(rec.get("attrs") or {}, run_id=run_id),
+        })
+    metadata = [
+        {"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": run_id}}
+        for run_id, tid in rows.items()
+    ]
+    return {"traceEvents": metadata + events, "displayTimeUnit": "ms"}
+
+
+def read_records(path: str) -> List[dict]:
+    records = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    return records
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = sys.argv[1:] if argv is None else argv
+    if not args:
+        print("usage: python -m RepoRelay.tracing TRACE.jsonl [TRACE.jsonl.1 ...] > trace.json", file=sys.stderr)
+        return 2
+    records: List[dict] = []
+    for path in args:
+        records.extend(read_records(path))
+    json.dump(to_chrome_trace(records), sys.stdout)
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -12,21 +12,54 @@ posts the result back to the conversation as a comment.
 Environment is controlled exclusively via `REPORELAY_*` variables.
 """
 
+import argparse
 import datetime as _dt
+import email.utils
+import hashlib
+import itertools
 import json
 import logging
 import os
 import re
+import shlex
 import signal
 import subprocess
 import sys
+import threading
 import time
+import tracemalloc
+from collections import OrderedDict
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Tuple
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+from urllib.parse import urlencode, urlsplit
 
 import requests
 from requests.adapters import HTTPAdapter
+from . import metrics
+from .admission import DEFERRED as ADMISSION_DEFERRED, Admission, resource_limits
+from .automations import (
+    AUTOMATIONS_DIR,
+    DEFAULT_SCHEMA,
+    Automation,
+    AutomationRegistry,
+    load_validator,
+    pull_request_matches,
+    redact,
+)
+from .diffs import MODES as PR_DIFF_MODES, PR_DIFFS, SOURCES as PR_DIFF_SOURCES, DiffCache, local_diff, render
+from .dispatch import BATCH_EVENT, DispatchBatcher
+from .fairshare import Candidate, FairShare, parse_weights
+from .outbox import Outbox, comment_marker
+from .processed import ProcessedIds
+from .profiling import Profiler
+from .related import ConversationIndex, fts5_available, render_related
+from .records import CommentRecord, IssueEventRecord, IssueRecord, PullRecord, ReviewCommentRecord
+from .projects import ProjectsClient, ProjectsError
+from .throttle import THROTTLED, TokenBuckets, parse_rate
+from .tracing import NULL_TRACE, Tracer
+from .webhook import WebhookEvent, WebhookReceiver
+
 try:
     # urllib3>=1.26
     from urllib3.util.retry import Retry
@@ -71,19 +104,50 @@ def _strip_ansi(text: str) -> str:
     return _ANSI_RE.sub("", text)
 
 
-def _compute_new_since(previous: str, batches: Iterable[Iterable[dict]]) -> str:
-    """Return the latest timestamp seen across batches, falling back to previous."""
-    candidates = [previous]
-    for batch in batches:
-        for item in batch:
-            for key in ("updated_at", "created_at"):
-                ts = item.get(key)
-                if ts:
-                    candidates.append(ts)
-    try:
-        return max(candidates)
-    except ValueError:
+def _compute_new_since(
+    previous: str,
+    batches: Iterable[Iterable[dict]],
+    server_date: Optional[str] = None,
+    overlap: float = 0.0,
+) -> str:
+    """Return the next ``since`` watermark, never earlier than ``previous``.
+
+    ``server_date`` is GitHub's clock when the listing was answered (its ``Date``
+    header, as ISO8601): everything updated before it was in the response. Without
+    it the latest ``updated_at``/``created_at`` in ``batches`` is used. ``overlap``
+    seconds are subtracted to absorb items that become visible late; re-fetched
+    items are filtered by the processed ids.
+    """
+    base = server_date or ""
+    if not base:
+        for batch in batches:
+            for item in batch:
+                for key in ("updated_at", "created_at"):
+                    ts = item.get(key)
+                    if ts and ts > base:
+                        base = ts
+    if not base:
         return previous
+    if overlap:
+        try:
+            base = _iso(_parse_iso(base) - _dt.timedelta(seconds=overlap))
+        except ValueError:
+            return previous
+    return max(previous, base) if previous else base
+
+
+def _server_time(headers) -> Optional[str]:
+    """GitHub's ``Date`` response header as ISO8601 UTC, or None."""
+    value = headers.get("Date") if headers is not None else None
+    if not value:
+        return None
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(_dt.timezone.utc).replace(tzinfo=None)
+    return _iso(parsed)
 
 
 def _now_utc() -> str:
@@ -98,6 +162,16 @@ def _parse_iso(s: str) -> _dt.datetime:
     return _dt.datetime.strptime(s, ISO8601)
 
 
+def _epoch(s: Optional[str]) -> Optional[float]:
+    """UTC epoch seconds for an ISO8601 timestamp, or None when missing or malformed."""
+    if not s:
+        return None
+    try:
+        return _parse_iso(s).replace(tzinfo=_dt.timezone.utc).timestamp()
+    except ValueError:
+        return None
+
+
 def _build_subprocess_env(cwd: Path) -> Dict[str, str]:
     env = dict(os.environ)
     if env.get("REPORELAY_FORWARD_GITHUB_TOKEN") != "1":
@@ -173,7 +247,18 @@ class Config:
     regex: str = field(default_factory=lambda: _env("REGEX", r"codexe"))
     match_target: str = field(default_factory=lambda: _env("MATCH_TARGET", "comments"))
     poll_seconds: int = field(default_factory=lambda: int(_env("POLL_SECONDS", "20")))
+    # Stop after this many poll cycles (0 = run until signalled); used by benchmarks
+    max_cycles: int = field(default_factory=lambda: int(_env("MAX_CYCLES", "0")))
+    api_url: str = field(default_factory=lambda: _env("API_URL", "https://api.github.com").rstrip("/"))
     per_repo_pause: float = field(default_factory=lambda: float(_env("PER_REPO_PAUSE", "0.3")))
+    # "poll", or "webhook" to react to deliveries and poll only to reconcile
+    mode: str = field(default_factory=lambda: _env("MODE", "poll").lower())
+    webhook_host: str = field(default_factory=lambda: _env("WEBHOOK_HOST", "127.0.0.1"))
+    webhook_port: int = field(default_factory=lambda: int(_env("WEBHOOK_PORT", "8787")))
+    webhook_secret: str = field(default_factory=lambda: _env("WEBHOOK_SECRET", ""))
+    webhook_reconcile_seconds: float = field(default_factory=lambda: float(_env("WEBHOOK_RECONCILE_SECONDS", "900")))
+    # Seconds the next "since" watermark reaches back before GitHub's clock at the last fetch
+    since_overlap_seconds: float = field(default_factory=lambda: float(_env("SINCE_OVERLAP_SECONDS", "5")))
     state_path: Path = field(default=None)
     codex_cmd: str = field(default_factory=lambda: os.getenv("CODEX_CMD", "codex"))
     codex_args: List[str] = field(default_factory=lambda: os.getenv("CODEX_ARGS", "exec -").split())
@@ -184,24 +269,106 @@ class Config:
     exclude_dirs: List[str] = field(default_factory=lambda: [s for s in _env("EXCLUDE_DIRS", "").split(",") if s])
     ignore_self: bool = field(default_factory=lambda: _env_flag("IGNORE_SELF", False))
     default_resume: bool = field(default_factory=lambda: _env_flag("DEFAULT_RESUME", True))
+    coalesce_seconds: float = field(default_factory=lambda: float(_env("COALESCE_SECONDS", "0")))
     resume_send_context: bool = field(default_factory=lambda: _env_flag("RESUME_SEND_CONTEXT", False))
+    resume_delta: bool = field(default_factory=lambda: _env_flag("RESUME_DELTA", True))
     # Projects logging / repository_dispatch integration
     projects_enable: bool = field(default_factory=lambda: _env_flag("PROJECTS_ENABLE", False))
     dispatch_repo: str = field(default_factory=lambda: _env("DISPATCH_REPO", ""))
+    dispatch_spool: Path = field(default=None)
+    dispatch_flush_seconds: float = field(default_factory=lambda: float(_env("DISPATCH_FLUSH_SECONDS", "30")))
+    dispatch_batch_size: int = field(default_factory=lambda: int(_env("DISPATCH_BATCH_SIZE", "20")))
     default_model: str = field(default_factory=lambda: os.getenv("PROJECT_DEFAULT_MODEL", "gpt-5-codex"))
     project_owner: str = field(default_factory=lambda: os.getenv("PROJECT_OWNER", ""))
     project_number: str = field(default_factory=lambda: os.getenv("PROJECT_NUMBER", ""))
+    # Outbound write queue (comments, reactions, project logging)
+    outbox_path: Path = field(default=None)
+    write_interval: float = field(default_factory=lambda: float(_env("WRITE_INTERVAL", "1.0")))
+    write_max_attempts: int = field(default_factory=lambda: int(_env("WRITE_MAX_ATTEMPTS", "8")))
+    # Prometheus endpoint; 0 disables it
+    metrics_port: int = field(default_factory=lambda: int(_env("METRICS_PORT", "0")))
+    metrics_host: str = field(default_factory=lambda: _env("METRICS_HOST", "127.0.0.1"))
+    # Per-job phase tracing (JSONL); empty path disables it
+    trace_path: str = field(default_factory=lambda: _env("TRACE", ""))
+    trace_sample: float = field(default_factory=lambda: float(_env("TRACE_SAMPLE", "1.0")))
+    trace_min_ms: float = field(default_factory=lambda: float(_env("TRACE_MIN_MS", "0")))
+    trace_max_bytes: int = field(default_factory=lambda: int(_env("TRACE_MAX_BYTES", str(10 * 1024 * 1024))))
+    trace_backups: int = field(default_factory=lambda: int(_env("TRACE_BACKUPS", "3")))
+    # On-demand profiling: SIGUSR1 profiles this many cycles, SIGUSR2 writes a memory report
+    profile_cycles: int = field(default_factory=lambda: int(_env("PROFILE_CYCLES", "5")))
+    trace_malloc: bool = field(default_factory=lambda: _env_flag("TRACEMALLOC", False))
+    tracemalloc_top: int = field(default_factory=lambda: int(_env("TRACEMALLOC_TOP", "25")))
+    # .automations/*.yaml orchestrator (needs PyYAML)
+    automations: bool = field(default_factory=lambda: _env_flag("AUTOMATIONS", False))
+    automation_schema: Path = field(default_factory=lambda: Path(_env("AUTOMATION_SCHEMA", str(DEFAULT_SCHEMA))))
+    # Issue in each repo that receives schedule run reports; 0 logs them only
+    automation_log_issue: int = field(default_factory=lambda: int(_env("AUTOMATION_LOG_ISSUE", "0")))
+    # PR diff in job payloads: "off", "summary" or "full", from the local clone or the API
+    pr_diff: str = field(default_factory=lambda: _env("PR_DIFF", "off").lower())
+    pr_diff_source: str = field(default_factory=lambda: _env("PR_DIFF_SOURCE", "auto").lower())
+    pr_diff_max_bytes: int = field(default_factory=lambda: int(_env("PR_DIFF_MAX_BYTES", "100000")))
+    pr_diff_cache: Path = field(default=None)
+    pr_diff_cache_entries: int = field(default_factory=lambda: int(_env("PR_DIFF_CACHE_ENTRIES", "256")))
+    # Related threads from the local full-text index (SQLite FTS5); 0 disables it
+    related_threads: int = field(default_factory=lambda: int(_env("RELATED", "0")))
+    related_max_bytes: int = field(default_factory=lambda: int(_env("RELATED_MAX_BYTES", "8000")))
+    index_path: Path = field(default=None)
+    # Fair-share ordering of ready jobs across repos and authors (weights and boosts in seconds of runtime)
+    fair_share: bool = field(default_factory=lambda: _env_flag("FAIR_SHARE", False))
+    repo_weights: str = field(default_factory=lambda: _env("REPO_WEIGHTS", ""))
+    author_weights: str = field(default_factory=lambda: _env("AUTHOR_WEIGHTS", ""))
+    priority_labels: str = field(default_factory=lambda: _env("PRIORITY_LABELS", "priority:high=900,priority:low=-900"))
+    review_boost: float = field(default_factory=lambda: float(_env("REVIEW_BOOST", "300")))
+    aging: float = field(default_factory=lambda: float(_env("AGING", "1.0")))
+    # In-thread "codexe cancel": how often a running job's thread is checked (0 = never) and the SIGTERM grace
+    cancel_poll_seconds: float = field(default_factory=lambda: float(_env("CANCEL_POLL_SECONDS", "15")))
+    cancel_grace_seconds: float = field(default_factory=lambda: float(_env("CANCEL_GRACE_SECONDS", "10")))
+    # Admission control before a job starts (0 = not checked); jobs past a threshold stay queued
+    max_load: float = field(default_factory=lambda: float(_env("MAX_LOAD", "0")))
+    min_mem_available_mb: float = field(default_factory=lambda: float(_env("MIN_MEM_AVAILABLE_MB", "0")))
+    max_running: int = field(default_factory=lambda: int(_env("MAX_RUNNING", "0")))
+    # Per-job limits applied in the child before exec (0 = none)
+    job_rlimit_as_mb: int = field(default_factory=lambda: int(_env("JOB_RLIMIT_AS_MB", "0")))
+    job_rlimit_cpu_seconds: int = field(default_factory=lambda: int(_env("JOB_RLIMIT_CPU_SECONDS", "0")))
+    job_nice: int = field(default_factory=lambda: int(_env("JOB_NICE", "0")))
+    # Intake rate limits as COUNT/PERIOD (e.g. 10/h); empty means unlimited
+    author_rate: str = field(default_factory=lambda: _env("AUTHOR_RATE", ""))
+    repo_rate: str = field(default_factory=lambda: _env("REPO_RATE", ""))
 
     def __post_init__(self):
         if self.state_path is None:
             self.state_path = self.root / ".reporelay_state.json"
         if self.lockfile is None:
             self.lockfile = self.root / ".reporelay.lock"
+        if self.outbox_path is None:
+            self.outbox_path = Path(_env("OUTBOX", str(self.root / ".reporelay_outbox.json")))
+        if self.dispatch_spool is None:
+            self.dispatch_spool = Path(_env("DISPATCH_SPOOL", str(self.root / ".reporelay_dispatch_spool.jsonl")))
+        if self.pr_diff_cache is None:
+            self.pr_diff_cache = Path(_env("PR_DIFF_CACHE", str(self.root / ".reporelay_diffs")))
+        if self.index_path is None:
+            self.index_path = Path(_env("INDEX", str(self.root / ".reporelay_index.sqlite3")))
+        if self.pr_diff not in PR_DIFF_MODES:
+            sys.exit("REPORELAY_PR_DIFF must be 'off', 'summary' or 'full'.")
+        if self.pr_diff_source not in PR_DIFF_SOURCES:
+            sys.exit("REPORELAY_PR_DIFF_SOURCE must be 'auto', 'local' or 'api'.")
+        for name in ("repo_weights", "author_weights", "priority_labels"):
+            try:
+                parse_weights(getattr(self, name))
+            except ValueError as e:
+                sys.exit(f"REPORELAY_{name.upper()}: {e}")
+        for name in ("author_rate", "repo_rate"):
+            try:
+                parse_rate(getattr(self, name))
+            except ValueError as e:
+                sys.exit(f"REPORELAY_{name.upper()}: {e}")
         self.match_target = self.match_target.lower()
         if self.match_target not in {"comments", "issue_or_comments"}:
             sys.exit("REPORELAY_MATCH_TARGET must be 'comments' or 'issue_or_comments'.")
         if self.per_repo_pause < 0:
             self.per_repo_pause = 0.0
+        if self.coalesce_seconds < 0:
+            self.coalesce_seconds = 0.0
 
     @staticmethod
     def from_env() -> "Config":
@@ -214,8 +381,23 @@ class Config:
         root = Path(_env("ROOT", str(default_root))).resolve()
         return Config(token=token, root=root)
 
+class _Flight:
+    """One shared GET within a poll cycle: waiters block on ``done`` and reuse the outcome."""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+# Changed-file lists kept per (repo, PR, head SHA)
+PULL_FILES_CACHE_SIZE = 512
+
+
 class GitHub:
-    def __init__(self, token: str):
+    def __init__(self, token: str, api: str = "https://api.github.com"):
         self.session = requests.Session()
         # Configure robust retries for transient network/server errors on idempotent methods
         # Environment-tunable via REPORELAY_HTTP_* variables
@@ -242,8 +424,68 @@ class GitHub:
             "Accept": "application/vnd.github+json",
             "User-Agent": "reporelay/1.0",
         })
-        self.api = "https://api.github.com"
+        self.session.hooks["response"].append(self._record_response)
+        self.api = api
         self._me = None
+        # Server clock of the first page of the latest *_since listing (ISO8601), for watermarks
+        self.last_list_date: Optional[str] = None
+        # Cycle-scoped singleflight for enrichment GETs (see begin_cycle/end_cycle)
+        self._flight_lock = threading.Lock()
+        self._flights: Dict[Tuple, _Flight] = {}
+        self._cycle_open = False
+        # ETag, projected page and Link header per conditional listing URL (see _get_conditional)
+        self._etags: Dict[str, Tuple[str, list, str]] = {}
+        # Changed file names per (repo, number, head sha), least recently used first
+        self._pull_files: "OrderedDict[Tuple[str, int, str], List[str]]" = OrderedDict()
+
+    @staticmethod
+    def _record_response(r, *args, **kwargs) -> None:
+        method = getattr(r.request, "method", None) or "GET"
+        metrics.record_response(method, urlsplit(r.url).path, r.status_code, r.headers)
+
+    def begin_cycle(self) -> None:
+        """Start sharing identical enrichment GETs until ``end_cycle``."""
+        with self._flight_lock:
+            self._flights.clear()
+            self._cycle_open = True
+
+    def end_cycle(self) -> None:
+        with self._flight_lock:
+            self._flights.clear()
+            self._cycle_open = False
+
+    def _invalidate(self, *keys: Tuple) -> None:
+        with self._flight_lock:
+            for key in keys:
+                self._flights.pop(key, None)
+
+    def _singleflight(self, key: Tuple, fetch):
+        """Return ``fetch()``, sharing one in-flight call and its result per key within a cycle."""
+        with self._flight_lock:
+            if not self._cycle_open:
+                flight, leader = None, False
+            else:
+                flight = self._flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[key] = _Flight()
+        if flight is None:
+            return fetch()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = fetch()
+        except BaseException as e:
+            flight.error = e
+            # failed lookups are not cached; later callers retry
+            self._invalidate(key)
+            raise
+        finally:
+            flight.done.set()
+        return flight.result
 
     def me_login(self) -> str:
         if self._me is None:
@@ -252,20 +494,23 @@ class GitHub:
             self._me = r.json()["login"]
         return self._me
 
-    def list_issue_comments_since(self, repo: str, since_iso: str, per_page: int = 100) -> List[dict]:
+    def list_issue_comments_since(self, repo: str, since_iso: str, per_page: int = 100) -> List[CommentRecord]:
         """List comments across all issues for a single repo since ISO time."""
-        comments: List[dict] = []
+        comments: List[CommentRecord] = []
         url = f"{self.api}/repos/{repo}/issues/comments"
         params = {"since": since_iso, "per_page": per_page, "page": 1}
+        self.last_list_date = None
         while True:
             r = self.session.get(url, params=params, timeout=60)
+            if self.last_list_date is None:
+                self.last_list_date = _server_time(r.headers)
             if r.status_code == 304:
                 break
             r.raise_for_status()
             batch = r.json()
             if not isinstance(batch, list):
                 break
-            comments.extend(batch)
+            comments.extend(CommentRecord.from_api(c) for c in batch)
             link = r.headers.get("Link", "")
             if 'rel="next"' not in link:
                 break
@@ -276,20 +521,23 @@ class GitHub:
             url, params = next_url, {}
         return comments
 
-    def list_review_comments_since(self, repo: str, since_iso: str, per_page: int = 100) -> List[dict]:
+    def list_review_comments_since(self, repo: str, since_iso: str, per_page: int = 100) -> List[ReviewCommentRecord]:
         """List pull request review comments across a repo since ISO time."""
-        comments: List[dict] = []
+        comments: List[ReviewCommentRecord] = []
         url = f"{self.api}/repos/{repo}/pulls/comments"
         params = {"since": since_iso, "per_page": per_page, "page": 1}
+        self.last_list_date = None
         while True:
             r = self.session.get(url, params=params, timeout=60)
+            if self.last_list_date is None:
+                self.last_list_date = _server_time(r.headers)
             if r.status_code == 304:
                 break
             r.raise_for_status()
             batch = r.json()
             if not isinstance(batch, list):
                 break
-            comments.extend(batch)
+            comments.extend(ReviewCommentRecord.from_api(c) for c in batch)
             link = r.headers.get("Link", "")
             if 'rel="next"' not in link:
                 break
@@ -300,20 +548,30 @@ class GitHub:
             url, params = next_url, {}
         return comments
 
-    def get_issue(self, repo: str, number: int) -> dict:
+    def get_issue(self, repo: str, number: int) -> IssueRecord:
+        return self._singleflight(("get_issue", repo, number), lambda: self._get_issue(repo, number))
+
+    def _get_issue(self, repo: str, number: int) -> IssueRecord:
         r = self.session.get(f"{self.api}/repos/{repo}/issues/{number}", timeout=30)
         r.raise_for_status()
-        return r.json()
+        return IssueRecord.from_api(r.json())
+
+    def list_issue_comments(self, repo: str, number: int) -> List[CommentRecord]:
+        comments = self._singleflight(
+            ("list_issue_comments", repo, number),
+            lambda: self._list_issue_comments(repo, number),
+        )
+        return list(comments)
 
-    def list_issue_comments(self, repo: str, number: int) -> List[dict]:
+    def _list_issue_comments(self, repo: str, number: int) -> List[CommentRecord]:
         url = f"{self.api}/repos/{repo}/issues/{number}/comments"
-        out: List[dict] = []
+        out: List[CommentRecord] = []
         params = {"per_page": 100, "page": 1}
         while True:
             r = self.session.get(url, params=params, timeout=60)
             r.raise_for_status()
             batch = r.json()
-            out.extend(batch)
+            out.extend(CommentRecord.from_api(c) for c in batch)
             link = r.headers.get("Link", "")
             if 'rel="next"' not in link:
                 break
@@ -324,9 +582,9 @@ class GitHub:
             url, params = next_url, {}
         return out
 
-    def list_issues_since(self, repo: str, since_iso: str, per_page: int = 100) -> List[dict]:
+    def list_issues_since(self, repo: str, since_iso: str, per_page: int = 100) -> List[IssueRecord]:
         """List issues (excluding PRs) updated since ISO time."""
-        issues: List[dict] = []
+        issues: List[IssueRecord] = []
         url = f"{self.api}/repos/{repo}/issues"
         params = {"since": since_iso, "per_page": per_page, "page": 1, "state": "all"}
         while True:
@@ -340,7 +598,7 @@ class GitHub:
             for item in batch:
                 if "pull_request" in item:
                     continue
-                issues.append(item)
+                issues.append(IssueRecord.from_api(item))
             link = r.headers.get("Link", "")
             if 'rel="next"' not in link:
                 break
@@ -351,12 +609,115 @@ class GitHub:
             url, params = next_url, {}
         return issues
 
+    def _get_conditional(self, url: str, params: Optional[dict], project) -> Tuple[list, str]:
+        """GET a listing page with ``If-None-Match``; returns ``(project(json), link_header)``.
+
+        A 304 (which does not count against the rate limit) returns the page
+        projected from the last 200 for the same URL.
+        """
+        key = url + ("?" + urlencode(sorted(params.items())) if params else "")
+        cached = self._etags.get(key)
+        r = self.session.get(url, params=params, headers={"If-None-Match": cached[0]} if cached else None, timeout=60)
+        if r.status_code == 304 and cached:
+            return cached[1], cached[2]
+        r.raise_for_status()
+        page, link = project(r.json()), r.headers.get("Link", "")
+        etag = r.headers.get("ETag")
+        if etag:
+            self._etags[key] = (etag, page, link)
+        return page, link
+
+    def get_pull(self, repo: str, number: int) -> PullRecord:
+        return self._singleflight(("get_pull", repo, number), lambda: self._get_pull(repo, number))
+
+    def _get_pull(self, repo: str, number: int) -> PullRecord:
+        r = self.session.get(f"{self.api}/repos/{repo}/pulls/{number}", timeout=30)
+        r.raise_for_status()
+        return PullRecord.from_api(r.json())
+
+    def compare_diff(self, repo: str, base: str, head: str) -> str:
+        """Unified diff between two commits (``base...head``, as a pull request shows it)."""
+        r = self.session.get(
+            f"{self.api}/repos/{repo}/compare/{base}...{head}",
+            headers={"Accept": "application/vnd.github.v3.diff"},
+            timeout=120,
+        )
+        r.raise_for_status()
+        return r.text
+
+    def list_open_pulls(self, repo: str, per_page: int = 100) -> List[PullRecord]:
+        """Open pull requests with their head SHAs; unchanged pages are revalidated by ETag."""
+        pulls: List[PullRecord] = []
+        url, params = f"{self.api}/repos/{repo}/pulls", {"state": "open", "per_page": per_page}
+        while url:
+            page, link = self._get_conditional(
+                url, params, lambda batch: [PullRecord.from_api(i) for i in batch] if isinstance(batch, list) else []
+            )
+            pulls.extend(page)
+            m = re.search(r'<([^>]+)>;\s*rel="next"', link)
+            url, params = (m.group(1), None) if m else (None, None)
+        return pulls
+
+    def list_pull_files(self, repo: str, number: int, head_sha: str) -> List[str]:
+        """Paths changed by a pull request (renames add the old path too), cached per head SHA."""
+        key = (repo, number, head_sha)
+        files = self._pull_files.get(key)
+        if files is not None:
+            self._pull_files.move_to_end(key)
+            return files
+        # The endpoint reports the PR's current head; a push racing this call is caught as the next synchronize
+        files = []
+        url, params = f"{self.api}/repos/{repo}/pulls/{number}/files", {"per_page": 100}
+        while url:
+            r = self.session.get(url, params=params, timeout=60)
+            r.raise_for_status()
+            for item in r.json():
+                files.append(item.get("filename") or "")
+                if item.get("previous_filename"):
+                    files.append(item["previous_filename"])
+            m = re.search(r'<([^>]+)>;\s*rel="next"', r.headers.get("Link", ""))
+            url, params = (m.group(1), None) if m else (None, None)
+        self._pull_files[key] = files
+        while len(self._pull_files) > PULL_FILES_CACHE_SIZE:
+            self._pull_files.popitem(last=False)
+        return files
+
+    def list_issue_events(self, repo: str, per_page: int = 100) -> List[IssueEventRecord]:
+        """Most recent issue events of a repo, newest first (one page; callers poll often)."""
+        r = self.session.get(f"{self.api}/repos/{repo}/issues/events", params={"per_page": per_page}, timeout=60)
+        r.raise_for_status()
+        batch = r.json()
+        if not isinstance(batch, list):
+            return []
+        return [IssueEventRecord.from_api(item) for item in batch]
+
+    def poll_thread_comments(self, repo: str, number: int, since_iso: str, etag: str = "",
+                             review: bool = False) -> Tuple[Optional[list], str]:
+        """First page of a thread's comments (PR review comments with ``review``) updated since ``since_iso``.
+
+        Revalidated with ``etag``; returns ``(None, etag)`` when GitHub answers
+        304 (free against the rate limit).
+        """
+        r = self.session.get(
+            f"{self.api}/repos/{repo}/{'pulls' if review else 'issues'}/{number}/comments",
+            params={"since": since_iso, "per_page": 100},
+            headers={"If-None-Match": etag} if etag else None,
+            timeout=30,
+        )
+        if r.status_code == 304:
+            return None, etag
+        r.raise_for_status()
+        record = ReviewCommentRecord if review else CommentRecord
+        return [record.from_api(c) for c in r.json()], r.headers.get("ETag", "")
+
     def post_issue_comment(self, repo: str, number: int, body: str) -> dict:
         r = self.session.post(
             f"{self.api}/repos/{repo}/issues/{number}/comments",
             json={"body": body},
             timeout=60,
         )
+        # our own comment bumps the thread; drop anything shared for it this cycle
+        self._invalidate(("get_issue", repo, number), ("list_issue_comments", repo, number))
         r.raise_for_status()
         return r.json()
 
@@ -399,6 +760,12 @@ class GitHub:
         r.raise_for_status()
         return True
 
+def _state_json_default(value):
+    if isinstance(value, ProcessedIds):
+        return value.to_json()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
 class State:
     def __init__(self, path: Path):
         self.path = str(path)
@@ -407,7 +774,7 @@ class State:
                 # "owner/repo": {
                 #     "path": "/abs/local/path",
                 #     "last_since": ISO8601,
-                #     "processed_comment_ids": [],
+                #     "processed_comment_ids": ProcessedIds,  # persisted encoded
                 #     "runs": {}  # issue_number -> dict(...)
                 # }
             }
@@ -429,20 +796,23 @@ class State:
                 "path": str(path),
                 "last_since": _iso(_dt.datetime.utcnow() - _dt.timedelta(days=7)),
                 "pr_review_last_since": _iso(_dt.datetime.utcnow() - _dt.timedelta(days=7)),
-                "processed_comment_ids": [],
-                "processed_review_comment_ids": [],
+                "processed_comment_ids": ProcessedIds(),
+                "processed_review_comment_ids": ProcessedIds(),
                 "runs": {},
                 "issue_runs": {},
                 "pr_runs": {},
+                "pending_triggers": {},
             }
         else:
             # keep path up to date if it changed
             self.data["repos"][repo]["path"] = str(path)
-            self.data["repos"][repo].setdefault("processed_comment_ids", [])
-            self.data["repos"][repo].setdefault("processed_review_comment_ids", [])
+            for key in _PROCESSED_KEYS.values():
+                # migrates legacy id lists and decodes the persisted form once
+                self.data["repos"][repo][key] = ProcessedIds.load(self.data["repos"][repo].get(key))
             self.data["repos"][repo].setdefault("runs", {})
             self.data["repos"][repo].setdefault("issue_runs", {})
             self.data["repos"][repo].setdefault("pr_runs", {})
+            self.data["repos"][repo].setdefault("pending_triggers", {})
             if "last_since" not in self.data["repos"][repo]:
                 self.data["repos"][repo]["last_since"] = _iso(_dt.datetime.utcnow() - _dt.timedelta(days=7))
             self.data["repos"][repo].setdefault(
@@ -453,7 +823,7 @@ class State:
     def save(self):
         tmp = self.path + ".tmp"
         with open(tmp, "w") as f:
-            json.dump(self.data, f, indent=2)
+            json.dump(self.data, f, indent=2, default=_state_json_default)
         os.replace(tmp, self.path)
 
 class SingleInstanceLock:
@@ -480,32 +850,95 @@ class SingleInstanceLock:
         finally:
             self.fd.close()
 
+# ``[^\S\n]`` is whitespace other than newline: a ``^\s*`` prefix would scan across every
+# following blank line from each line start, which is quadratic on whitespace-heavy
+# bodies. ``\s*(?:[:\-]\s*)?`` matches what ``\s*[:\-]?\s*`` did without two adjacent
+# stars, so a ``Parent:`` line may still have the ``#N`` on the next line.
+_PARENT_LINE_RE = re.compile(r"(?im)^[^\S\n]*parent\s*(?:[:\-]\s*)?#(\d+)[^\S\n]*$")
+_PARENT_WORD_RE = re.compile(r"(?i)\bparent\b")
+_ISSUE_REF_RE = re.compile(r"#(\d+)")
+
+
 def find_parent_issue_number(issue_body: str) -> Optional[int]:
     if not issue_body:
         return None
-    m = re.search(r"(?im)^\s*parent\s*[:\-]?\s*#(\d+)\s*$", issue_body)
+    m = _PARENT_LINE_RE.search(issue_body)
     if m:
         return int(m.group(1))
     for line in issue_body.splitlines():
-        if re.search(r"(?i)\bparent\b", line):
-            m2 = re.search(r"#(\d+)", line)
+        if _PARENT_WORD_RE.search(line):
+            m2 = _ISSUE_REF_RE.search(line)
             if m2:
                 return int(m2.group(1))
     return None
 
+def _body_digest(item: Optional[dict]) -> str:
+    if not item:
+        return ""
+    text = f"{item.get('title') or ''}\n{item.get('body') or ''}"
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _comment_id_value(comment: dict) -> int:
+    try:
+        return int(comment.get("id") or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def context_watermark(issue: dict, comments: List[dict], parent: Optional[dict]) -> Dict[str, object]:
+    """Describe the context included in a run so a later resume can send only the delta."""
+    last = max(comments, key=_comment_id_value, default=None)
+    return {
+        "context_last_comment_id": _comment_id_value(last) if last else 0,
+        "context_last_comment_at": (last or {}).get("created_at") or "",
+        "context_body_sha": _body_digest(issue),
+        "context_parent_sha": _body_digest(parent),
+    }
+
+
+def select_resume_delta(
+    conversation_state: dict,
+    issue: dict,
+    comments: List[dict],
+    parent: Optional[dict],
+) -> Tuple[List[dict], bool, bool]:
+    """Return ``(new_comments, body_changed, parent_changed)`` relative to the last run's watermark."""
+    last_id = int(conversation_state.get("context_last_comment_id") or 0)
+    new_comments = [c for c in comments if _comment_id_value(c) > last_id]
+    body_changed = conversation_state.get("context_body_sha") != _body_digest(issue)
+    parent_changed = parent is not None and conversation_state.get("context_parent_sha") != _body_digest(parent)
+    return new_comments, body_changed, parent_changed
+
+
 def build_job_input(
     repo: str,
     issue: dict,
     comments: List[dict],
     parent: Optional[dict],
-    trigger_comment: dict,
+    trigger_comment: Union[dict, List[dict]],
     resume: bool,
     conversation_type: str = "issue",
+    delta_since: Optional[str] = None,
+    include_body: bool = True,
+    sections: Iterable[Tuple[str, str]] = (),
 ) -> str:
+    """Assemble the stdin payload for a run.
+
+    ``trigger_comment`` may be a list when several triggers were coalesced into one
+    job; every trigger body is then included in order.
+    When ``delta_since`` is set, ``comments`` is expected to hold only the comments
+    posted after the previous run and the sections are labelled accordingly.
+    ``sections`` are extra ``(title, text)`` blocks appended after the comments.
+    """
+    triggers = trigger_comment if isinstance(trigger_comment, list) else [trigger_comment]
+    trigger_comment = triggers[-1]
     conversation_type = conversation_type or "issue"
     label = "PR" if conversation_type == "pr" else "ISSUE"
     body_label = f"{label} BODY"
     comments_label = f"{label} COMMENTS (chronological)"
+    if delta_since is not None:
+        comments_label = f"NEW {label} COMMENTS SINCE LAST RUN ({delta_since or 'start'}, chronological)"
     header = [
         f"REPO: {repo}",
         f"{label}: #{issue['number']} - {issue.get('title','').strip()}",
@@ -518,7 +951,7 @@ def build_job_input(
         "3) Perform the requested work, and provide your output.",
         "",
         f"=== {body_label} ===",
-        issue.get("body") or "(no body)",
+        (issue.get("body") or "(no body)") if include_body else "(unchanged since last run)",
         "",
     ]
 
@@ -530,13 +963,24 @@ def build_job_input(
             "",
         ])
 
-    trigger_body = trigger_comment.get("body") or ""
-    if trigger_body:
-        header.extend([
-            "=== TRIGGER COMMENT BODY ===",
-            trigger_body,
-            "",
-        ])
+    if len(triggers) > 1:
+        header[2] = "TRIGGERED_BY: " + ", ".join(
+            f"comment_id={t.get('id')} by @{t.get('user',{}).get('login','')} at {t.get('created_at')}"
+            for t in triggers
+        )
+        header.append(f"=== TRIGGER COMMENT BODIES ({len(triggers)}, chronological) ===")
+        for t in triggers:
+            header.append(f"[{t.get('created_at', '?')}] @{t.get('user', {}).get('login', 'unknown')}:")
+            header.append((t.get("body") or "").rstrip())
+            header.append("")
+    else:
+        trigger_body = trigger_comment.get("body") or ""
+        if trigger_body:
+            header.extend([
+                "=== TRIGGER COMMENT BODY ===",
+                trigger_body,
+                "",
+            ])
 
     header.append(f"=== {comments_label} ===")
     for c in sorted(comments, key=lambda x: x.get("created_at","")):
@@ -547,27 +991,103 @@ def build_job_input(
         header.append(body)
         header.append("")
 
+    for title, text in sections:
+        header.extend([f"=== {title} ===", text, ""])
+
     return "\n".join(header)
 
-def run_external(codex_cmd: str, codex_args: List[str], payload: Optional[str], timeout: int, cwd: Path) -> Tuple[int, str, str]:
+def run_external(
+    codex_cmd: str,
+    codex_args: List[str],
+    payload: Optional[str],
+    timeout: int,
+    cwd: Path,
+    extra_env: Optional[Dict[str, str]] = None,
+    cancel: Optional[threading.Event] = None,
+    grace: float = 10.0,
+    preexec_fn: Optional[Callable[[], None]] = None,
+    stopped: Optional[threading.Event] = None,
+) -> Tuple[int, str, str]:
+    """Run the command in its own process group, feeding ``payload`` on stdin.
+
+    On timeout, or when ``cancel`` is set, the whole group gets SIGTERM and,
+    ``grace`` seconds later, SIGKILL. A cancelled run returns what it had
+    written so far and sets ``stopped``; a cancel that comes after the
+    command exited leaves ``stopped`` clear. ``preexec_fn`` runs in the
+    child before exec (resource limits, nice).
+    """
+    env = _build_subprocess_env(cwd)
+    if extra_env:
+        env.update(extra_env)
     try:
-        proc = subprocess.run(
+        proc = subprocess.Popen(
             [codex_cmd] + codex_args,
-            input=(payload.encode("utf-8") if payload is not None else None),
-            capture_output=True,
-            timeout=timeout,
+            stdin=subprocess.PIPE if payload is not None else None,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
             cwd=str(cwd),
-            env=_build_subprocess_env(cwd),
+            env=env,
+            start_new_session=True,
+            preexec_fn=preexec_fn,
         )
-        out = proc.stdout.decode("utf-8", errors="replace")
-        err = proc.stderr.decode("utf-8", errors="replace")
-        return proc.returncode, out, err
-    except subprocess.TimeoutExpired:
-        return 124, "", f"Process timed out after {timeout}s."
     except FileNotFoundError:
         return 127, "", f"Command not found or not executable: {codex_cmd}"
     except Exception as e:
         return 125, "", f"Unexpected error: {e!r}"
+    # held while a cancel is acted on; taken once the command is done so a late cancel cannot touch the result
+    verdict = threading.Lock()
+    if cancel is not None:
+        threading.Thread(target=_stop_on_cancel, args=(proc, cancel, grace, verdict, stopped),
+                         name="reporelay-cancel", daemon=True).start()
+    try:
+        try:
+            stdout, stderr = proc.communicate(payload.encode("utf-8") if payload is not None else None, timeout=timeout)
+        finally:
+            verdict.acquire()
+    except subprocess.TimeoutExpired:
+        _terminate_group(proc, grace)
+        proc.communicate()
+        return 124, "", f"Process timed out after {timeout}s."
+    except Exception as e:
+        _terminate_group(proc, 0)
+        proc.wait()
+        return 125, "", f"Unexpected error: {e!r}"
+    return proc.returncode, stdout.decode("utf-8", errors="replace"), stderr.decode("utf-8", errors="replace")
+
+
+def _terminate_group(proc: subprocess.Popen, grace: float) -> bool:
+    """SIGTERM the process group of ``proc``, then SIGKILL whatever is left after ``grace`` seconds.
+
+    Returns False when the group was already gone.
+    """
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except (ProcessLookupError, PermissionError):
+        return False
+    deadline = time.monotonic() + grace
+    while proc.poll() is None and time.monotonic() < deadline:
+        time.sleep(0.1)
+    # children may outlive the leader and keep the output pipes open
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+    return True
+
+
+def _stop_on_cancel(proc: subprocess.Popen, cancel: threading.Event, grace: float, verdict: threading.Lock,
+                    stopped: Optional[threading.Event] = None) -> None:
+    while proc.poll() is None:
+        if cancel.wait(0.5):
+            # run_external takes ``verdict`` when the command is done: a cancel after that is too late
+            if not verdict.acquire(blocking=False):
+                return
+            try:
+                if proc.poll() is None and _terminate_group(proc, grace) and stopped is not None:
+                    stopped.set()
+            finally:
+                verdict.release()
+            return
 
 
 def postprocess_stdout(out: str, codex_cmd: str) -> str:
@@ -627,8 +1147,7 @@ def postprocess_stdout(out: str, codex_cmd: str) -> str:
             if filtered and filtered[-1] != "":
                 filtered.append("")
             continue
-        lower_line = stripped.lower()
-        if any(lower_line.startswith(prefix) for prefix in skip_prefixes):
+        if stripped.lower().startswith(skip_prefixes):
             continue
         filtered.append(stripped)
 
@@ -647,30 +1166,108 @@ def postprocess_stdout(out: str, codex_cmd: str) -> str:
     return cleaned or out.strip()
 
 
+_NON_SPACE_RE = re.compile(r"\S")
+
+
 def _split_for_github_comments(text: str, limit: int = 65000) -> List[str]:
     if not text:
         return [""]
     if len(text) <= limit:
         return [text]
     parts: List[str] = []
-    remaining = text
-    while len(remaining) > limit:
-        cut = remaining.rfind("\n\n", 0, limit)
+    # walk an offset instead of re-slicing the remainder, which copied the text once per part
+    pos, end = 0, len(text)
+    while end - pos > limit:
+        cut = text.rfind("\n\n", pos, pos + limit)
         if cut == -1:
-            cut = limit
-        chunk = remaining[:cut].rstrip()
-        parts.append(chunk)
-        remaining = remaining[cut:].lstrip()
-    if remaining:
-        parts.append(remaining)
+            cut = pos + limit
+        parts.append(text[pos:cut].rstrip())
+        nxt = _NON_SPACE_RE.search(text, cut)
+        pos = nxt.start() if nxt else end
+    if pos < end:
+        parts.append(text[pos:])
     return parts
 
 
-def _post_long_comment(gh: GitHub, repo: str, number: int, body: str) -> None:
+def _post_long_comment(outbox: Outbox, repo: str, number: int, body: str, trace_id: str = "") -> None:
+    """Queue ``body`` as one or more comments; parts keep their order on the thread's outbox key."""
     chunks = _split_for_github_comments(body)
+    metrics.COMMENT_PARTS.inc(len(chunks))
     for idx, chunk in enumerate(chunks, 1):
         suffix = f"\n\n(part {idx}/{len(chunks)})" if len(chunks) > 1 else ""
-        gh.post_issue_comment(repo, number, chunk + suffix)
+        payload = {"repo": repo, "number": number, "body": chunk + suffix}
+        if trace_id:
+            payload["trace"] = trace_id
+        outbox.submit("comment", f"{repo}#{number}", payload)
+
+
+def build_outbox(cfg: Config, gh: GitHub, tracer: Optional[Tracer] = None) -> Outbox:
+    """Create the outbound write queue with delivery handlers bound to ``gh``."""
+    outbox = Outbox(cfg.outbox_path, min_interval=cfg.write_interval, max_attempts=cfg.write_max_attempts)
+
+    def deliver_comment(op: dict) -> None:
+        p = op["payload"]
+        marker = comment_marker(op["id"])
+        if op.get("attempts") or op.get("replayed"):
+            # an earlier attempt (or one cut short by a restart) may have landed; never post twice
+            existing = gh._list_issue_comments(p["repo"], p["number"])
+            if any(marker in (c.get("body") or "") for c in existing):
+                return None
+        started = time.time()
+        gh.post_issue_comment(p["repo"], p["number"], f"{p['body']}\n\n{marker}")
+        if tracer is not None and p.get("trace"):
+            # queued time is part of the reply latency, so the span starts at submission
+            tracer.record(p["trace"], "deliver_comment", op["created"], time.time(),
+                          attempts=op.get("attempts", 0), post_ms=round((time.time() - started) * 1000.0, 3))
+        return None
+
+    def deliver_reaction(op: dict) -> None:
+        p = op["payload"]
+        if p.get("review"):
+            reacted = gh.add_reaction_to_review_comment(p["repo"], p["comment_id"], p["content"])
+        else:
+            reacted = gh.add_reaction_to_comment(p["repo"], p["comment_id"], p["content"])
+        if reacted:
+            logging.getLogger("reporelay").info("Added %s reaction to %s comment %s", p["content"], p["repo"], p["comment_id"])
+        return None
+
+    projects = ProjectsClient(gh.session, cfg.project_owner, cfg.project_number, api=gh.api) if cfg.project_number else None
+
+    def deliver_project_start(op: dict) -> dict:
+        p = op["payload"]
+        if projects is None:
+            return {"item_id": None}
+        try:
+            item_id = projects.start(p["title"], p["body"], p["run_id"], p["branch"], p["repo"], p.get("issue_url", ""))
+        except ProjectsError as e:
+            logging.getLogger("reporelay").warning("Project logging failed for %s: %s", p["run_id"], e)
+            item_id = None
+        return {"item_id": item_id}
+
+    def deliver_project_finish(op: dict) -> None:
+        p = op["payload"]
+        started = outbox.result(op.get("after")) or {}
+        if projects is None or not started.get("item_id"):
+            return None
+        try:
+            projects.finish(started["item_id"], p["status"], p.get("tokens_total"), p.get("start_ts"), "now", p["run_id"])
+        except ProjectsError as e:
+            logging.getLogger("reporelay").warning("Project logging failed for %s: %s", p["run_id"], e)
+        return None
+
+    outbox.register("comment", deliver_comment)
+    outbox.register("reaction", deliver_reaction)
+    outbox.register("project_start", deliver_project_start)
+    outbox.register("project_finish", deliver_project_finish)
+    return outbox
+
+
+def _queue_reaction(outbox: Outbox, repo: str, number: int, comment_id, content: str, review: bool = False) -> str:
+    return outbox.submit(
+        "reaction",
+        f"{repo}#{number}",
+        {"repo": repo, "comment_id": comment_id, "content": content, "review": review},
+    )
 
 
 _RUN_ID_PATTERNS = [
@@ -680,13 +1277,45 @@ _RUN_ID_PATTERNS = [
 ]
 
 
+# The same patterns for the lower-cased text, split so each starts with a literal:
+# case-insensitive or ``\b``-prefixed patterns defeat the regex engine's literal scan
+# and cost ~1s on a 10 MB transcript. Groups keep the priority order above; the
+# leading ``\b`` is checked by hand.
+_RUN_ID_SCANS = [
+    ([re.compile(r"run[ _-]?id\s*[:=]\s*([a-z0-9._-]{6,})"), re.compile(r"session\s*[:=]\s*([a-z0-9._-]{6,})")], True),
+    ([re.compile(r"resume\s+with:?\s*codex\s+resume\s+([a-z0-9._-]{6,})")], True),
+    ([re.compile(r"\"id\"\s*:\s*\"([a-z0-9._-]{6,})\"")], False),
+]
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+def _first_scan_match(lower: str, pattern: "re.Pattern", word_start: bool) -> Optional["re.Match"]:
+    match = pattern.search(lower)
+    while match is not None and word_start and match.start() > 0 and _is_word_char(lower[match.start() - 1]):
+        # retry one character on: the rejected match may hide an overlapping one ("mysession: session=...")
+        match = pattern.search(lower, match.start() + 1)
+    return match
+
+
 def extract_codex_run_id(text: str) -> Optional[str]:
     """Return a Codex run identifier found in mixed stdout/stderr text, if any."""
     blob = text or ""
-    for pat in _RUN_ID_PATTERNS:
-        match = pat.search(blob)
-        if match:
-            return match.group(1)
+    lower = blob.lower()
+    if len(lower) != len(blob):
+        # some character changed length when lower-cased; offsets would not line up
+        for pat in _RUN_ID_PATTERNS:
+            match = pat.search(blob)
+            if match:
+                return match.group(1)
+        return None
+    for patterns, word_start in _RUN_ID_SCANS:
+        found = [m for m in (_first_scan_match(lower, p, word_start) for p in patterns) if m]
+        if found:
+            match = min(found, key=lambda m: m.start())
+            return blob[match.start(1):match.end(1)]
     return None
 
 
@@ -698,8 +1327,21 @@ def _git_current_branch(cwd: Path) -> str:
         return ""
 
 
-def _dispatch_start(gh: GitHub, cfg: Config, local_path: Path, hub_repo: str, run_id: str, repo: str, number: int, title: str, body_preview: str):
-    if not cfg.projects_enable or not hub_repo:
+def build_dispatcher(cfg: Config, gh: GitHub) -> Optional[DispatchBatcher]:
+    """Create the batched hub emitter when Projects dispatching is enabled."""
+    if not cfg.projects_enable or not cfg.dispatch_repo:
+        return None
+    hub_repo = cfg.dispatch_repo
+    return DispatchBatcher(
+        lambda batch: gh.repository_dispatch(hub_repo, BATCH_EVENT, batch),
+        cfg.dispatch_spool,
+        interval=cfg.dispatch_flush_seconds,
+        max_batch=cfg.dispatch_batch_size,
+    )
+
+
+def _dispatch_start(dispatcher: Optional[DispatchBatcher], cfg: Config, local_path: Path, hub_repo: str, run_id: str, repo: str, number: int, title: str, body_preview: str):
+    if dispatcher is None or not cfg.projects_enable or not hub_repo:
         return
     payload = {
         "title": f"{title}",
@@ -711,13 +1353,13 @@ def _dispatch_start(gh: GitHub, cfg: Config, local_path: Path, hub_repo: str, ru
         "issue_number": number,
     }
     try:
-        gh.repository_dispatch(hub_repo, "task_started", payload)
+        dispatcher.emit("task_started", payload)
     except Exception as e:
         logging.getLogger("reporelay").warning("Failed to dispatch task_started: %r", e)
 
 
-def _dispatch_finish(gh: GitHub, cfg: Config, hub_repo: str, run_id: str, ok: bool, start_ts: str, end_ts: str, tokens_total: Optional[int] = None):
-    if not cfg.projects_enable or not hub_repo:
+def _dispatch_finish(dispatcher: Optional[DispatchBatcher], cfg: Config, hub_repo: str, run_id: str, ok: bool, start_ts: str, end_ts: str, tokens_total: Optional[int] = None):
+    if dispatcher is None or not cfg.projects_enable or not hub_repo:
         return
     event = "task_done" if ok else "task_failed"
     payload = {
@@ -729,85 +1371,90 @@ def _dispatch_finish(gh: GitHub, cfg: Config, hub_repo: str, run_id: str, ok: bo
     if tokens_total is not None:
         payload["tokens_total"] = tokens_total
     try:
-        gh.repository_dispatch(hub_repo, event, payload)
+        dispatcher.emit(event, payload)
     except Exception as e:
         logging.getLogger("reporelay").warning("Failed to dispatch %s: %r", event, e)
 
 
-def _dispatch_pr_opened(gh: GitHub, cfg: Config, hub_repo: str, run_id: str, pr_url: str):
-    if not cfg.projects_enable or not hub_repo or not pr_url:
+def _dispatch_pr_opened(dispatcher: Optional[DispatchBatcher], cfg: Config, hub_repo: str, run_id: str, pr_url: str):
+    if dispatcher is None or not cfg.projects_enable or not hub_repo or not pr_url:
         return
     payload = {"run_id": run_id, "pr_url": pr_url}
     try:
-        gh.repository_dispatch(hub_repo, "pr_opened", payload)
+        dispatcher.emit("pr_opened", payload)
     except Exception as e:
         logging.getLogger("reporelay").warning("Failed to dispatch pr_opened: %r", e)
 
 
-def _logger_env_for_cli(cfg: Optional[Config] = None) -> Dict[str, str]:
-    env = dict(os.environ)
-    # The logger script expects GH_TOKEN or GITHUB_TOKEN; prefer GH_TOKEN
-    tok = env.get("GITHUB_TOKEN", "")
-    if tok:
-        env.setdefault("GH_TOKEN", tok)
-    # ensure common binary path where gh may live
-    hp = str(Path.home() / "bin")
-    env["PATH"] = env.get("PATH", "") + (":" + hp if hp not in env.get("PATH", "") else "")
-    if cfg is not None:
-        if cfg.project_owner:
-            env["PROJECT_OWNER"] = cfg.project_owner
-        if cfg.project_number:
-            env["PROJECT_NUMBER"] = str(cfg.project_number)
-    return env
+def _project_start(outbox: Outbox, title: str, body: str, run_id: str, branch: str, repo: str, issue_url: str = "") -> str:
+    """Queue project logging for a run start; returns the op id that ``_project_finish`` waits on."""
+    return outbox.submit(
+        "project_start",
+        f"project:{run_id}",
+        {
+            "title": title,
+            "body": body,
+            "run_id": run_id,
+            "branch": branch,
+            "repo": repo,
+            "issue_url": issue_url,
+            "start_ts": int(time.time()),
+        },
+    )
 
 
-def _cli_project_start(local_path: Path, title: str, body: str, run_id: str, branch: str, repo: str) -> Optional[str]:
-    script = Path.cwd() / "scripts" / "project-logger.sh"
-    if not script.exists():
-        return None
-    try:
-        cmd = ["bash", str(script), "start", "--title", title, "--body", body, "--run-id", run_id]
-        if branch:
-            cmd += ["--branch", branch]
-        if repo:
-            cmd += ["--repo", repo]
-        out = subprocess.check_output(cmd, cwd=str(Path.cwd()), env=_logger_env_for_cli(), text=True)
-        return out.strip() or None
-    except Exception:
-        return None
+def _project_finish(outbox: Outbox, start_op: str, run_id: str, status: str, start_ts: int, tokens_total: Optional[int] = None) -> str:
+    return outbox.submit(
+        "project_finish",
+        f"project:{run_id}",
+        {"run_id": run_id, "status": status, "start_ts": start_ts, "tokens_total": tokens_total},
+        after=start_op,
+    )
 
 
-def _cli_project_finish(item_id: Optional[str], run_id: Optional[str], status: str, tokens_total: Optional[int] = None):
-    script = Path.cwd() / "scripts" / "project-logger.sh"
-    if not script.exists():
-        return
-    try:
-        if item_id:
-            cmd = ["bash", str(script), "finish", "--item-id", item_id, "--status", status, "--start-ts", "now", "--end-ts", "now"]
-        elif run_id:
-            # Attempt lookup by Run ID via gh CLI and finish
-            # Fallback: skip silently
-            return
-        else:
-            return
-        if tokens_total is not None:
-            cmd += ["--tokens-total", str(tokens_total)]
-        subprocess.run(cmd, cwd=str(Path.cwd()), env=_logger_env_for_cli(), check=False, text=True, capture_output=True)
-    except Exception:
-        return
+_CODEXE_RE = re.compile(r"(?i)\bcodexe\b")
+_NEW_RE = re.compile(r"(?i)\bnew\b")
+_RESUME_RE = re.compile(r"(?i)\bresume\b")
+_RESUME_ID_RE = re.compile(r"\s+([A-Za-z0-9._-]{6,})")
+# Only the word right after the trigger cancels, so "codexe new: cancel the old flag" stays a request
+_CANCEL_RE = re.compile(r"(?i)\bcodexe\s+cancel\b")
+
+
+def _keyword_after_trigger(snippet: str, keyword: "re.Pattern", last: bool = False) -> Optional["re.Match"]:
+    """Find ``keyword`` on the same line after the line's first ``codexe`` mention.
+
+    Equivalent to ``codexe.*keyword`` (``.`` stops at newlines) but linear: only the
+    first mention per line is used, so many mentions on one long line cannot make the
+    ``.*`` backtrack once per mention. ``last`` picks the final match on that line,
+    as the greedy ``.*`` did.
+    """
+    line_end = -1
+    for trigger in _CODEXE_RE.finditer(snippet):
+        if trigger.start() < line_end:
+            continue
+        line_end = snippet.find("\n", trigger.end())
+        if line_end == -1:
+            line_end = len(snippet)
+        found = None
+        for found in keyword.finditer(snippet, trigger.end(), line_end):
+            if not last:
+                break
+        if found is not None:
+            return found
+    return None
 
 
 def extract_intent(text: str) -> Tuple[str, Optional[str]]:
     """Infer trigger intent from comment text."""
     snippet = text or ""
-    if re.search(r"(?i)\bcodexe\b.*\bnew\b", snippet):
+    if _CANCEL_RE.search(snippet):
+        return "cancel", None
+    if _keyword_after_trigger(snippet, _NEW_RE):
         return "new", None
-    resume_match = re.search(
-        r"(?i)\bcodexe\b.*\bresume\b(?:\s+([A-Za-z0-9._-]{6,}))?",
-        snippet,
-    )
+    resume_match = _keyword_after_trigger(snippet, _RESUME_RE, last=True)
     if resume_match:
-        return "resume", resume_match.group(1)
+        run_id = _RESUME_ID_RE.match(snippet, resume_match.end())
+        return "resume", run_id.group(1) if run_id else None
     return "default", None
 
 
@@ -835,6 +1482,52 @@ def decide_codex_invocation(
     return cfg.codex_args, True, False, None
 
 
+def assemble_payload(
+    cfg: Config,
+    repo: str,
+    issue: dict,
+    comments: List[dict],
+    parent: Optional[dict],
+    trigger_comment: Union[dict, List[dict]],
+    conversation_state: dict,
+    resume_flag: bool,
+    resume_target: Optional[str],
+    conversation_type: str,
+    sections: Iterable[Tuple[str, str]] = (),
+) -> str:
+    """Build the job payload, sending only the delta when resuming a session that saw the rest."""
+    use_delta = (
+        cfg.resume_delta
+        and resume_flag
+        and "context_last_comment_id" in conversation_state
+        and conversation_state.get("codex_run_id") == resume_target
+    )
+    if not use_delta:
+        return build_job_input(
+            repo,
+            issue,
+            comments,
+            parent,
+            trigger_comment,
+            resume=resume_flag,
+            conversation_type=conversation_type,
+            sections=sections,
+        )
+    new_comments, body_changed, parent_changed = select_resume_delta(conversation_state, issue, comments, parent)
+    return build_job_input(
+        repo,
+        issue,
+        new_comments,
+        parent if parent_changed else None,
+        trigger_comment,
+        resume=resume_flag,
+        conversation_type=conversation_type,
+        delta_since=conversation_state.get("context_last_comment_at") or "",
+        include_body=body_changed,
+        sections=sections,
+    )
+
+
 def format_result_comment(ok: bool, run_id: str, returncode: int, out: str, err: str) -> str:
     out = (out or "").strip()
     if out:
@@ -849,8 +1542,1194 @@ def format_result_comment(ok: bool, run_id: str, returncode: int, out: str, err:
 def extract_resume_flag(text: str) -> bool:
     return bool(re.search(r"(?i)\bresume\b", text or ""))
 
-def main():
+def merge_intents(bodies: List[str]) -> Tuple[str, Optional[str]]:
+    """Resolve the intent of coalesced triggers; the latest explicit request wins."""
+    intent, requested_id = "default", None
+    for body in bodies:
+        candidate, candidate_id = extract_intent(body)
+        if candidate != "default":
+            intent, requested_id = candidate, candidate_id
+    return intent, requested_id
+
+
+@dataclass
+class LoopContext:
+    """Collaborators shared by the intake and job execution helpers of the poll loop."""
+    cfg: Config
+    gh: GitHub
+    st: State
+    me: str
+    trigger_re: "re.Pattern"
+    outbox: Outbox
+    dispatcher: Optional[DispatchBatcher] = None
+    tracer: Optional[Tracer] = None
+    automations: Optional[AutomationRegistry] = None
+    diffs: Optional[DiffCache] = None
+    index: Optional[ConversationIndex] = None
+    fairshare: Optional[FairShare] = None
+    throttle: Optional[TokenBuckets] = None
+    admission: Optional[Admission] = None
+
+
+# How far behind the poll watermark processed ids are kept exactly before pruning
+PROCESSED_RETENTION_SECONDS = 3600
+
+_PROCESSED_KEYS = {
+    "issue_comment": "processed_comment_ids",
+    "pr_review_comment": "processed_review_comment_ids",
+}
+
+
+def _processed_ids(meta: dict, key: str) -> ProcessedIds:
+    processed = meta.get(key)
+    if not isinstance(processed, ProcessedIds):
+        processed = meta[key] = ProcessedIds.load(processed)
+    return processed
+
+
+def _mark_processed(meta: dict, source: str, trigger_id, stamp: Optional[float] = None) -> None:
+    key = _PROCESSED_KEYS.get(source)
+    if key is None or trigger_id is None:
+        return
+    _processed_ids(meta, key).add(trigger_id, stamp)
+
+
+def _pending_ids(meta: dict) -> set:
+    return {t.get("id") for triggers in meta.get("pending_triggers", {}).values() for t in triggers}
+
+
+def _queue_trigger(meta: dict, number: int, trigger: dict) -> None:
+    trigger["queued_at"] = time.time()
+    meta.setdefault("pending_triggers", {}).setdefault(str(number), []).append(trigger)
+
+
+# Reaction on triggers dropped by the intake rate limits (the 👀 of accepted ones is distinct)
+THROTTLE_REACTION = "confused"
+
+
+def build_throttle(cfg: Config, st: State) -> Optional[TokenBuckets]:
+    limits = {kind: rate for kind, rate in (("author", parse_rate(cfg.author_rate)), ("repo", parse_rate(cfg.repo_rate))) if rate}
+    if not limits:
+        return None
+    return TokenBuckets(st.data.setdefault("throttle", {}), limits)
+
+
+def throttle_trigger(ctx: LoopContext, repo: str, number: int, author: str, comment_id=None, review: bool = False) -> bool:
+    """True when a matched trigger is over its author or repo budget.
+
+    The trigger comment gets the ``confused`` reaction; the thread gets one
+    notice per bucket until that bucket lets a trigger through again.
+    """
+    if ctx.throttle is None:
+        return False
+    hit = ctx.throttle.take((f"author:{author}", f"repo:{repo}"), time.time())
+    if hit is None:
+        return False
+    bucket, retry = hit
+    kind = bucket.split(":", 1)[0]
+    THROTTLED.inc(kind=kind)
+    logging.getLogger("reporelay").warning("Throttled trigger from @%s on %s#%s (%s budget spent, next run in %ds)",
+                                           author, repo, number, bucket, retry)
+    if comment_id is not None:
+        _queue_reaction(ctx.outbox, repo, number, comment_id, THROTTLE_REACTION, review=review)
+    if ctx.throttle.should_notice(bucket):
+        capacity, period = ctx.throttle.limits[kind]
+        who = f"@{author}" if kind == "author" else "this repository"
+        _post_long_comment(ctx.outbox, repo, number, (
+            f"Rate limit reached for {who}: at most {capacity:g} run(s) per {_dt.timedelta(seconds=int(period))}. "
+            f"Triggers are ignored until the budget refills (next run possible in about {_dt.timedelta(seconds=retry)}); "
+            "post the command again after that. This notice is not repeated while the limit lasts."
+        ))
+    return True
+
+
+def cancel_pending(ctx: LoopContext, repo: str, meta: dict, number: int, comment_id, author: str, review: bool = False) -> None:
+    """Handle a ``codexe cancel`` seen at intake: drop the conversation's queued triggers.
+
+    No job is running at intake time (running jobs watch their own thread),
+    so only triggers still waiting in the debounce window or queue remain.
+    """
+    dropped = meta.get("pending_triggers", {}).pop(str(number), [])
+    if not dropped:
+        return
+    for t in dropped:
+        _mark_processed(meta, t["source"], t["id"])
+    metrics.JOBS_CANCELLED.inc(stage="queued")
+    logging.getLogger("reporelay").info("@%s cancelled %d queued trigger(s) on %s#%d", author, len(dropped), repo, number)
+    _queue_reaction(ctx.outbox, repo, number, comment_id, "+1", review=review)
+
+
+def intake_issue_comment(ctx: LoopContext, repo: str, meta: dict, c: dict, processed: ProcessedIds, pending: set) -> None:
+    """Queue a trigger for an issue/PR conversation comment, or mark it processed."""
+    cid = c.get("id")
+    if cid in processed or cid in pending:
+        return
+    body = c.get("body") or ""
+    author = c.get("user", {}).get("login", "")
+    m = re.search(r"/issues/(\d+)$", c.get("issue_url", ""))
+    if (ctx.cfg.ignore_self and author == ctx.me) or not ctx.trigger_re.search(body) or not m:
+        processed.add(cid, _epoch(c.get("updated_at") or c.get("created_at")))
+        return
+    if extract_intent(body)[0] == "cancel":
+        cancel_pending(ctx, repo, meta, int(m.group(1)), cid, author)
+        processed.add(cid, _epoch(c.get("updated_at") or c.get("created_at")))
+        return
+    if throttle_trigger(ctx, repo, int(m.group(1)), author, cid):
+        processed.add(cid, _epoch(c.get("updated_at") or c.get("created_at")))
+        return
+    _queue_trigger(meta, int(m.group(1)), {
+        "id": cid,
+        "source": "issue_comment",
+        "author": author,
+        "body": body,
+        "comment": {
+            "id": cid,
+            "user": {"login": author},
+            "created_at": c.get("created_at"),
+            "body": body,
+        },
+    })
+    pending.add(cid)
+
+
+def intake_review_comment(ctx: LoopContext, repo: str, meta: dict, rc: dict, processed: ProcessedIds, pending: set) -> None:
+    """Queue a trigger for a pull request review comment, or mark it processed."""
+    rcid = rc.get("id")
+    if rcid in processed or rcid in pending:
+        return
+    body = rc.get("body") or ""
+    author = rc.get("user", {}).get("login", "")
+    pr_match = re.search(r"/pulls/(\d+)$", rc.get("pull_request_url") or "")
+    if (ctx.cfg.ignore_self and author == ctx.me) or not ctx.trigger_re.search(body) or not pr_match:
+        processed.add(rcid, _epoch(rc.get("updated_at") or rc.get("created_at")))
+        return
+    if extract_intent(body)[0] == "cancel":
+        cancel_pending(ctx, repo, meta, int(pr_match.group(1)), rcid, author, review=True)
+        processed.add(rcid, _epoch(rc.get("updated_at") or rc.get("created_at")))
+        return
+    if throttle_trigger(ctx, repo, int(pr_match.group(1)), author, rcid, review=True):
+        processed.add(rcid, _epoch(rc.get("updated_at") or rc.get("created_at")))
+        return
+
+    location_bits: List[str] = []
+    if rc.get("path"):
+        location_bits.append(f"path={rc['path']}")
+    if rc.get("line"):
+        location_bits.append(f"line={rc['line']}")
+    elif rc.get("original_line"):
+        location_bits.append(f"original_line={rc['original_line']}")
+    if rc.get("side"):
+        location_bits.append(f"side={rc['side']}")
+    review_context = ", ".join(location_bits)
+    review_body = body
+    if review_context:
+        review_body = f"{review_body}\n\n[Review context: {review_context}]"
+    if rc.get("html_url"):
+        review_body = f"{review_body}\n\nLink: {rc['html_url']}"
+
+    _queue_trigger(meta, int(pr_match.group(1)), {
+        "id": rcid,
+        "source": "pr_review_comment",
+        "author": author,
+        "body": body,
+        "html_url": rc.get("html_url") or "",
+        "comment": {
+            "id": rcid,
+            "user": {"login": author},
+            "created_at": rc.get("created_at") or rc.get("updated_at") or _now_utc(),
+            "body": review_body,
+        },
+    })
+    pending.add(rcid)
+
+
+def remember_labels(ctx: LoopContext, meta: dict, issues: Iterable[dict]) -> None:
+    """Keep the priority labels of ``issues`` in ``meta["priority_labels"]`` for the fair-share scheduler."""
+    if ctx.fairshare is None or not ctx.fairshare.label_boosts:
+        return
+    store = meta.setdefault("priority_labels", {})
+    for issue in issues:
+        number = issue.get("number")
+        if number is None:
+            continue
+        names = [l.get("name") or "" if isinstance(l, dict) else l for l in issue.get("labels") or ()]
+        labels = sorted(n for n in names if n.lower() in ctx.fairshare.label_boosts)
+        if labels:
+            store[str(number)] = labels
+        else:
+            store.pop(str(number), None)
+
+
+def intake_issue(ctx: LoopContext, repo: str, meta: dict, issue: dict, pending: set) -> None:
+    """Queue a trigger for a matching issue/PR title or body (``issue_or_comments`` mode)."""
+    title_text = issue.get("title", "") or ""
+    body_text = issue.get("body", "") or ""
+    if not (ctx.trigger_re.search(title_text) or ctx.trigger_re.search(body_text)):
+        return
+    number = issue.get("number")
+    if number is None:
+        return
+    author = (issue.get("user") or {}).get("login", "")
+    is_pr = bool(issue.get("pull_request"))
+    issue_updated_at = issue.get("updated_at") or issue.get("created_at") or _now_utc()
+    runs_store = meta.setdefault("pr_runs" if is_pr else "issue_runs", {})
+    updated_field = "last_pr_updated" if is_pr else "last_issue_updated"
+    if runs_store.get(str(number), {}).get(updated_field) == issue_updated_at:
+        return
+    trigger_id = issue.get("id") or f"issue-{number}"
+    if trigger_id in pending:
+        return
+    throttled = meta.setdefault("throttled_issues", {})
+    if throttled.get(str(number)) == issue_updated_at:
+        return
+    if throttle_trigger(ctx, repo, number, author):
+        throttled[str(number)] = issue_updated_at
+        return
+    throttled.pop(str(number), None)
+    _queue_trigger(meta, number, {
+        "id": trigger_id,
+        "source": "issue",
+        "author": author,
+        "body": body_text or title_text,
+        "issue_updated_at": issue_updated_at,
+        "comment": {
+            "id": trigger_id,
+            "user": {"login": author},
+            "created_at": issue.get("created_at") or issue_updated_at,
+            "body": body_text or title_text,
+        },
+    })
+    pending.add(trigger_id)
+
+
+def ready_conversations(meta: dict, window: float, now: Optional[float] = None) -> List[str]:
+    """Return conversation numbers whose newest pending trigger is older than the debounce window."""
+    now = time.time() if now is None else now
+    ready = []
+    for number, triggers in meta.get("pending_triggers", {}).items():
+        if not triggers:
+            continue
+        newest = max(t.get("queued_at", 0) for t in triggers)
+        if now - newest >= window:
+            ready.append(number)
+    return ready
+
+
+def build_tracer(cfg: Config) -> Optional[Tracer]:
+    if not cfg.trace_path:
+        return None
+    return Tracer(
+        cfg.trace_path,
+        sample_rate=cfg.trace_sample,
+        min_ms=cfg.trace_min_ms,
+        max_bytes=cfg.trace_max_bytes,
+        backups=cfg.trace_backups,
+    )
+
+
+def runtime_sizes(ctx: LoopContext) -> Dict[str, int]:
+    """Sizes of the long-lived structures, for the SIGUSR2 memory report."""
+    repos = ctx.st.data.get("repos", {})
+    sizes = {
+        "state.json_bytes": len(json.dumps(ctx.st.data, default=_state_json_default)),
+        "state.repos": len(repos),
+        "state.processed_comment_ids": sum(len(m.get("processed_comment_ids", [])) for m in repos.values()),
+        "state.processed_review_comment_ids": sum(len(m.get("processed_review_comment_ids", [])) for m in repos.values()),
+        "state.pending_triggers": sum(len(t) for m in repos.values() for t in m.get("pending_triggers", {}).values()),
+        "state.runs": sum(len(m.get("runs", {})) + len(m.get("issue_runs", {})) + len(m.get("pr_runs", {})) for m in repos.values()),
+        "github.singleflight_entries": len(ctx.gh._flights),
+        "outbox.queued": len(ctx.outbox),
+    }
+    if ctx.dispatcher is not None:
+        sizes["dispatch.buffered"] = len(ctx.dispatcher)
+    if ctx.automations is not None:
+        sizes["automations.scheduled"] = len(ctx.automations.scheduler)
+        sizes["automations.cached_files"] = len(ctx.automations)
+    if ctx.fairshare is not None:
+        sizes["fairshare.repo_clocks"] = len(ctx.fairshare.repos.clock)
+        sizes["fairshare.author_clocks"] = len(ctx.fairshare.authors.clock)
+    if ctx.index is not None:
+        sizes["index.items"] = len(ctx.index)
+    return sizes
+
+
+def build_profiler(cfg: Config, ctx: LoopContext) -> Profiler:
+    if cfg.trace_malloc and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    return Profiler(cfg.state_path.parent, cycles=cfg.profile_cycles, sizes=lambda: runtime_sizes(ctx), top=cfg.tracemalloc_top)
+
+
+def build_diff_cache(cfg: Config) -> Optional[DiffCache]:
+    if cfg.pr_diff == "off":
+        return None
+    return DiffCache(cfg.pr_diff_cache, cfg.pr_diff_cache_entries)
+
+
+def pr_diff_section(ctx: LoopContext, repo: str, number: int, local_path: Path, conversation_state: dict,
+                    delta: bool) -> Tuple[Tuple[str, str], str]:
+    """Payload section with the PR's diff (or change summary), and its ``<base>..<head>`` cache key.
+
+    When ``delta`` is set and the session already saw this exact diff, the
+    section only says so. The key is empty when no diff could be attached.
+    """
+    cfg = ctx.cfg
+    pull = ctx.gh.get_pull(repo, number)
+    label = "PR DIFF" if cfg.pr_diff == "full" else "PR CHANGED FILES"
+    title = f"{label} ({pull.base_ref} {pull.base_sha[:7]}...{pull.head_ref} {pull.head_sha[:7]})"
+    key = DiffCache.key(pull.base_sha, pull.head_sha)
+    if key is None:
+        return (title, "(unavailable)"), ""
+    if delta and conversation_state.get("context_diff") == key:
+        return (title, "(unchanged since last run)"), key
+    diff, source = ctx.diffs.get(pull.base_sha, pull.head_sha), "cache"
+    if diff is None:
+        if cfg.pr_diff_source in ("auto", "local"):
+            diff, source = local_diff(local_path, pull.base_sha, pull.head_sha), "local"
+        if diff is None and cfg.pr_diff_source in ("auto", "api"):
+            diff, source = ctx.gh.compare_diff(repo, pull.base_sha, pull.head_sha), "api"
+        if diff is None:
+            return (title, "(commits not available locally)"), ""
+        ctx.diffs.put(pull.base_sha, pull.head_sha, diff)
+    PR_DIFFS.inc(source=source)
+    return (title, render(diff, cfg.pr_diff, cfg.pr_diff_max_bytes)), key
+
+
+def build_index(cfg: Config) -> Optional[ConversationIndex]:
+    if cfg.related_threads <= 0:
+        return None
+    if not fts5_available():
+        logging.getLogger("reporelay").warning("SQLite lacks FTS5; REPORELAY_RELATED is ignored.")
+        return None
+    return ConversationIndex(cfg.index_path)
+
+
+def related_section(ctx: LoopContext, repo: str, issue: dict, parent_issue: Optional[dict],
+                    triggers: List[dict]) -> Optional[Tuple[str, str]]:
+    """Payload section with the threads of ``repo`` closest to this conversation, from the local index only."""
+    text = "\n".join([issue.get("title") or "", issue.get("body") or ""] + [t["body"] for t in triggers])
+    exclude = {issue.get("number")} | ({parent_issue.get("number")} if parent_issue else set())
+    matches = ctx.index.related(repo, text, ctx.cfg.related_threads, {n for n in exclude if n is not None})
+    if not matches:
+        return None
+    return f"RELATED THREADS (top {len(matches)} from the local index)", render_related(
+        ctx.index, repo, matches, ctx.cfg.related_max_bytes
+    )
+
+
+def watch_for_cancel(ctx: LoopContext, repo: str, meta: dict, number: int, since_iso: str,
+                     cancel: threading.Event, found: dict, stop: threading.Event, is_pr: bool = False) -> None:
+    """Poll a running job's thread for a ``codexe cancel`` comment; sets ``cancel`` and fills ``found``.
+
+    Runs on its own thread while the loop waits for the job. Pull requests
+    are also checked for review comments. Unchanged threads cost a 304 each
+    time.
+    """
+    sources = ["issue_comment"] + (["pr_review_comment"] if is_pr else [])
+    etags = dict.fromkeys(sources, "")
+    while not stop.wait(ctx.cfg.cancel_poll_seconds):
+        for source in sources:
+            review = source == "pr_review_comment"
+            processed = _processed_ids(meta, _PROCESSED_KEYS[source])
+            try:
+                comments, etags[source] = ctx.gh.poll_thread_comments(repo, number, since_iso, etags[source], review=review)
+            except Exception as e:
+                logging.getLogger("reporelay").debug("Cancel check on %s#%d failed: %r", repo, number, e)
+                continue
+            for c in comments or ():
+                body = c.get("body") or ""
+                author = (c.get("user") or {}).get("login", "")
+                if c.get("id") in processed or (c.get("created_at") or "") < since_iso:
+                    continue
+                if (ctx.cfg.ignore_self and author == ctx.me) or not ctx.trigger_re.search(body):
+                    continue
+                if extract_intent(body)[0] == "cancel":
+                    found.update(id=c.get("id"), author=author, source=source,
+                                 updated_at=c.get("updated_at") or c.get("created_at"))
+                    cancel.set()
+                    return
+
+
+def run_conversation_job(ctx: LoopContext, repo: str, meta: dict, local_path: Path, number: int, triggers: List[dict]) -> None:
+    """Run the external command once for all pending triggers of a conversation and report back."""
+    trace = ctx.tracer.begin(repo=repo, number=number, triggers=len(triggers)) if ctx.tracer else NULL_TRACE
+    try:
+        with trace.span("job", sources=sorted({t["source"] for t in triggers})):
+            _run_conversation_job(ctx, trace, repo, meta, local_path, number, triggers)
+    finally:
+        trace.finish()
+
+
+def _run_conversation_job(ctx: LoopContext, trace, repo: str, meta: dict, local_path: Path, number: int, triggers: List[dict]) -> None:
+    cfg, gh = ctx.cfg, ctx.gh
+    log = logging.getLogger("reporelay")
+
+    with trace.span("get_issue"):
+        issue = gh.get_issue(repo, number)
+    remember_labels(ctx, meta, [issue])
+    is_pr = bool(issue.get("pull_request"))
+    for t in triggers:
+        if t["source"] == "pr_review_comment" and not is_pr:
+            _mark_processed(meta, t["source"], t["id"])
+    triggers = [t for t in triggers if is_pr or t["source"] != "pr_review_comment"]
+    if not triggers:
+        return
+
+    conversation_type = "pr" if is_pr else "issue"
+    runs_store = meta.setdefault("pr_runs" if is_pr else "issue_runs", {})
+    updated_field = "last_pr_updated" if is_pr else "last_issue_updated"
+    sources = {t["source"] for t in triggers}
+    last = triggers[-1]
+
+    with trace.span("list_issue_comments"):
+        issue_comments = gh.list_issue_comments(repo, number)
+    parent_issue = None
+    pnum = find_parent_issue_number(issue.get("body", "") or "")
+    if pnum:
+        try:
+            with trace.span("get_parent_issue", parent=pnum):
+                parent_issue = gh.get_issue(repo, pnum)
+        except Exception as e:
+            logging.warning("Could not fetch parent issue #%s in %s: %r", pnum, repo, e)
+
+    intent, requested_id = merge_intents([t["body"] for t in triggers])
+    automation = next((t["automation"] for t in triggers if t.get("automation")), None)
+    if automation is not None:
+        # an automation brings its own instructions; it never resumes a comment-driven session
+        intent, requested_id = "new", None
+    conversation_state = runs_store.get(str(number), {})
+    stored_id = conversation_state.get("codex_run_id")
+    args, send_payload, resume_flag, resume_target = decide_codex_invocation(
+        cfg, intent, requested_id, stored_id
+    )
+
+    sections: List[Tuple[str, str]] = []
+    if ctx.index is not None:
+        with trace.span("related"):
+            ctx.index.add_issues(repo, [issue] + ([parent_issue] if parent_issue else []))
+            ctx.index.add_comments(repo, issue_comments, number)
+            if send_payload:
+                related = related_section(ctx, repo, issue, parent_issue, triggers)
+                if related is not None:
+                    sections.append(related)
+    diff_key = ""
+    if is_pr and send_payload and ctx.diffs is not None:
+        try:
+            with trace.span("pr_diff"):
+                section, diff_key = pr_diff_section(
+                    ctx, repo, number, local_path, conversation_state, resume_flag and cfg.resume_delta
+                )
+            sections.append(section)
+        except requests.RequestException as e:
+            log.warning("Could not attach the diff of %s#%d: %r", repo, number, e)
+
+    with trace.span("assemble_payload"):
+        payload = assemble_payload(
+            cfg,
+            repo,
+            issue,
+            issue_comments,
+            parent_issue,
+            [t["comment"] for t in triggers],
+            conversation_state,
+            resume_flag,
+            resume_target,
+            conversation_type,
+            sections,
+        )
+    payload_to_send = payload if send_payload else None
+
+    id_part = f"review-{last['id']}" if last["source"] == "pr_review_comment" else str(last["id"])
+    run_id = f"{repo.replace('/', '_')}-{number}-{id_part}-{int(time.time())}"
+    trace.run_id = run_id
+    log.info(
+        "Trigger from @%s on %s#%d (%s %s %s, %d coalesced); intent=%s; resume=%s; run_id=%s; cwd=%s",
+        last["author"],
+        repo,
+        number,
+        conversation_type.upper(),
+        last["source"],
+        last["id"],
+        len(triggers),
+        intent,
+        resume_flag,
+        run_id,
+        local_path,
+    )
+
+    trigger_text = "\n\n".join(t["body"] for t in triggers)
+    try:
+        _dispatch_start(ctx.dispatcher, cfg, local_path, cfg.dispatch_repo, run_id, repo, number, issue.get("title", ""), trigger_text)
+    except Exception:
+        pass
+    if "pr_review_comment" in sources:
+        try:
+            _dispatch_pr_opened(ctx.dispatcher, cfg, cfg.dispatch_repo, run_id, issue.get("html_url", ""))
+        except Exception:
+            pass
+    project_op = None
+    if cfg.project_number and "issue_comment" in sources:
+        project_op = _project_start(
+            ctx.outbox,
+            f"{repo}#{number}",
+            "run started",
+            run_id,
+            _git_current_branch(local_path),
+            repo,
+            issue.get("html_url", ""),
+        )
+    started_at = int(time.time())
+    for t in triggers:
+        created = t["comment"].get("created_at")
+        if created:
+            try:
+                latency = started_at - _parse_iso(created).replace(tzinfo=_dt.timezone.utc).timestamp()
+            except ValueError:
+                continue
+            metrics.TRIGGER_LATENCY.observe(max(0.0, latency), repo=repo)
+    if payload_to_send is not None:
+        metrics.PAYLOAD_BYTES.observe(len(payload_to_send.encode("utf-8")), repo=repo)
+
+    command, extra_env = cfg.codex_cmd, None
+    if automation is not None:
+        command, args = automation["command"], automation["args"]
+        extra_env = automation["env"]
+    cancel, cancelled_by, stop_watch, stopped = threading.Event(), {}, threading.Event(), threading.Event()
+    if cfg.cancel_poll_seconds > 0:
+        # cancels are only looked for after the newest trigger, so an old one cannot stop this run
+        since = max((t["comment"].get("created_at") or "" for t in triggers), default="") or _now_utc()
+        threading.Thread(
+            target=watch_for_cancel, args=(ctx, repo, meta, number, since, cancel, cancelled_by, stop_watch, is_pr),
+            name="reporelay-cancel-watch", daemon=True,
+        ).start()
+    job_started = time.monotonic()
+    try:
+        with trace.span("run_external", payload_bytes=len(payload_to_send or "")):
+            rc, out, err = run_external(
+                command,
+                args,
+                payload_to_send,
+                cfg.codex_timeout,
+                cwd=local_path,
+                extra_env=extra_env,
+                cancel=cancel,
+                grace=cfg.cancel_grace_seconds,
+                preexec_fn=job_limits(cfg),
+                stopped=stopped,
+            )
+    finally:
+        stop_watch.set()
+    metrics.JOB_DURATION.observe(time.monotonic() - job_started, repo=repo)
+    metrics.JOB_EXITS.inc(code=rc)
+    with trace.span("postprocess_stdout", stdout_bytes=len(out)):
+        processed_out = postprocess_stdout(out, command)
+
+    cancelled = stopped.is_set()
+    ok = not cancelled and (rc == 0) and bool(processed_out.strip())
+    status = "cancelled" if cancelled else ("ok" if ok else "error")
+    comment_body = format_result_comment(ok, run_id, rc, processed_out, err)
+    if cancelled:
+        metrics.JOBS_CANCELLED.inc(stage="running")
+        log.info("Run %s cancelled by @%s after %.0fs", run_id, cancelled_by.get("author"), time.monotonic() - job_started)
+        partial = processed_out.strip() or (err or "").strip()
+        comment_body = f"Run `{run_id}` was cancelled by @{cancelled_by.get('author') or 'unknown'}."
+        if partial:
+            comment_body += f" Output so far:\n\n{partial}"
+        _queue_reaction(ctx.outbox, repo, number, cancelled_by["id"], "+1", review=cancelled_by["source"] == "pr_review_comment")
+        _mark_processed(meta, cancelled_by["source"], cancelled_by["id"], _epoch(cancelled_by.get("updated_at")))
+    if automation is not None:
+        metrics.AUTOMATION_RUNS.inc(trigger=automation["trigger"], outcome="ok" if ok else "error")
+        comment_body = redact(f"Automation **{automation['name']}** (`{automation['file']}`)\n\n{comment_body}", (extra_env, os.environ))
+    review_links = [
+        f"Triggered from review comment {t['html_url']} by @{t['author']}"
+        for t in triggers
+        if t["source"] == "pr_review_comment" and t.get("html_url")
+    ]
+    if review_links:
+        comment_body = "\n".join(review_links) + "\n\n" + comment_body
+    combined = "\n".join(part for part in (out, err) if part)
+    codex_id = extract_codex_run_id(combined) or (resume_target if resume_flag else None)
+    issue_updated_at = issue.get("updated_at") or issue.get("created_at") or _now_utc()
+
+    if ok:
+        for t in triggers:
+            if t["source"] in _PROCESSED_KEYS:
+                _queue_reaction(ctx.outbox, repo, number, t["id"], "eyes", review=t["source"] == "pr_review_comment")
+
+    with trace.span("queue_comment"):
+        _post_long_comment(ctx.outbox, repo, number, comment_body, trace_id=run_id if trace.sampled else "")
+
+    if last["source"] == "issue":
+        source = "pr_issue" if is_pr else "issue"
+    elif last["source"] == "automation":
+        source = "automation"
+    elif last["source"] == "pr_review_comment":
+        source = "pr_review_comment"
+    else:
+        source = f"{conversation_type}_comment"
+    meta.setdefault("runs", {})[str(number)] = {
+        "status": status,
+        "last_run_at": _now_utc(),
+        "last_comment_id": last["id"],
+        "run_id": run_id,
+        "resume": resume_flag,
+        "returncode": rc,
+        "source": source,
+        "codex_run_id": codex_id,
+        "coalesced": len(triggers),
+    }
+
+    new_state = dict(conversation_state)
+    new_state.update(
+        {
+            updated_field: issue_updated_at,
+            "run_id": run_id,
+            "returncode": rc,
+            "status": status,
+        }
+    )
+    if codex_id:
+        new_state["codex_run_id"] = codex_id
+    if ok and payload_to_send is not None:
+        new_state.update(context_watermark(issue, issue_comments, parent_issue))
+        if diff_key:
+            new_state["context_diff"] = diff_key
+    runs_store[str(number)] = new_state
+
+    try:
+        _dispatch_finish(ctx.dispatcher, cfg, cfg.dispatch_repo, run_id, ok, start_ts=issue.get("created_at", _now_utc()), end_ts=_now_utc())
+    except Exception:
+        pass
+    if project_op:
+        _project_finish(ctx.outbox, project_op, run_id, "Done" if ok else "Failed", started_at)
+
+    for t in triggers:
+        _mark_processed(meta, t["source"], t["id"])
+
+
+# How soon a schedule timer deferred by admission control is tried again
+ADMISSION_RETRY_SECONDS = 5.0
+
+
+def build_admission(cfg: Config) -> Optional[Admission]:
+    admission = Admission(cfg.max_load, cfg.min_mem_available_mb, cfg.max_running, cfg.codex_cmd)
+    return admission if admission else None
+
+
+def job_limits(cfg: Config) -> Optional[Callable[[], None]]:
+    return resource_limits(cfg.job_rlimit_as_mb, cfg.job_rlimit_cpu_seconds, cfg.job_nice)
+
+
+def admit(ctx: LoopContext, waiting: int = 1) -> bool:
+    """True when the host has room for another job; otherwise the caller leaves its work queued."""
+    if ctx.admission is None:
+        return True
+    reason = ctx.admission.check()
+    if reason is None:
+        return True
+    ADMISSION_DEFERRED.inc(reason=reason.split()[0].lower())
+    logging.getLogger("reporelay").info("Host busy (%s); deferring %d job(s)", reason, waiting)
+    return False
+
+
+def run_ready_conversations(ctx: LoopContext, repo: str, meta: dict) -> None:
+    """Run every conversation of ``repo`` whose pending triggers are past the coalescing window."""
+    ready = ready_conversations(meta, ctx.cfg.coalesce_seconds)
+    for i, number in enumerate(ready):
+        # a conversation holding automation triggers runs as several jobs, each admitted on its own
+        while meta.get("pending_triggers", {}).get(number):
+            if not admit(ctx, len(ready) - i):
+                return
+            run_pending_conversation(ctx, repo, meta, number)
+
+
+def _job_batch(triggers: List[dict]) -> List[dict]:
+    """Leading triggers that run as one job: a single automation, or the comments up to the next automation."""
+    if triggers[0].get("automation"):
+        return triggers[:1]
+    return list(itertools.takewhile(lambda t: not t.get("automation"), triggers))
+
+
+def run_pending_conversation(ctx: LoopContext, repo: str, meta: dict, number: str) -> None:
+    """Run the next job of a conversation's pending triggers and clear the triggers it consumed."""
+    pending_triggers = meta.setdefault("pending_triggers", {})
+    queued = sorted(pending_triggers[number], key=lambda t: t["comment"].get("created_at") or "")
+    triggers = _job_batch(queued)
+    rest = queued[len(triggers):]
+    try:
+        run_conversation_job(ctx, repo, meta, Path(meta["path"]), int(number), triggers)
+    except requests.HTTPError as e:
+        status = getattr(getattr(e, "response", None), "status_code", None)
+        if status not in (404, 410):
+            raise
+        logging.getLogger("reporelay").warning("Dropping triggers for missing %s#%s: %s", repo, number, e)
+        for t in queued:
+            _mark_processed(meta, t["source"], t["id"])
+        rest = []
+    if rest:
+        pending_triggers[number] = rest
+    else:
+        pending_triggers.pop(number, None)
+    ctx.st.save()
+
+
+def build_fairshare(cfg: Config) -> Optional[FairShare]:
+    if not cfg.fair_share:
+        return None
+    return FairShare(
+        parse_weights(cfg.repo_weights),
+        parse_weights(cfg.author_weights),
+        parse_weights(cfg.priority_labels),
+        review_boost=cfg.review_boost,
+        aging=cfg.aging,
+    )
+
+
+def job_candidate(meta: dict, repo: str, number: str) -> Candidate:
+    """Scheduler view of a conversation's pending triggers; labels come from what intake and jobs have seen."""
+    triggers = meta["pending_triggers"][number]
+    newest = max(triggers, key=lambda t: t.get("queued_at", 0))
+    return Candidate(
+        repo,
+        number,
+        newest.get("author") or "",
+        tuple(sorted({t["source"] for t in triggers})),
+        tuple(meta.get("priority_labels", {}).get(number, ())),
+        min(t.get("queued_at", 0) for t in triggers),
+    )
+
+
+def run_fair_share(ctx: LoopContext, repos: Dict[str, Path]) -> None:
+    """Run the ready conversations of every watched repo, one at a time in fair-share order."""
+    log = logging.getLogger("reporelay")
+    candidates = {}
+    for repo, meta in ctx.st.data["repos"].items():
+        if repo in repos:
+            for number in ready_conversations(meta, ctx.cfg.coalesce_seconds):
+                candidates[(repo, number)] = job_candidate(meta, repo, number)
+    while candidates:
+        if not admit(ctx, len(candidates)):
+            return
+        chosen = ctx.fairshare.pick(candidates.values(), time.time())
+        del candidates[(chosen.repo, chosen.number)]
+        waited = ctx.fairshare.started(chosen, time.time())
+        log.info("Scheduling %s#%s for @%s after %.0fs in queue (%d more waiting)",
+                 chosen.repo, chosen.number, chosen.author, waited, len(candidates))
+        started = time.monotonic()
+        meta = ctx.st.data["repos"][chosen.repo]
+        try:
+            run_pending_conversation(ctx, chosen.repo, meta, chosen.number)
+        finally:
+            ctx.fairshare.finished(chosen, time.monotonic() - started)
+        if meta.get("pending_triggers", {}).get(chosen.number):
+            # automation triggers run apart from the comments queued with them
+            candidates[(chosen.repo, chosen.number)] = job_candidate(meta, chosen.repo, chosen.number)
+
+
+# Automation fire keys (issue events) are remembered this long to suppress duplicates
+AUTOMATION_FIRED_RETENTION_SECONDS = 7 * 24 * 3600
+
+# Issue actions that also reach the comment-trigger intake in webhook mode
+_INTAKE_ISSUE_ACTIONS = {"opened", "edited", "reopened"}
+
+
+def build_automations(cfg: Config) -> Optional[AutomationRegistry]:
+    if not cfg.automations:
+        return None
+    log = logging.getLogger("reporelay")
+    try:
+        import yaml  # noqa: F401
+    except ImportError:
+        log.warning("REPORELAY_AUTOMATIONS is set but PyYAML is not installed; .automations/ files are ignored.")
+        return None
+    try:
+        validate = load_validator(cfg.automation_schema)
+    except (OSError, ValueError) as e:
+        log.error("Could not load automation schema %s: %r; .automations/ files are ignored.", cfg.automation_schema, e)
+        return None
+    return AutomationRegistry(validate)
+
+
+def refresh_automations(ctx: LoopContext, repos: Dict[str, Path]) -> None:
+    """Pick up ``.automations/`` changes (unchanged files come from the cache) and resync the schedule."""
+    if ctx.automations is None:
+        return
+    last_fired = {
+        f"{repo}:{name}": record
+        for repo, meta in ctx.st.data["repos"].items()
+        for name, record in meta.get("automation_runs", {}).items()
+    }
+    errors = ctx.automations.refresh(repos, time.time(), last_fired)
+    for path, error in errors.items():
+        logging.getLogger("reporelay").warning("Ignoring automation %s: %s", path, error)
+
+
+def _automation_invocation(cfg: Config, automation: Automation, action: str, extra_env: Optional[Dict[str, str]] = None) -> dict:
+    """Command, arguments and extra environment for one automation run."""
+    argv = shlex.split(automation.command or "") or [cfg.codex_cmd] + list(cfg.codex_args)
+    env = {f"REPORELAY_MODEL_{k.upper()}": str(v) for k, v in automation.model.items()}
+    env.update({
+        "REPORELAY_AUTOMATION": automation.name,
+        "REPORELAY_AUTOMATION_TRIGGER": automation.trigger,
+        "REPORELAY_AUTOMATION_ACTION": action,
+        "REPORELAY_TARGET_REPO": automation.target_repo,
+    })
+    env.update(extra_env or {})
+    env.update(automation.env())
+    return {
+        "name": automation.name,
+        "file": automation.path.name,
+        "trigger": automation.trigger,
+        "command": argv[0],
+        "args": argv[1:],
+        "env": env,
+    }
+
+
+def _fire_automation(ctx: LoopContext, repo: str, meta: dict, automation: Automation, number: int, action: str,
+                     key: str, when: str, what: str, extra_env: Optional[Dict[str, str]] = None) -> bool:
+    """Queue one automation as a conversation job on issue/PR ``number``, at most once per ``key``.
+
+    The job waits with the comment triggers, so admission control and fair
+    share apply to it; it runs when the repo's ready conversations next run.
+    """
+    fired = meta.setdefault("automation_events", {}).setdefault("fired", {})
+    fire_key = f"{automation.path.name}:{key}"
+    if fire_key in fired:
+        return False
+    fired[fire_key] = time.time()
+    trigger_id = f"automation-{automation.path.stem}-{key}"
+    body = f'Automation "{automation.name}" ({action} {what}):\n\n{automation.instructions}'
+    trigger = {
+        "id": trigger_id,
+        "source": "automation",
+        "author": f"automation:{automation.name}",
+        "body": body,
+        "automation": _automation_invocation(ctx.cfg, automation, action, extra_env),
+        "comment": {"id": trigger_id, "user": {"login": f"automation:{automation.name}"}, "created_at": when, "body": body},
+    }
+    # queued together with the fire key: a restart neither loses nor repeats the run
+    _queue_trigger(meta, number, trigger)
+    ctx.st.save()
+    return True
+
+
+def fire_issue_automations(ctx: LoopContext, repo: str, meta: dict, issue: dict, action: str, key: str) -> int:
+    """Queue the ``github_issue`` automations of ``repo`` listening for ``action``; returns how many were queued.
+
+    ``key`` identifies the event (``opened:<number>`` or an event/delivery id);
+    each automation fires at most once per key.
+    """
+    number = issue.get("number")
+    if ctx.automations is None or number is None:
+        return 0
+    when = issue.get("updated_at") or issue.get("created_at") or _now_utc()
+    return sum(
+        _fire_automation(ctx, repo, meta, automation, int(number), action, key, when, f"issue #{number}")
+        for automation in ctx.automations.matching(repo, "github_issue", action)
+    )
+
+
+def poll_issue_automations(ctx: LoopContext, repo: str, meta: dict, issues: Optional[List[IssueRecord]], since: str) -> None:
+    """Find issue events for ``github_issue`` automations without webhooks.
+
+    Opened issues come from the issues listing (``created_at`` past the
+    baseline); closed/reopened/labeled/unlabeled come from the repo's issue
+    events feed, which webhook mode replaces with deliveries.
+    """
+    if ctx.automations is None:
+        return
+    automations = ctx.automations.matching(repo, "github_issue")
+    if not automations:
+        return
+    types = {t for a in automations for t in a.spec.get("types", ())}
+    events_state = meta.setdefault("automation_events", {})
+    now = time.time()
+    fired = events_state.setdefault("fired", {})
+    for key in [k for k, ts in fired.items() if ts < now - AUTOMATION_FIRED_RETENTION_SECONDS]:
+        del fired[key]
+    # Nothing from before the automation was first seen fires, and never anything older than the fired keys
+    baseline = max(
+        events_state.setdefault("since", _now_utc()),
+        _iso(_dt.datetime.utcfromtimestamp(now - AUTOMATION_FIRED_RETENTION_SECONDS + 86400)),
+    )
+
+    if "opened" in types:
+        if issues is None:
+            issues = ctx.gh.list_issues_since(repo, since)
+            if ctx.index is not None:
+                ctx.index.add_issues(repo, issues)
+            remember_labels(ctx, meta, issues)
+        for issue in sorted(issues, key=lambda i: i.get("created_at", "")):
+            if issue.get("created_at", "") >= baseline:
+                fire_issue_automations(ctx, repo, meta, issue, "opened", f"opened:{issue.get('number')}")
+
+    if ctx.cfg.mode != "webhook" and types - {"opened"}:
+        for event in reversed(ctx.gh.list_issue_events(repo)):
+            if event.event in types and event.created_at >= baseline and not event.issue.pull_request:
+                fire_issue_automations(ctx, repo, meta, event.issue, event.event, f"event:{event.id}")
+
+
+def poll_pull_request_automations(ctx: LoopContext, repo: str, meta: dict) -> None:
+    """Track open PR head SHAs and fire ``pull_request`` automations on what changed.
+
+    Each poll lists ``pulls?state=open`` (a 304 when nothing changed) and
+    compares it with ``meta["pr_heads"]``: a new number is ``opened`` (or
+    ``reopened`` when it was created before tracking began), a new head SHA
+    is ``synchronize`` and a number that left the list is ``closed``. The
+    first poll only records the baseline.
+    """
+    automations = ctx.automations.matching(repo, "pull_request") if ctx.automations is not None else []
+    if not automations:
+        return
+    pulls = ctx.gh.list_open_pulls(repo)
+    tracker = meta.setdefault("pr_heads", {})
+    first = "since" not in tracker
+    baseline = tracker.setdefault("since", _now_utc())
+    known = tracker.get("open", {})
+    current = {str(pr.number): {"sha": pr.head_sha, "base": pr.base_ref} for pr in pulls}
+    events = []
+    if not first:
+        for pr in sorted(pulls, key=lambda p: p.number):
+            previous = known.get(str(pr.number))
+            if previous is None:
+                action = "opened" if pr.created_at >= baseline else "reopened"
+            elif previous["sha"] != pr.head_sha:
+                action = "synchronize"
+            else:
+                continue
+            events.append((action, pr.number, pr.head_sha, pr.base_ref, pr.updated_at or _now_utc()))
+        for number, previous in known.items():
+            if number not in current:
+                events.append(("closed", int(number), previous["sha"], previous["base"], _now_utc()))
+    tracker["open"] = current
+    ctx.st.save()
+
+    for action, number, sha, base, when in events:
+        for automation in automations:
+            if action not in automation.spec.get("types", ()):
+                continue
+            if not pull_request_matches(automation, base, lambda: ctx.gh.list_pull_files(repo, number, sha)):
+                continue
+            key = f"pr-{action}:{number}:{sha}"
+            if action in ("closed", "reopened"):
+                key += f":{when}"
+            _fire_automation(ctx, repo, meta, automation, number, action, key, when, f"pull request #{number} at {sha[:7]}",
+                             {"REPORELAY_PR_NUMBER": str(number), "REPORELAY_PR_HEAD_SHA": sha, "REPORELAY_PR_BASE_REF": base})
+
+
+def _automation_input(automation: Automation, trigger: str, when: str) -> str:
+    return "\n".join([
+        f"# Automation: {automation.name}",
+        f"Repository: {automation.target_repo}",
+        f"Trigger: {trigger} at {when}",
+        f"File: {AUTOMATIONS_DIR}/{automation.path.name}",
+        "",
+        automation.instructions,
+    ])
+
+
+def run_scheduled_automation(ctx: LoopContext, automation: Automation, due: float, repos: Dict[str, Path]) -> None:
+    """Run one schedule automation and report to the log issue (or the log only)."""
+    cfg = ctx.cfg
+    log = logging.getLogger("reporelay")
+    meta = ctx.st.data["repos"].get(automation.repo)
+    if meta is None:
+        return
+    local_path = repos.get(automation.target_repo) or Path(meta["path"])
+    run = _automation_invocation(cfg, automation, "schedule")
+    when = _iso(_dt.datetime.utcfromtimestamp(due))
+    run_id = f"{automation.repo.replace('/', '_')}-automation-{automation.path.stem}-{int(due)}"
+    record = {"at": due, "digest": automation.digest, "run_id": run_id, "status": "running"}
+    # recorded before running: a crash mid-run must not refire the same slot after a restart
+    meta.setdefault("automation_runs", {})[automation.path.name] = record
+    ctx.st.save()
+
+    trace = ctx.tracer.begin(repo=automation.repo, automation=automation.name) if ctx.tracer else NULL_TRACE
+    trace.run_id = run_id
+    try:
+        with trace.span("job", sources=["schedule"]):
+            log.info("Automation %r (%s) due %s; run_id=%s; cwd=%s", automation.name, automation.key, when, run_id, local_path)
+            payload = _automation_input(automation, f"schedule ({automation.cron.text})", when)
+            job_started = time.monotonic()
+            with trace.span("run_external", payload_bytes=len(payload)):
+                rc, out, err = run_external(run["command"], run["args"], payload, cfg.codex_timeout, cwd=local_path,
+                                            extra_env=run["env"], preexec_fn=job_limits(cfg))
+            metrics.JOB_DURATION.observe(time.monotonic() - job_started, repo=automation.repo)
+            metrics.JOB_EXITS.inc(code=rc)
+            with trace.span("postprocess_stdout", stdout_bytes=len(out)):
+                processed_out = postprocess_stdout(out, run["command"])
+            ok = (rc == 0) and bool(processed_out.strip())
+            metrics.AUTOMATION_RUNS.inc(trigger="schedule", outcome="ok" if ok else "error")
+            body = redact(
+                f"Automation **{automation.name}** (`{automation.path.name}`), scheduled {when}\n\n"
+                + format_result_comment(ok, run_id, rc, processed_out, err),
+                (run["env"], os.environ),
+            )
+            if cfg.automation_log_issue:
+                with trace.span("queue_comment"):
+                    _post_long_comment(ctx.outbox, automation.repo, cfg.automation_log_issue, body,
+                                       trace_id=run_id if trace.sampled else "")
+            else:
+                log.info("Automation %r finished with code %d (%s)", automation.name, rc, "ok" if ok else "error")
+    finally:
+        trace.finish()
+    record.update({"status": "ok" if ok else "error", "returncode": rc, "finished_at": _now_utc()})
+    ctx.st.save()
+
+
+def run_due_automations(ctx: LoopContext, repos: Dict[str, Path], now: Optional[float] = None) -> int:
+    """Fire every schedule timer that is due; returns how many ran."""
+    if ctx.automations is None:
+        return 0
+    now = time.time() if now is None else now
+    next_due = ctx.automations.scheduler.next_due()
+    if next_due is None or next_due > now or not admit(ctx):
+        return 0
+    due = ctx.automations.scheduler.pop_due(now)
+    for automation, at in due:
+        try:
+            run_scheduled_automation(ctx, automation, at, repos)
+        except Exception as e:
+            logging.getLogger("reporelay").exception("Automation %s failed: %r", automation.key, e)
+    return len(due)
+
+
+def wait_for_automations(ctx: LoopContext, repos: Dict[str, Path], until: float, stop: dict) -> None:
+    """Sleep until ``until`` (monotonic), waking only for schedule timers that come due first."""
+    while not stop["flag"]:
+        remaining = until - time.monotonic()
+        if remaining <= 0:
+            return
+        next_due = ctx.automations.scheduler.next_due() if ctx.automations is not None else None
+        if next_due is None or next_due - time.time() >= remaining:
+            time.sleep(remaining)
+            return
+        time.sleep(max(0.0, next_due - time.time()))
+        if not run_due_automations(ctx, repos):
+            # deferred by admission control; the timer stays due
+            time.sleep(min(ADMISSION_RETRY_SECONDS, max(0.0, until - time.monotonic())))
+
+
+def handle_webhook_event(ctx: LoopContext, event: WebhookEvent, repos: Dict[str, Path]) -> bool:
+    """Feed one webhook event through the poll loop's intake; False when it is not for us."""
+    meta = ctx.st.data["repos"].get(event.repo)
+    if meta is None or event.repo not in repos:
+        return False
+    pending = _pending_ids(meta)
+    if event.source == "issue_comment":
+        intake_issue_comment(ctx, event.repo, meta, event.record, _processed_ids(meta, "processed_comment_ids"), pending)
+    elif event.source == "pr_review_comment":
+        intake_review_comment(ctx, event.repo, meta, event.record, _processed_ids(meta, "processed_review_comment_ids"), pending)
+    elif event.source == "issue":
+        remember_labels(ctx, meta, [event.record])
+        handled = False
+        if ctx.cfg.match_target == "issue_or_comments" and event.action in _INTAKE_ISSUE_ACTIONS:
+            intake_issue(ctx, event.repo, meta, event.record, pending)
+            handled = True
+        if ctx.automations is not None and not event.record.get("pull_request"):
+            key = f"opened:{event.record.get('number')}" if event.action == "opened" else f"delivery:{event.delivery}"
+            handled = fire_issue_automations(ctx, event.repo, meta, event.record, event.action, key) > 0 or handled
+        if not handled:
+            return False
+    else:
+        return False
+    ctx.st.save()
+    return True
+
+
+def drain_webhook_events(ctx: LoopContext, receiver: WebhookReceiver, repos: Dict[str, Path], until: float, stop: dict) -> None:
+    """Handle webhook events and run ready conversations until ``until`` (monotonic), the next reconciliation poll."""
+    log = logging.getLogger("reporelay")
+    while not stop["flag"]:
+        remaining = until - time.monotonic()
+        if remaining <= 0:
+            return
+        event = receiver.get(min(remaining, 1.0))
+        run_due_automations(ctx, repos)
+        if event is not None:
+            try:
+                handle_webhook_event(ctx, event, repos)
+            except Exception as e:
+                log.exception("Failed to handle webhook delivery %s for %s: %r", event.delivery, event.repo, e)
+        if ctx.fairshare is not None:
+            try:
+                run_fair_share(ctx, repos)
+            except Exception as e:
+                log.exception("Failed to run webhook-triggered work: %r", e)
+            continue
+        for repo, meta in list(ctx.st.data["repos"].items()):
+            if repo not in repos or not meta.get("pending_triggers"):
+                continue
+            try:
+                run_ready_conversations(ctx, repo, meta)
+            except Exception as e:
+                log.exception("Failed to run webhook-triggered work for %s: %r", repo, e)
+
+
+def poll_repo(ctx: LoopContext, repo: str, meta: dict) -> None:
+    """Fetch new activity for one repo, queue triggers and run conversations that are ready."""
+    cfg, gh, st = ctx.cfg, ctx.gh, ctx.st
+    local_path = Path(meta["path"])
+    since = meta.get("last_since") or _iso(_dt.datetime.utcnow() - _dt.timedelta(days=7))
+    pending = _pending_ids(meta)
+
+    comments = gh.list_issue_comments_since(repo, since)
+    # Advance by GitHub's clock, not ours; the overlap is re-read and filtered by processed ids
+    meta["last_since"] = _compute_new_since(
+        since, (comments,), getattr(gh, "last_list_date", None), cfg.since_overlap_seconds
+    )
+    processed = _processed_ids(meta, "processed_comment_ids")
+    for c in sorted(comments, key=lambda x: x.get("created_at", "")):
+        intake_issue_comment(ctx, repo, meta, c, processed, pending)
+    if ctx.index is not None:
+        ctx.index.add_comments(repo, comments)
+
+    review_processed = _processed_ids(meta, "processed_review_comment_ids")
+    review_since = meta.get("pr_review_last_since") or since
+    review_comments = gh.list_review_comments_since(repo, review_since)
+    meta["pr_review_last_since"] = _compute_new_since(
+        review_since, (review_comments,), getattr(gh, "last_list_date", None), cfg.since_overlap_seconds
+    )
+    for rc in sorted(review_comments, key=lambda x: x.get("created_at", "")):
+        intake_review_comment(ctx, repo, meta, rc, review_processed, pending)
+    if ctx.index is not None:
+        ctx.index.add_comments(repo, review_comments)
+
+    issues = None
+    if cfg.match_target == "issue_or_comments":
+        issues = gh.list_issues_since(repo, since)
+        for issue in issues:
+            intake_issue(ctx, repo, meta, issue, pending)
+        if ctx.index is not None:
+            ctx.index.add_issues(repo, issues)
+        remember_labels(ctx, meta, issues)
+    st.save()
+
+    poll_issue_automations(ctx, repo, meta, issues, since)
+    poll_pull_request_automations(ctx, repo, meta)
+
+    # with fair share on, the loop runs jobs once every repo has been polled
+    if ctx.fairshare is None:
+        run_ready_conversations(ctx, repo, meta)
+
+    # Forget ids the watermarks have moved past; the floor id still covers them
+    pruned = processed.prune(_epoch(meta["last_since"]) - PROCESSED_RETENTION_SECONDS)
+    pruned += review_processed.prune(_epoch(meta["pr_review_last_since"]) - PROCESSED_RETENTION_SECONDS)
+    if pruned:
+        st.save()
+
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description="Watch GitHub repositories for trigger comments and relay them to a local command.")
+    ap.add_argument("--mode", choices=("poll", "webhook"), help="override REPORELAY_MODE")
+    args = ap.parse_args(argv)
     cfg = Config.from_env()
+    if args.mode:
+        cfg.mode = args.mode
+    if cfg.mode not in ("poll", "webhook"):
+        sys.exit("REPORELAY_MODE must be 'poll' or 'webhook'.")
+    if cfg.mode == "webhook" and not cfg.webhook_secret:
+        sys.exit("Webhook mode requires REPORELAY_WEBHOOK_SECRET (the secret configured on the GitHub webhook).")
 
     # Logging
     logging.basicConfig(
@@ -884,16 +2763,17 @@ def main():
         lock.release()
         sys.exit(f"Invalid REPORELAY_REGEX '{cfg.regex}': {e}")
 
-    gh = GitHub(cfg.token)
+    gh = GitHub(cfg.token, api=cfg.api_url)
     me = gh.me_login()
     log.info(
-        "Authenticated as @%s, watching %d repos, regex='%s', poll=%ss, match_target=%s, per_repo_pause=%.2fs",
+        "Authenticated as @%s, watching %d repos, regex='%s', poll=%ss, match_target=%s, per_repo_pause=%.2fs, coalesce=%.1fs",
         me,
         len(repos),
         cfg.regex,
         cfg.poll_seconds,
         cfg.match_target,
         cfg.per_repo_pause,
+        cfg.coalesce_seconds,
     )
 
     # Load (and create) per-repo state
@@ -901,538 +2781,65 @@ def main():
     for repo, path in repos.items():
         st.ensure_repo(repo, path)
     st.save()
+    tracer = build_tracer(cfg)
+    outbox = build_outbox(cfg, gh, tracer)
+    if len(outbox):
+        log.info("Resuming %d queued outbound write(s) from %s", len(outbox), cfg.outbox_path)
+    outbox.start()
+    dispatcher = build_dispatcher(cfg, gh)
+    if dispatcher is not None:
+        dispatcher.start()
+    ctx = LoopContext(
+        cfg=cfg, gh=gh, st=st, me=me, trigger_re=trigger_re, outbox=outbox, dispatcher=dispatcher, tracer=tracer,
+        automations=build_automations(cfg), diffs=build_diff_cache(cfg), index=build_index(cfg),
+        fairshare=build_fairshare(cfg), throttle=build_throttle(cfg, st),
+        admission=build_admission(cfg),
+    )
+    metrics_server = None
+    if cfg.metrics_port:
+        metrics_server = metrics.serve(cfg.metrics_port, cfg.metrics_host)
+        log.info("Serving metrics on http://%s:%d/metrics", cfg.metrics_host, cfg.metrics_port)
+    profiler = build_profiler(cfg, ctx)
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, profiler.on_sigusr1)
+        signal.signal(signal.SIGUSR2, profiler.on_sigusr2)
+    receiver = None
+    if cfg.mode == "webhook":
+        receiver = WebhookReceiver(cfg.webhook_secret, cfg.webhook_host, cfg.webhook_port)
+        receiver.start()
+        log.info("Receiving webhooks on http://%s:%d/, reconciling every %.0fs",
+                 cfg.webhook_host, receiver.port, cfg.webhook_reconcile_seconds)
 
     # Poll loop
+    cycles = 0
     while not stop["flag"]:
+        gh.begin_cycle()
+        profiler.cycle_started()
         try:
             # Re-discover repos periodically in case new ones are added
             # (cheap: re-scan every loop; cost is small compared to API calls)
             repos = discover_local_repos(cfg.root, cfg.recursive, cfg.require_marker, cfg.exclude_dirs)
             for repo, path in repos.items():
                 st.ensure_repo(repo, path)
+            refresh_automations(ctx, repos)
+            run_due_automations(ctx, repos)
 
             for repo, meta in list(st.data["repos"].items()):
-                local_path = Path(meta["path"])
                 if repo not in repos:
                     # Repo disappeared locally: skip but keep state
                     continue
 
-                since = meta.get("last_since") or _iso(_dt.datetime.utcnow() - _dt.timedelta(days=7))
-                processed = set(meta.get("processed_comment_ids", []))
-
-                comments = gh.list_issue_comments_since(repo, since)
-                # Update watermark to now (double-guarded by processed_comment_ids)
-                meta["last_since"] = _now_utc()
-
-                processed_comments = meta.setdefault("processed_comment_ids", [])
-                processed = set(processed_comments)
-                issue_runs = meta.setdefault("issue_runs", {})
-                pr_runs = meta.setdefault("pr_runs", {})
-
-                for c in sorted(comments, key=lambda x: x.get("created_at", "")):
-                    cid = c.get("id")
-                    if cid in processed:
-                        continue
-                    body = (c.get("body") or "")
-
-                    author = c.get("user", {}).get("login", "")
-                    if cfg.ignore_self and author == me:
-                        processed_comments.append(cid)
-                        processed.add(cid)
-                        continue
-
-                    if not trigger_re.search(body):
-                        processed_comments.append(cid)
-                        processed.add(cid)
-                        continue
-
-                    issue_url = c.get("issue_url", "")
-                    m = re.search(r"/issues/(\d+)$", issue_url)
-                    if not m:
-                        processed_comments.append(cid)
-                        processed.add(cid)
-                        continue
-                    number = int(m.group(1))
-
-                    issue = gh.get_issue(repo, number)
-                    is_pr = "pull_request" in issue
-
-                    conversation_type = "pr" if is_pr else "issue"
-                    runs_store = pr_runs if is_pr else issue_runs
-
-                    issue_comments = gh.list_issue_comments(repo, number)
-                    parent_issue = None
-                    pnum = find_parent_issue_number(issue.get("body", "") or "")
-                    if pnum:
-                        try:
-                            parent_issue = gh.get_issue(repo, pnum)
-                        except Exception as e:
-                            logging.warning("Could not fetch parent issue #%s in %s: %r", pnum, repo, e)
-
-                    intent, requested_id = extract_intent(body)
-                    conversation_state = runs_store.get(str(number), {})
-                    stored_id = conversation_state.get("codex_run_id")
-                    args, send_payload, resume_flag, resume_target = decide_codex_invocation(
-                        cfg, intent, requested_id, stored_id
-                    )
-
-                    payload = build_job_input(
-                        repo,
-                        issue,
-                        issue_comments,
-                        parent_issue,
-                        c,
-                        resume=resume_flag,
-                        conversation_type=conversation_type,
-                    )
-                    payload_to_send = payload if send_payload else None
-
-                    run_id = f"{repo.replace('/', '_')}-{number}-{cid}-{int(time.time())}"
-                    log.info(
-                        "Trigger from @%s on %s#%d (%s comment %s); intent=%s; resume=%s; run_id=%s; cwd=%s",
-                        author,
-                        repo,
-                        number,
-                        conversation_type.upper(),
-                        cid,
-                        intent,
-                        resume_flag,
-                        run_id,
-                        local_path,
-                    )
-
-                    # dispatch start (hub) and local CLI project logging
-                    try:
-                        _dispatch_start(gh, cfg, local_path, cfg.dispatch_repo, run_id, repo, number, issue.get("title", ""), body)
-                    except Exception:
-                        pass
-                    project_item_id = _cli_project_start(local_path, f"{repo}#{number}", "run started", run_id, _git_current_branch(local_path), repo)
-
-                    rc, out, err = run_external(
-                        cfg.codex_cmd,
-                        args,
-                        payload_to_send,
-                        cfg.codex_timeout,
-                        cwd=local_path,
-                    )
-                    processed_out = postprocess_stdout(out, cfg.codex_cmd)
-
-                    ok = (rc == 0) and bool(processed_out.strip())
-                    comment_body = format_result_comment(ok, run_id, rc, processed_out, err)
-                    combined = "\n".join(part for part in (out, err) if part)
-                    codex_id = extract_codex_run_id(combined) or (resume_target if resume_flag else None)
-                    issue_updated_at = issue.get("updated_at") or issue.get("created_at") or _now_utc()
-
-                    if ok and cid is not None:
-                        try:
-                            reacted = gh.add_reaction_to_comment(repo, cid, "eyes")
-                            if reacted:
-                                log.info("Added 👀 reaction to %s %s comment %s", repo, conversation_type, cid)
-                        except Exception as e:
-                            log.warning("Failed to add reaction to %s %s comment %s: %r", repo, conversation_type, cid, e)
-
-                    try:
-                        _post_long_comment(gh, repo, number, comment_body)
-                    except requests.HTTPError as e:
-                        log.error("Failed to post comment to %s#%d: %s", repo, number, e)
-                    except Exception as e:
-                        log.error("Unexpected error posting comment to %s#%d: %r", repo, number, e)
-
-                    meta.setdefault("runs", {})[str(number)] = {
-                        "status": "ok" if ok else "error",
-                        "last_run_at": _now_utc(),
-                        "last_comment_id": cid,
-                        "run_id": run_id,
-                        "resume": resume_flag,
-                        "returncode": rc,
-                        "source": f"{conversation_type}_comment",
-                        "codex_run_id": codex_id,
-                    }
-
-                    updated_field = "last_pr_updated" if is_pr else "last_issue_updated"
-                    new_state = dict(conversation_state)
-                    new_state.update(
-                        {
-                            updated_field: issue_updated_at,
-                            "run_id": run_id,
-                            "returncode": rc,
-                            "status": "ok" if ok else "error",
-                        }
-                    )
-                    if codex_id:
-                        new_state["codex_run_id"] = codex_id
-                    if project_item_id:
-                        new_state["project_item_id"] = project_item_id
-                    runs_store[str(number)] = new_state
-
-                    # dispatch finish
-                    try:
-                        _dispatch_finish(gh, cfg, cfg.dispatch_repo, run_id, ok, start_ts=issue.get("created_at", _now_utc()), end_ts=_now_utc())
-                    except Exception:
-                        pass
-                    _cli_project_finish(new_state.get("project_item_id"), run_id, "Done" if ok else "Failed")
-
-                    processed_comments.append(cid)
-                    processed.add(cid)
-
-                    st.save()
-
-                review_processed_list = meta.setdefault("processed_review_comment_ids", [])
-                review_processed = set(review_processed_list)
-                review_since = meta.get("pr_review_last_since") or since
-                review_comments = gh.list_review_comments_since(repo, review_since)
-                meta["pr_review_last_since"] = _now_utc()
-
-                for rc in sorted(review_comments, key=lambda x: x.get("created_at", "")):
-                    rcid = rc.get("id")
-                    if rcid in review_processed:
-                        continue
-
-                    body = (rc.get("body") or "")
-                    author = rc.get("user", {}).get("login", "")
-                    if cfg.ignore_self and author == me:
-                        review_processed_list.append(rcid)
-                        review_processed.add(rcid)
-                        continue
-
-                    if not trigger_re.search(body):
-                        review_processed_list.append(rcid)
-                        review_processed.add(rcid)
-                        continue
-
-                    pr_url = rc.get("pull_request_url") or ""
-                    pr_match = re.search(r"/pulls/(\d+)$", pr_url)
-                    if not pr_match:
-                        review_processed_list.append(rcid)
-                        review_processed.add(rcid)
-                        continue
-                    number = int(pr_match.group(1))
-
-                    issue = gh.get_issue(repo, number)
-                    if "pull_request" not in issue:
-                        review_processed_list.append(rcid)
-                        review_processed.add(rcid)
-                        continue
-
-                    issue_comments = gh.list_issue_comments(repo, number)
-                    parent_issue = None
-                    pnum = find_parent_issue_number(issue.get("body", "") or "")
-                    if pnum:
-                        try:
-                            parent_issue = gh.get_issue(repo, pnum)
-                        except Exception as e:
-                            logging.warning(
-                                "Could not fetch parent issue #%s in %s (review trigger): %r",
-                                pnum,
-                                repo,
-                                e,
-                            )
-
-                    runs_store = pr_runs
-                    intent, requested_id = extract_intent(body)
-                    conversation_state = runs_store.get(str(number), {})
-                    stored_id = conversation_state.get("codex_run_id")
-                    args, send_payload, resume_flag, resume_target = decide_codex_invocation(
-                        cfg,
-                        intent,
-                        requested_id,
-                        stored_id,
-                    )
-
-                    location_bits: List[str] = []
-                    if rc.get("path"):
-                        location_bits.append(f"path={rc['path']}")
-                    if rc.get("line"):
-                        location_bits.append(f"line={rc['line']}")
-                    elif rc.get("original_line"):
-                        location_bits.append(f"original_line={rc['original_line']}")
-                    if rc.get("side"):
-                        location_bits.append(f"side={rc['side']}")
-                    review_context = ", ".join(location_bits)
-                    review_body = body
-                    if review_context:
-                        review_body = f"{review_body}\n\n[Review context: {review_context}]"
-                    if rc.get("html_url"):
-                        review_body = f"{review_body}\n\nLink: {rc['html_url']}"
-
-                    trigger_comment = {
-                        "id": rcid,
-                        "user": rc.get("user") or {},
-                        "created_at": rc.get("created_at") or rc.get("updated_at") or _now_utc(),
-                        "body": review_body,
-                    }
-
-                    payload = build_job_input(
-                        repo,
-                        issue,
-                        issue_comments,
-                        parent_issue,
-                        trigger_comment,
-                        resume=resume_flag,
-                        conversation_type="pr",
-                    )
-                    payload_to_send = payload if send_payload else None
-
-                    run_id = f"{repo.replace('/', '_')}-{number}-review-{rcid}-{int(time.time())}"
-                    log.info(
-                        "Trigger from review comment by @%s on %s#%d (comment %s); intent=%s; resume=%s; run_id=%s; cwd=%s",
-                        author,
-                        repo,
-                        number,
-                        rcid,
-                        intent,
-                        resume_flag,
-                        run_id,
-                        local_path,
-                    )
-
-                    # dispatch start for review
-                    try:
-                        _dispatch_start(gh, cfg, local_path, cfg.dispatch_repo, run_id, repo, number, issue.get("title", ""), body)
-                    except Exception:
-                        pass
-
-                    # pr_opened dispatch
-                    try:
-                        pr_html = issue.get("html_url", "")
-                        _dispatch_pr_opened(gh, cfg, cfg.dispatch_repo, run_id, pr_html)
-                    except Exception:
-                        pass
-
-                    rc_status, out, err = run_external(
-                        cfg.codex_cmd,
-                        args,
-                        payload_to_send,
-                        cfg.codex_timeout,
-                        cwd=local_path,
-                        )
-                    processed_out = postprocess_stdout(out, cfg.codex_cmd)
-
-                    ok = (rc_status == 0) and bool(processed_out.strip())
-                    comment_body = format_result_comment(ok, run_id, rc_status, processed_out, err)
-                    if rc.get("html_url"):
-                        comment_body = f"Triggered from review comment {rc['html_url']} by @{author}\n\n" + comment_body
-                    combined = "\n".join(part for part in (out, err) if part)
-                    codex_id = extract_codex_run_id(combined) or (resume_target if resume_flag else None)
-                    issue_updated_at = issue.get("updated_at") or issue.get("created_at") or _now_utc()
-
-                    if ok and rcid is not None:
-                        try:
-                            reacted = gh.add_reaction_to_review_comment(repo, rcid, "eyes")
-                            if reacted:
-                                log.info("Added 👀 reaction to %s review comment %s", repo, rcid)
-                        except Exception as e:
-                            log.warning("Failed to add reaction to %s review comment %s: %r", repo, rcid, e)
-
-                    try:
-                        _post_long_comment(gh, repo, number, comment_body)
-                    except requests.HTTPError as e:
-                        log.error(
-                            "Failed to post comment to %s#%d (review trigger): %s",
-                            repo,
-                            number,
-                            e,
-                        )
-                    except Exception as e:
-                        log.error(
-                            "Unexpected error posting comment to %s#%d (review trigger): %r",
-                            repo,
-                            number,
-                            e,
-                        )
-
-                    # dispatch finish
-                    try:
-                        _dispatch_finish(gh, cfg, cfg.dispatch_repo, run_id, ok, start_ts=issue.get("created_at", _now_utc()), end_ts=_now_utc())
-                    except Exception:
-                        pass
-
-                    meta.setdefault("runs", {})[str(number)] = {
-                        "status": "ok" if ok else "error",
-                        "last_run_at": _now_utc(),
-                        "last_comment_id": rcid,
-                        "run_id": run_id,
-                        "resume": resume_flag,
-                        "returncode": rc_status,
-                        "source": "pr_review_comment",
-                        "codex_run_id": codex_id,
-                    }
-
-                    conversation_record = dict(conversation_state)
-                    conversation_record.update(
-                        {
-                            "last_pr_updated": issue_updated_at,
-                            "run_id": run_id,
-                            "returncode": rc_status,
-                            "status": "ok" if ok else "error",
-                        }
-                    )
-                    if codex_id:
-                        conversation_record["codex_run_id"] = codex_id
-                    runs_store[str(number)] = conversation_record
-
-                    review_processed_list.append(rcid)
-                    review_processed.add(rcid)
-
-                    st.save()
-                if cfg.match_target == "issue_or_comments":
-                    issue_runs = meta.setdefault("issue_runs", {})
-                    pr_runs = meta.setdefault("pr_runs", {})
-                    issues = gh.list_issues_since(repo, since)
-                    for issue in issues:
-                        is_pr = "pull_request" in issue
-
-                        title_text = issue.get("title", "") or ""
-                        body_text = issue.get("body", "") or ""
-                        if not (trigger_re.search(title_text) or trigger_re.search(body_text)):
-                            continue
-
-                        number = issue.get("number")
-                        if number is None:
-                            continue
-
-                        issue_updated_at = issue.get("updated_at") or issue.get("created_at") or _now_utc()
-                        runs_store = pr_runs if is_pr else issue_runs
-                        updated_field = "last_pr_updated" if is_pr else "last_issue_updated"
-                        last_processed_at = runs_store.get(str(number), {}).get(updated_field)
-                        if last_processed_at == issue_updated_at:
-                            continue
-
-                        issue_comments = gh.list_issue_comments(repo, number)
-                        parent_issue = None
-                        pnum = find_parent_issue_number(body_text)
-                        if pnum:
-                            try:
-                                parent_issue = gh.get_issue(repo, pnum)
-                            except Exception as e:
-                                logging.warning(
-                                    "Could not fetch parent issue #%s in %s (issue trigger): %r",
-                                    pnum,
-                                    repo,
-                                    e,
-                                )
-
-                        trigger_id = issue.get("id") or f"issue-{number}"
-                        trigger_comment = {
-                            "id": trigger_id,
-                            "user": issue.get("user") or {},
-                            "created_at": issue.get("created_at") or issue_updated_at,
-                            "body": body_text or title_text,
-                        }
-
-                        intent, requested_id = extract_intent(trigger_comment["body"])
-                        conversation_state = runs_store.get(str(number), {})
-                        stored_id = conversation_state.get("codex_run_id")
-                        args, send_payload, resume_flag, resume_target = decide_codex_invocation(
-                            cfg, intent, requested_id, stored_id
-                        )
-
-                        payload = build_job_input(
-                            repo,
-                            issue,
-                            issue_comments,
-                            parent_issue,
-                            trigger_comment,
-                            resume=resume_flag,
-                            conversation_type="pr" if is_pr else "issue",
-                        )
-                        payload_to_send = payload if send_payload else None
-
-                        run_id = f"{repo.replace('/', '_')}-{number}-{trigger_id}-{int(time.time())}"
-                        log.info(
-                            "Trigger from %s body/title on %s#%d; intent=%s; resume=%s; run_id=%s; cwd=%s",
-                            "PR" if is_pr else "issue",
-                            repo,
-                            number,
-                            intent,
-                            resume_flag,
-                            run_id,
-                            local_path,
-                        )
-
-                        # dispatch start for issue/PR body/title trigger
-                        try:
-                            _dispatch_start(gh, cfg, local_path, cfg.dispatch_repo, run_id, repo, number, issue.get("title", ""), trigger_comment.get("body", ""))
-                        except Exception:
-                            pass
-
-                        rc, out, err = run_external(
-                            cfg.codex_cmd,
-                            args,
-                            payload_to_send,
-                            cfg.codex_timeout,
-                            cwd=local_path,
-                        )
-                        processed_out = postprocess_stdout(out, cfg.codex_cmd)
-
-                        ok = (rc == 0) and bool(processed_out.strip())
-                        comment_body = format_result_comment(ok, run_id, rc, processed_out, err)
-                        combined = "\n".join(part for part in (out, err) if part)
-                        codex_id = extract_codex_run_id(combined) or (resume_target if resume_flag else None)
-
-                        try:
-                            _post_long_comment(gh, repo, number, comment_body)
-                        except requests.HTTPError as e:
-                            log.error(
-                                "Failed to post comment to %s#%d (%s trigger): %s",
-                                repo,
-                                number,
-                                "pr" if is_pr else "issue",
-                                e,
-                            )
-                        except Exception as e:
-                            log.error(
-                                "Unexpected error posting comment to %s#%d (%s trigger): %r",
-                                repo,
-                                number,
-                                "pr" if is_pr else "issue",
-                                e,
-                            )
-
-                        meta.setdefault("runs", {})[str(number)] = {
-                            "status": "ok" if ok else "error",
-                            "last_run_at": _now_utc(),
-                            "last_comment_id": trigger_id,
-                            "run_id": run_id,
-                            "resume": resume_flag,
-                            "returncode": rc,
-                            "source": "pr_issue" if is_pr else "issue",
-                            "codex_run_id": codex_id,
-                        }
-
-                        conversation_record = dict(conversation_state)
-                        conversation_record.update(
-                            {
-                                updated_field: issue_updated_at,
-                                "run_id": run_id,
-                                "returncode": rc,
-                                "status": "ok" if ok else "error",
-                            }
-                        )
-                        if codex_id:
-                            conversation_record["codex_run_id"] = codex_id
-
-                        runs_store[str(number)] = conversation_record
-
-                        # dispatch finish
-                        try:
-                            _dispatch_finish(gh, cfg, cfg.dispatch_repo, run_id, ok, start_ts=issue.get("created_at", _now_utc()), end_ts=_now_utc())
-                        except Exception:
-                            pass
-
-                        st.save()
-
-                # Trim processed list per repo
-                if len(meta.get("processed_comment_ids", [])) > 5000:
-                    meta["processed_comment_ids"] = meta["processed_comment_ids"][-2000:]
-                    st.save()
-                if len(meta.get("processed_review_comment_ids", [])) > 5000:
-                    meta["processed_review_comment_ids"] = meta["processed_review_comment_ids"][-2000:]
-                    st.save()
+                poll_started = time.monotonic()
+                try:
+                    poll_repo(ctx, repo, meta)
+                finally:
+                    metrics.POLL_DURATION.observe(time.monotonic() - poll_started, repo=repo)
 
                 if cfg.per_repo_pause > 0:
                     time.sleep(cfg.per_repo_pause)
 
+            if ctx.fairshare is not None:
+                run_fair_share(ctx, repos)
             # End per-loop save
             st.save()
 
@@ -1451,10 +2858,24 @@ def main():
             logging.exception("Unexpected error in poll loop: %r", e)
             time.sleep(cfg.poll_seconds)
         finally:
-            if stop["flag"]:
+            gh.end_cycle()
+            profiler.cycle_finished()
+            cycles += 1
+            if stop["flag"] or (cfg.max_cycles and cycles >= cfg.max_cycles):
                 break
-            time.sleep(cfg.poll_seconds)
-
+            if receiver is not None:
+                drain_webhook_events(ctx, receiver, repos, time.monotonic() + cfg.webhook_reconcile_seconds, stop)
+            else:
+                wait_for_automations(ctx, repos, time.monotonic() + cfg.poll_seconds, stop)
+
+    if receiver is not None:
+        receiver.stop()
+    profiler.close()
+    outbox.stop(timeout=10.0)
+    if dispatcher is not None:
+        dispatcher.stop()
+    if metrics_server is not None:
+        metrics_server.shutdown()
     lock.release()
     log.info("Stopped.")
 
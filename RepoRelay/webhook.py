@@ -0,0 +1,155 @@
+"""
+Local GitHub webhook receiver for ``--mode webhook``.
+
+Accepts ``issue_comment``, ``pull_request_review_comment`` and ``issues``
+deliveries on a small HTTP server, checks the ``X-Hub-Signature-256`` HMAC
+against ``REPORELAY_WEBHOOK_SECRET`` and queues each event as a
+``WebhookEvent`` carrying the same records the poll loop builds. The watcher
+drains the queue between (slow) reconciliation polls and hands the records to
+its intake functions, so processed-id and pending-trigger dedupe apply to
+both paths.
+"""
+
+import hashlib
+import hmac
+import json
+import logging
+import queue
+import threading
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Union
+
+from . import metrics
+from .records import CommentRecord, IssueRecord, ReviewCommentRecord
+
+# GitHub caps webhook payloads at 25 MB
+MAX_BODY_BYTES = 25 * 1024 * 1024
+
+# Actions worth a look; edits are included because the poll path sees them too.
+# Closed/labeled/unlabeled issues only matter to ``github_issue`` automations.
+ACTIONS = {
+    "issue_comment": {"created", "edited"},
+    "pull_request_review_comment": {"created", "edited"},
+    "issues": {"opened", "edited", "reopened", "closed", "labeled", "unlabeled"},
+}
+
+WEBHOOK_DELIVERIES = metrics.REGISTRY.counter(
+    "reporelay_webhook_deliveries_total", "Webhook deliveries by event and outcome."
+)
+
+
+@dataclass
+class WebhookEvent:
+    __slots__ = ("delivery", "repo", "source", "record", "action")
+    delivery: str
+    repo: str
+    # "issue_comment", "pr_review_comment" or "issue", as used by the intake functions
+    source: str
+    record: Union[CommentRecord, ReviewCommentRecord, IssueRecord]
+    action: str
+
+
+def signature(secret: bytes, body: bytes) -> str:
+    return "sha256=" + hmac.new(secret, body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(secret: bytes, body: bytes, header: Optional[str]) -> bool:
+    """Check an ``X-Hub-Signature-256`` header in constant time."""
+    if not secret or not header:
+        return False
+    return hmac.compare_digest(signature(secret, body), header.strip())
+
+
+def normalize(event: str, payload: dict, delivery: str = "") -> Optional[WebhookEvent]:
+    """Project a delivery onto a ``WebhookEvent``; None for events and actions we ignore."""
+    action = payload.get("action")
+    if action not in ACTIONS.get(event, ()):
+        return None
+    repo = (payload.get("repository") or {}).get("full_name") or ""
+    if not repo:
+        return None
+    if event == "issue_comment" and payload.get("comment"):
+        return WebhookEvent(delivery, repo, "issue_comment", CommentRecord.from_api(payload["comment"]), action)
+    if event == "pull_request_review_comment" and payload.get("comment"):
+        return WebhookEvent(delivery, repo, "pr_review_comment", ReviewCommentRecord.from_api(payload["comment"]), action)
+    if event == "issues" and payload.get("issue"):
+        return WebhookEvent(delivery, repo, "issue", IssueRecord.from_api(payload["issue"]), action)
+    return None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    receiver: "WebhookReceiver"
+
+    def _reply(self, status: int, text: str = "") -> None:
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):  # noqa: N802 - http.server API
+        event = self.headers.get("X-GitHub-Event", "")
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0 or length > MAX_BODY_BYTES:
+            WEBHOOK_DELIVERIES.inc(event=event or "unknown", outcome="too_large")
+            self._reply(413, "payload too large")
+            return
+        body = self.rfile.read(length)
+        status, outcome = self.receiver.accept(event, body, self.headers.get("X-Hub-Signature-256"),
+                                               self.headers.get("X-GitHub-Delivery", ""))
+        WEBHOOK_DELIVERIES.inc(event=event or "unknown", outcome=outcome)
+        self._reply(status, outcome)
+
+    def log_message(self, fmt, *args):
+        logging.getLogger("reporelay").debug("webhook: " + fmt, *args)
+
+
+class WebhookReceiver:
+    """HTTP receiver that verifies deliveries and queues normalized events."""
+
+    def __init__(self, secret: str, host: str = "127.0.0.1", port: int = 8787):
+        self.secret = secret.encode("utf-8")
+        self.host = host
+        self.port = port
+        self.events: "queue.Queue[WebhookEvent]" = queue.Queue()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def accept(self, event: str, body: bytes, sig: Optional[str], delivery: str = ""):
+        """Validate and queue one delivery; returns ``(http_status, outcome)``."""
+        if not verify_signature(self.secret, body, sig):
+            return 401, "bad_signature"
+        if event == "ping":
+            return 200, "pong"
+        try:
+            payload = json.loads(body.decode("utf-8"))
+        except (UnicodeDecodeError, ValueError):
+            return 400, "bad_json"
+        item = normalize(event, payload if isinstance(payload, dict) else {}, delivery)
+        if item is None:
+            return 202, "ignored"
+        self.events.put(item)
+        return 202, "queued"
+
+    def get(self, timeout: float) -> Optional[WebhookEvent]:
+        try:
+            return self.events.get(timeout=max(0.0, timeout))
+        except queue.Empty:
+            return None
+
+    def start(self) -> None:
+        handler = type("WebhookHandler", (_Handler,), {"receiver": self})
+        self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="reporelay-webhook", daemon=True).start()
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
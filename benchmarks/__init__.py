@@ -0,0 +1 @@
+"""Benchmarks for RepoRelay (run as ``python -m benchmarks.<name>``)."""
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+End-to-end watcher benchmark against the in-process fake GitHub API.
+
+Builds a synthetic fleet of N local git repos (remotes point at
+``github.com/bench/repoN``), seeds the fake server with M comments per repo
+(every ``--trigger-every``-th one a ``codexe`` trigger), then runs the real
+``watcher.main()`` loop for ``--cycles`` poll cycles with
+``RepoRelay/mock_codex.py`` as the runner. Reports cycles/sec, API
+requests per cycle and memory.
+
+    python -m benchmarks.bench_e2e --repos 20 --comments 200 --cycles 5
+    python -m benchmarks.bench_e2e --runner-env MOCK_CODEX_LATENCY=exp:0.5 --runner-env MOCK_CODEX_OUTPUT_BYTES=80000
+    python -m benchmarks.bench_e2e --save-baseline benchmarks/baseline_e2e.json
+    python -m benchmarks.bench_e2e --baseline benchmarks/baseline_e2e.json --threshold 0.25
+
+With ``--baseline`` the exit status is 1 when throughput drops, or
+requests per cycle or peak memory grow, by more than ``--threshold``.
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import resource
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from RepoRelay import watcher
+
+from .fake_github import FakeGitHubServer, FakeGitHubState
+
+MOCK_CODEX = Path(watcher.__file__).resolve().parent / "mock_codex.py"
+
+
+def build_fleet(state: FakeGitHubState, root: Path, repos: int, comments: int,
+                issues_per_repo: int = 5, trigger_every: int = 10, age_seconds: float = 3600.0) -> List[str]:
+    """Create local clones and seed the fake server; returns the ``owner/repo`` names."""
+    names = []
+    base = time.time() - age_seconds
+    for r in range(repos):
+        name = f"bench/repo{r}"
+        path = root / f"repo{r}"
+        path.mkdir(parents=True)
+        subprocess.run(["git", "init", "-q", str(path)], check=True)
+        subprocess.run(["git", "-C", str(path), "remote", "add", "origin", f"https://github.com/{name}.git"], check=True)
+        for n in range(1, issues_per_repo + 1):
+            state.add_issue(name, n, title=f"Issue {n}", body="Synthetic issue body.\n" * 5, ts=base)
+        for c in range(comments):
+            number = c % issues_per_repo + 1
+            trigger = trigger_every > 0 and c % trigger_every == trigger_every - 1
+            body = f"codexe please handle item {c}" if trigger else f"Discussion comment {c}.\n" + "lorem ipsum " * 20
+            state.add_comment(name, number, body, ts=base + c)
+        names.append(name)
+    return names
+
+
+@contextlib.contextmanager
+def _patched_process(env: Dict[str, str], cwd: Path) -> Iterator[None]:
+    """Temporarily set environment, cwd and signal handlers around ``watcher.main()``."""
+    saved_env = dict(os.environ)
+    saved_cwd = os.getcwd()
+    saved_signals = {sig: signal.getsignal(sig) for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGUSR1, signal.SIGUSR2)}
+    os.environ.update(env)
+    os.chdir(cwd)
+    try:
+        yield
+    finally:
+        os.chdir(saved_cwd)
+        os.environ.clear()
+        os.environ.update(saved_env)
+        for sig, handler in saved_signals.items():
+            signal.signal(sig, handler)
+
+
+def run_benchmark(repos: int = 10, comments: int = 100, cycles: int = 5, trigger_every: int = 10,
+                  issues_per_repo: int = 5, trace_memory: bool = True, runner_env: Optional[Dict[str, str]] = None) -> dict:
+    with tempfile.TemporaryDirectory() as tmp, FakeGitHubServer() as server:
+        root = Path(tmp)
+        names = build_fleet(server.state, root, repos, comments, issues_per_repo, trigger_every)
+        env = {
+            "GITHUB_TOKEN": "bench-token",
+            "REPORELAY_ROOT": str(root),
+            "REPORELAY_API_URL": server.url,
+            "REPORELAY_MAX_CYCLES": str(cycles),
+            "REPORELAY_POLL_SECONDS": "0",
+            "REPORELAY_PER_REPO_PAUSE": "0",
+            "REPORELAY_WRITE_INTERVAL": "0",
+            "REPORELAY_IGNORE_SELF": "1",
+            "REPORELAY_HTTP_TOTAL_RETRIES": "0",
+            "CODEX_CMD": sys.executable,
+            "CODEX_ARGS": str(MOCK_CODEX),
+            "CODEX_RESUME_ARGS": str(MOCK_CODEX),
+        }
+        env.update(runner_env or {})
+        if trace_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        with _patched_process(env, root):
+            watcher.main([])
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else 0
+        if trace_memory:
+            tracemalloc.stop()
+
+        st = server.state
+        by_route = {f"{method} {route}": n for (method, route), n in sorted(st.requests.items())}
+        total = sum(st.requests.values())
+        jobs = by_route.get("POST post_comment", 0)
+        return {
+            "repos": len(names),
+            "comments_per_repo": comments,
+            "cycles": cycles,
+            "seconds": round(elapsed, 4),
+            "cycles_per_sec": round(cycles / elapsed, 4) if elapsed else 0.0,
+            "requests": total,
+            "requests_per_cycle": round(total / cycles, 2) if cycles else 0.0,
+            "requests_by_route": by_route,
+            "result_comments": jobs,
+            "reactions": len(st.reactions),
+            "peak_traced_mb": round(peak / (1024 * 1024), 3),
+            "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+
+
+def compare(result: dict, baseline: dict, threshold: float) -> List[str]:
+    """Return human-readable regressions of ``result`` against ``baseline``."""
+    problems = []
+    if baseline.get("cycles_per_sec") and result["cycles_per_sec"] < baseline["cycles_per_sec"] * (1 - threshold):
+        problems.append(f"cycles/sec {result['cycles_per_sec']} < baseline {baseline['cycles_per_sec']}")
+    for key in ("requests_per_cycle", "peak_traced_mb"):
+        if baseline.get(key) and result[key] > baseline[key] * (1 + threshold):
+            problems.append(f"{key} {result[key]} > baseline {baseline[key]}")
+    return problems
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--repos", type=int, default=10)
+    ap.add_argument("--comments", type=int, default=100, help="comments per repo")
+    ap.add_argument("--issues", type=int, default=5, help="issues per repo")
+    ap.add_argument("--cycles", type=int, default=5)
+    ap.add_argument("--trigger-every", type=int, default=10, help="every Nth comment is a trigger (0 = none)")
+    ap.add_argument("--runner-env", action="append", default=[], metavar="KEY=VALUE",
+                    help="extra environment for mock_codex.py, e.g. MOCK_CODEX_LATENCY=exp:0.2 (repeatable)")
+    ap.add_argument("--no-tracemalloc", action="store_true", help="skip Python heap tracking (faster)")
+    ap.add_argument("--verbose", action="store_true", help="show watcher logs")
+    ap.add_argument("--json", action="store_true", help="print the result as JSON")
+    ap.add_argument("--baseline", help="compare against this saved result")
+    ap.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression")
+    ap.add_argument("--save-baseline", help="write the result here")
+    args = ap.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    runner_env = dict(item.split("=", 1) for item in args.runner_env)
+    result = run_benchmark(args.repos, args.comments, args.cycles, args.trigger_every, args.issues,
+                           trace_memory=not args.no_tracemalloc, runner_env=runner_env)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"{result['repos']} repos x {result['comments_per_repo']} comments, {result['cycles']} cycles "
+              f"in {result['seconds']:.2f}s")
+        print(f"  cycles/sec          {result['cycles_per_sec']:.3f}")
+        print(f"  requests/cycle      {result['requests_per_cycle']:.1f} ({result['requests']} total)")
+        print(f"  result comments     {result['result_comments']}")
+        print(f"  peak traced memory  {result['peak_traced_mb']:.2f} MiB (max RSS {result['max_rss_mb']:.1f} MiB)")
+        for route, n in result["requests_by_route"].items():
+            print(f"    {route:<28} {n}")
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps(result, indent=2) + "\n")
+    if args.baseline:
+        problems = compare(result, json.loads(Path(args.baseline).read_text()), args.threshold)
+        for p in problems:
+            print(f"REGRESSION: {p}", file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
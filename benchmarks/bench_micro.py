@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for the per-trigger text-processing hot paths.
+
+Times ``build_job_input``, ``postprocess_stdout``,
+``_split_for_github_comments``, ``extract_codex_run_id``, ``extract_intent``
+and ``find_parent_issue_number`` on synthetic fixtures: a 1,000-comment
+thread, a 10 MB Codex transcript and pathological inputs for the regexes
+(long whitespace runs, thousands of ``codexe`` mentions on one line). Each
+case reports the best of ``--repeat`` runs.
+
+    python -m benchmarks.bench_micro
+    python -m benchmarks.bench_micro --save-baseline benchmarks/baseline_micro.json
+    python -m benchmarks.bench_micro --baseline benchmarks/baseline_micro.json --threshold 0.5
+
+With ``--baseline`` the exit status is 1 when any case is slower than its
+baseline by more than ``--threshold`` (relative). Baselines are machine
+specific; regenerate them on the machine that runs the comparison.
+"""
+
+import argparse
+import json
+import sys
+import timeit
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from RepoRelay import watcher
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline_micro.json"
+
+
+def _thread(n_comments: int = 1000) -> Tuple[dict, List[dict]]:
+    issue = {"number": 42, "title": "Large thread", "body": "Parent: #7\n\n" + "Issue body line.\n" * 200}
+    comments = [
+        {
+            "id": i,
+            "user": {"login": f"user{i % 17}"},
+            "created_at": f"2025-10-{1 + i % 28:02d}T{i % 24:02d}:{i % 60:02d}:00Z",
+            "body": f"Comment {i}: " + "some discussion text, with code `x = {i}` and links. " * 12,
+        }
+        for i in range(n_comments)
+    ]
+    return issue, comments
+
+
+def _transcript(size: int = 10 * 1024 * 1024) -> str:
+    header = (
+        "OpenAI Codex v0.1\n--------\nworkdir: /tmp/repo\nmodel: gpt-5-codex\nprovider: openai\n"
+        "approval: never\nsandbox: workspace-write\nsession id: 0199a7c0-aaaa-bbbb-cccc-0123456789ab\n--------\n"
+    )
+    block = (
+        "thinking\nLooking at the failing test output before changing anything.\n\n"
+        "exec\nbash -lc 'python -m pytest -q' in /tmp/repo\nsucceeded in 812ms:\n"
+        + "tests/test_example.py::test_case PASSED\n" * 20 + "\n"
+    )
+    body = block * (size // len(block) + 1)
+    final = "codex\n## Result\nAll tests pass.\n\n- fixed the flaky test\n- updated docs\n\ntokens used\n123456\n"
+    return header + body[:size] + final
+
+
+def _comment_text(size: int = 2 * 1024 * 1024) -> str:
+    para = "A paragraph of result text that keeps going for a while to look like real output.\n" * 8
+    return ((para + "\n") * (size // (len(para) + 1) + 1))[:size]
+
+
+def cases() -> Dict[str, Callable[[], object]]:
+    issue, comments = _thread()
+    parent = {"number": 7, "title": "Parent", "body": "Parent body.\n" * 50}
+    trigger = comments[-1]
+    transcript = _transcript()
+    comment_text = _comment_text()
+    whitespace_body = "intro\n" + " \n" * 200_000 + "parent of this is #12 indeed"
+    many_codexe = "codexe " * 20_000 + "please"
+    many_codexe_resume = "codexe " * 20_000 + "resume abc123456"
+    return {
+        "build_job_input_1000_comments": lambda: watcher.build_job_input(
+            "owner/repo", issue, comments, parent, trigger, resume=False
+        ),
+        "postprocess_stdout_10mb": lambda: watcher.postprocess_stdout(transcript, "codex"),
+        "split_comments_2mb": lambda: watcher._split_for_github_comments(comment_text),
+        "split_comments_10mb_no_breaks": lambda: watcher._split_for_github_comments("x" * (10 * 1024 * 1024)),
+        "extract_run_id_10mb": lambda: watcher.extract_codex_run_id(transcript),
+        "extract_intent_many_mentions": lambda: watcher.extract_intent(many_codexe),
+        "extract_intent_many_mentions_resume": lambda: watcher.extract_intent(many_codexe_resume),
+        "find_parent_whitespace_runs": lambda: watcher.find_parent_issue_number(whitespace_body),
+    }
+
+
+def run(repeat: int = 3, only: Optional[List[str]] = None) -> Dict[str, float]:
+    """Return the best wall time in seconds for each case."""
+    results = {}
+    for name, fn in cases().items():
+        if only and not any(sel in name for sel in only):
+            continue
+        results[name] = min(timeit.repeat(fn, number=1, repeat=repeat))
+    return results
+
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], threshold: float,
+            floor: float = 0.002) -> List[str]:
+    """Cases slower than ``baseline * (1 + threshold)``; times under ``floor`` seconds are noise."""
+    problems = []
+    for name, seconds in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if seconds > max(base, floor) * (1 + threshold):
+            problems.append(f"{name}: {seconds * 1000:.2f} ms vs baseline {base * 1000:.2f} ms")
+    return problems
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--only", action="append", help="run cases whose name contains this (repeatable)")
+    ap.add_argument("--baseline", nargs="?", const=str(DEFAULT_BASELINE), help="compare against a saved baseline")
+    ap.add_argument("--threshold", type=float, default=0.5, help="allowed relative slowdown")
+    ap.add_argument("--save-baseline", nargs="?", const=str(DEFAULT_BASELINE), help="write results as the baseline")
+    ap.add_argument("--json", action="store_true")
+    args = ap.parse_args(argv)
+
+    results = run(args.repeat, args.only)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for name, seconds in results.items():
+            print(f"{name:<40} {seconds * 1000:10.2f} ms")
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps({k: round(v, 6) for k, v in results.items()}, indent=2) + "\n")
+    if args.baseline:
+        problems = compare(results, json.loads(Path(args.baseline).read_text()), args.threshold)
+        for p in problems:
+            print(f"REGRESSION: {p}", file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
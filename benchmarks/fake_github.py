@@ -0,0 +1,306 @@
+"""
+In-process fake of the GitHub REST endpoints RepoRelay uses.
+
+Serves ``/user``, ``issues/comments``, ``pulls/comments``, ``issues``,
+single issues and their comments, reactions and ``dispatches`` from memory,
+with ``Link`` pagination, ``ETag``/``If-None-Match`` and ``X-RateLimit-*``
+headers, and counts every request so benchmarks can report requests per
+cycle. Timestamps and ``since`` filtering follow GitHub's semantics
+(``updated_at >= since``).
+"""
+
+import datetime as _dt
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+ISO8601 = "%Y-%m-%dT%H:%M:%SZ"
+BOT_LOGIN = "relay-bot"
+
+
+def _iso(ts: float) -> str:
+    return _dt.datetime.fromtimestamp(ts, _dt.timezone.utc).strftime(ISO8601)
+
+
+class FakeRepo:
+    def __init__(self, name: str):
+        self.name = name
+        self.issues: Dict[int, dict] = {}
+        self.comments: List[dict] = []
+        self.review_comments: List[dict] = []
+
+
+class FakeGitHubState:
+    """Mutable fleet data plus request accounting, shared by the handler threads."""
+
+    def __init__(self, per_page_max: int = 100, rate_limit: int = 5000):
+        self.repos: Dict[str, FakeRepo] = {}
+        self.per_page_max = per_page_max
+        self.rate_limit = rate_limit
+        self.remaining = rate_limit
+        self.requests: Counter = Counter()
+        self.statuses: Counter = Counter()
+        self.reactions: List[Tuple[str, int, str]] = []
+        self.dispatches: List[dict] = []
+        self.lock = threading.Lock()
+        self._next_id = 1000
+
+    def next_id(self) -> int:
+        self._next_id += 1
+        return self._next_id
+
+    def repo(self, name: str) -> FakeRepo:
+        if name not in self.repos:
+            self.repos[name] = FakeRepo(name)
+        return self.repos[name]
+
+    def add_issue(self, repo: str, number: int, title: str = "", body: str = "", pr: bool = False,
+                  user: str = "octocat", ts: Optional[float] = None) -> dict:
+        ts = time.time() if ts is None else ts
+        with self.lock:
+            issue = {
+                "id": self.next_id(),
+                "number": number,
+                "title": title or f"Issue {number}",
+                "body": body,
+                "user": {"login": user},
+                "state": "open",
+                "created_at": _iso(ts),
+                "updated_at": _iso(ts),
+                "html_url": f"https://github.com/{repo}/{'pull' if pr else 'issues'}/{number}",
+            }
+            if pr:
+                issue["pull_request"] = {"url": f"https://api.github.com/repos/{repo}/pulls/{number}"}
+            self.repo(repo).issues[number] = issue
+        return issue
+
+    def add_comment(self, repo: str, number: int, body: str, user: str = "octocat", ts: Optional[float] = None) -> dict:
+        ts = time.time() if ts is None else ts
+        with self.lock:
+            cid = self.next_id()
+            comment = {
+                "id": cid,
+                "body": body,
+                "user": {"login": user},
+                "created_at": _iso(ts),
+                "updated_at": _iso(ts),
+                "issue_url": f"https://api.github.com/repos/{repo}/issues/{number}",
+                "html_url": f"https://github.com/{repo}/issues/{number}#issuecomment-{cid}",
+            }
+            self.repo(repo).comments.append(comment)
+            issue = self.repo(repo).issues.get(number)
+            if issue is not None:
+                issue["updated_at"] = max(issue["updated_at"], comment["updated_at"])
+        return comment
+
+    def add_review_comment(self, repo: str, number: int, body: str, user: str = "octocat",
+                           path: str = "README.md", line: int = 1, ts: Optional[float] = None) -> dict:
+        ts = time.time() if ts is None else ts
+        with self.lock:
+            cid = self.next_id()
+            comment = {
+                "id": cid,
+                "body": body,
+                "user": {"login": user},
+                "path": path,
+                "line": line,
+                "side": "RIGHT",
+                "created_at": _iso(ts),
+                "updated_at": _iso(ts),
+                "pull_request_url": f"https://api.github.com/repos/{repo}/pulls/{number}",
+                "html_url": f"https://github.com/{repo}/pull/{number}#discussion_r{cid}",
+            }
+            self.repo(repo).review_comments.append(comment)
+        return comment
+
+    def reset_counters(self) -> None:
+        with self.lock:
+            self.requests.clear()
+            self.statuses.clear()
+
+    def total_requests(self) -> int:
+        with self.lock:
+            return sum(self.requests.values())
+
+
+_ROUTES = [
+    ("GET", re.compile(r"^/user$"), "user"),
+    ("GET", re.compile(r"^/repos/(?P<repo>[^/]+/[^/]+)/issues/comments$"), "repo_issue_comments"),
+    ("GET", re.compile(r"^/repos/(?P<repo>[^/]+/[^/]+)/pulls/comments$"), "repo_review_comments"),
+    ("GET", re.compile(r"^/repos/(?P<repo>[^/]+/[^/]+)/issues$"), "repo_issues"),
+    ("GET", re.compile(r"^/repos/(?P<repo>[^/]+/[^/]+)/issues/(?P<number>\d+)$"), "issue"),
+    ("GET", re.compile(r"^/repos/(?P<repo>[^/]+/[^/]+)/issues/(?P<number>\d+)/comments$"), "issue_comments"),
+    ("POST", re.compile(r"^/repos/(?P<repo>[^/]+/[^/]+)/issues/(?P<number>\d+)/comments$"), "post_comment"),
+    ("POST", re.compile(r"^/repos/(?P<repo>[^/]+/[^/]+)/issues/comments/(?P<id>\d+)/reactions$"), "reaction"),
+    ("POST", re.compile(r"^/repos/(?P<repo>[^/]+/[^/]+)/pulls/comments/(?P<id>\d+)/reactions$"), "review_reaction"),
+    ("POST", re.compile(r"^/repos/(?P<repo>[^/]+/[^/]+)/dispatches$"), "dispatch"),
+]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    state: FakeGitHubState
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        return None
+
+    # -- plumbing ----------------------------------------------------------
+    def _send(self, status: int, payload=None, headers: Optional[Dict[str, str]] = None, counted: bool = True) -> None:
+        st = self.state
+        with st.lock:
+            if counted and status != 304:
+                # conditional hits do not count against the primary limit on GitHub
+                st.remaining = max(0, st.remaining - 1)
+            remaining = st.remaining
+        body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-RateLimit-Limit", str(st.rate_limit))
+        self.send_header("X-RateLimit-Remaining", str(remaining))
+        self.send_header("X-RateLimit-Reset", str(int(time.time()) + 3600))
+        self.send_header("X-RateLimit-Resource", "core")
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def _send_json_cached(self, payload, headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(payload, sort_keys=True).encode("utf-8")
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        headers = dict(headers or {}, ETag=etag)
+        if self.headers.get("If-None-Match") == etag:
+            self._send(304, None, headers)
+            return
+        self._send(200, payload, headers)
+
+    def _route(self, method: str):
+        path = urlsplit(self.path).path
+        for m, pattern, name in _ROUTES:
+            if m != method:
+                continue
+            match = pattern.match(path)
+            if match:
+                return name, match.groupdict()
+        return None, {}
+
+    def _query(self) -> Dict[str, str]:
+        return {k: v[-1] for k, v in parse_qs(urlsplit(self.path).query).items()}
+
+    def _paginate(self, items: List[dict], query: Dict[str, str]) -> None:
+        per_page = min(self.state.per_page_max, max(1, int(query.get("per_page", "30"))))
+        page = max(1, int(query.get("page", "1")))
+        chunk = items[(page - 1) * per_page: page * per_page]
+        headers = {}
+        if page * per_page < len(items):
+            nxt = dict(query, page=str(page + 1))
+            host = self.headers.get("Host", "127.0.0.1")
+            url = f"http://{host}{urlsplit(self.path).path}?{urlencode(nxt)}"
+            headers["Link"] = f'<{url}>; rel="next"'
+        self._send_json_cached(chunk, headers)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        return json.loads(raw or b"{}")
+
+    # -- verbs -------------------------------------------------------------
+    def do_GET(self):  # noqa: N802 - http.server API
+        name, params = self._route("GET")
+        st = self.state
+        with st.lock:
+            st.requests[("GET", name or "unknown")] += 1
+        if name is None:
+            self._send(404, {"message": "Not Found"})
+            return
+        if name == "user":
+            self._send(200, {"login": BOT_LOGIN})
+            return
+        query = self._query()
+        repo = st.repos.get(params.get("repo", ""))
+        if repo is None:
+            self._send(404, {"message": "Not Found"})
+            return
+        since = query.get("since", "")
+        with st.lock:
+            if name == "repo_issue_comments":
+                items = [c for c in repo.comments if c["updated_at"] >= since]
+            elif name == "repo_review_comments":
+                items = [c for c in repo.review_comments if c["updated_at"] >= since]
+            elif name == "repo_issues":
+                items = sorted((i for i in repo.issues.values() if i["updated_at"] >= since),
+                               key=lambda i: i["updated_at"], reverse=True)
+            elif name == "issue":
+                issue = repo.issues.get(int(params["number"]))
+                items = None if issue is None else dict(issue)
+            else:
+                suffix = f"/issues/{params['number']}"
+                items = [c for c in repo.comments if c["issue_url"].endswith(suffix)]
+        if name == "issue":
+            if items is None:
+                self._send(404, {"message": "Not Found"})
+            else:
+                self._send_json_cached(items)
+            return
+        self._paginate(items, query)
+
+    def do_POST(self):  # noqa: N802 - http.server API
+        name, params = self._route("POST")
+        st = self.state
+        with st.lock:
+            st.requests[("POST", name or "unknown")] += 1
+        data = self._read_json()
+        if name == "post_comment":
+            comment = st.add_comment(params["repo"], int(params["number"]), data.get("body", ""), user=BOT_LOGIN)
+            self._send(201, comment)
+        elif name in ("reaction", "review_reaction"):
+            with st.lock:
+                st.reactions.append((params["repo"], int(params["id"]), data.get("content", "")))
+            self._send(201, {"content": data.get("content", "")})
+        elif name == "dispatch":
+            with st.lock:
+                st.dispatches.append(data)
+            self._send(204)
+        else:
+            self._send(404, {"message": "Not Found"})
+
+
+class FakeGitHubServer:
+    """Run a ``FakeGitHubState`` behind a local HTTP server on a daemon thread."""
+
+    def __init__(self, state: Optional[FakeGitHubState] = None, host: str = "127.0.0.1", port: int = 0):
+        self.state = state or FakeGitHubState()
+        handler = type("FakeGitHubHandler", (_Handler,), {"state": self.state})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeGitHubServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-github", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
+
+    def __enter__(self) -> "FakeGitHubServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
@@ -0,0 +1,140 @@
+import os
+import resource
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from RepoRelay import admission
+from RepoRelay import watcher as pwm
+from RepoRelay.admission import Admission
+
+
+def _fake_proc(root, cmdlines):
+    for pid, argv in cmdlines.items():
+        d = root / str(pid)
+        d.mkdir()
+        (d / "cmdline").write_bytes(b"\0".join(a.encode() for a in argv) + b"\0")
+    (root / "self").mkdir()
+    (root / "meminfo").write_text("MemTotal:       16000000 kB\nMemAvailable:    2048000 kB\n")
+
+
+class AdmissionTests(unittest.TestCase):
+    def test_thresholds(self):
+        self.assertFalse(Admission())
+        with mock.patch.object(admission, "load_per_cpu", return_value=1.5), \
+             mock.patch.object(admission, "mem_available_mb", return_value=500.0), \
+             mock.patch.object(admission, "running_processes", return_value=2):
+            self.assertEqual(Admission(max_load=1.0).check().split()[0], "load")
+            self.assertIsNone(Admission(max_load=2.0).check())
+            self.assertEqual(Admission(min_mem_mb=1024).check().split()[0], "memory")
+            self.assertIsNone(Admission(min_mem_mb=256).check())
+            self.assertEqual(Admission(max_running=2, command="codex").check().split()[0], "running")
+            self.assertIsNone(Admission(max_running=3, command="codex").check())
+        # unknown readings never block
+        with mock.patch.object(admission, "load_per_cpu", return_value=None), \
+             mock.patch.object(admission, "mem_available_mb", return_value=None):
+            self.assertIsNone(Admission(max_load=0.1, min_mem_mb=1e9).check())
+
+    def test_proc_readers(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            _fake_proc(root, {
+                10: ["/usr/local/bin/codex", "exec"],
+                11: ["/usr/bin/python3", "/opt/tools/codex", "exec"],
+                12: ["/usr/bin/python3", "-m", "codex"],
+                13: ["bash", "-c", "codex exec"],
+            })
+            self.assertEqual(admission.running_processes("/usr/local/bin/codex", proc=root), 2)
+            self.assertEqual(admission.running_processes("", proc=root), 0)
+            self.assertEqual(admission.running_processes("codex", proc=root / "missing"), 0)
+            self.assertEqual(admission.mem_available_mb(root / "meminfo"), 2000.0)
+            self.assertIsNone(admission.mem_available_mb(root / "missing"))
+
+
+class ResourceLimitTests(unittest.TestCase):
+    def test_unset_limits_need_no_preexec(self):
+        self.assertIsNone(admission.resource_limits())
+        self.assertIsNone(pwm.job_limits(pwm.Config(token="token", root=Path("."))))
+
+    def test_limits_apply_to_the_child_only(self):
+        script = "import os, resource; print(os.nice(0), resource.getrlimit(resource.RLIMIT_CPU)[0])"
+        limits = admission.resource_limits(cpu_seconds=120, nice=5)
+        before = os.nice(0), resource.getrlimit(resource.RLIMIT_CPU)
+        with tempfile.TemporaryDirectory() as tmp:
+            rc, out, _err = pwm.run_external(sys.executable, ["-c", script], None, 30, Path(tmp), preexec_fn=limits)
+        self.assertEqual(rc, 0)
+        nice, cpu = out.split()
+        self.assertEqual(int(nice), min(before[0] + 5, 19))
+        self.assertLessEqual(int(cpu), 120)
+        self.assertEqual((os.nice(0), resource.getrlimit(resource.RLIMIT_CPU)), before)
+
+
+class DeferralTests(unittest.TestCase):
+    def test_busy_host_keeps_triggers_queued(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            cfg = pwm.Config(token="token", root=root)
+            cfg.max_load = 0.5
+            st = pwm.State(root / "state.json")
+            st.ensure_repo("owner/repo", root)
+            meta = st.data["repos"]["owner/repo"]
+            body = "codexe new go"
+            pwm._queue_trigger(meta, 5, {"id": 1, "source": "issue_comment", "author": "a", "body": body,
+                                         "comment": {"id": 1, "user": {"login": "a"}, "body": body}})
+            ctx = pwm.LoopContext(cfg=cfg, gh=None, st=st, me="relay-bot", trigger_re=pwm.re.compile("codexe", pwm.re.I),
+                                  outbox=pwm.build_outbox(cfg, None), admission=pwm.build_admission(cfg))
+            before = admission.DEFERRED.value(reason="load")
+            with mock.patch.object(admission, "load_per_cpu", return_value=3.0), \
+                 mock.patch.object(pwm, "run_conversation_job") as run:
+                pwm.run_ready_conversations(ctx, "owner/repo", meta)
+            run.assert_not_called()
+            self.assertIn("5", meta["pending_triggers"])
+            self.assertEqual(admission.DEFERRED.value(reason="load"), before + 1)
+
+            with mock.patch.object(admission, "load_per_cpu", return_value=0.1), \
+                 mock.patch.object(pwm, "run_conversation_job") as run:
+                pwm.run_ready_conversations(ctx, "owner/repo", meta)
+            run.assert_called_once()
+            self.assertEqual(meta["pending_triggers"], {})
+
+    def test_queued_automation_is_admitted_as_its_own_job(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            cfg = pwm.Config(token="token", root=root)
+            cfg.max_load = 0.5
+            st = pwm.State(root / "state.json")
+            st.ensure_repo("owner/repo", root)
+            meta = st.data["repos"]["owner/repo"]
+            ctx = pwm.LoopContext(cfg=cfg, gh=None, st=st, me="relay-bot", trigger_re=pwm.re.compile("codexe", pwm.re.I),
+                                  outbox=pwm.build_outbox(cfg, None), admission=pwm.build_admission(cfg))
+            body = "codexe new go"
+            pwm._queue_trigger(meta, 5, {"id": 1, "source": "issue_comment", "author": "a", "body": body,
+                                         "comment": {"id": 1, "user": {"login": "a"}, "body": body,
+                                                     "created_at": "2025-10-09T00:00:00Z"}})
+            pwm._queue_trigger(meta, 5, {"id": "automation-triage-x", "source": "automation", "author": "automation:triage",
+                                         "body": "Triage.", "automation": {"name": "triage"},
+                                         "comment": {"id": "automation-triage-x", "body": "Triage.",
+                                                     "created_at": "2025-10-09T01:00:00Z"}})
+            with mock.patch.object(admission, "load_per_cpu", return_value=3.0), \
+                 mock.patch.object(pwm, "run_conversation_job") as run:
+                pwm.run_ready_conversations(ctx, "owner/repo", meta)
+            run.assert_not_called()
+            self.assertEqual(len(meta["pending_triggers"]["5"]), 2)
+
+            with mock.patch.object(admission, "load_per_cpu", side_effect=[0.1, 3.0]), \
+                 mock.patch.object(pwm, "run_conversation_job") as run:
+                pwm.run_ready_conversations(ctx, "owner/repo", meta)
+            self.assertEqual([t["id"] for t in run.call_args[0][5]], [1])
+            self.assertEqual([t["id"] for t in meta["pending_triggers"]["5"]], ["automation-triage-x"])
+
+            with mock.patch.object(admission, "load_per_cpu", return_value=0.1), \
+                 mock.patch.object(pwm, "run_conversation_job") as run:
+                pwm.run_ready_conversations(ctx, "owner/repo", meta)
+            self.assertEqual([t["id"] for t in run.call_args[0][5]], ["automation-triage-x"])
+            self.assertEqual(meta["pending_triggers"], {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,373 @@
+import calendar
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from RepoRelay import automations as am
+from RepoRelay import watcher as pwm
+from RepoRelay.records import IssueEventRecord, IssueRecord, PullRecord
+
+EXAMPLES = Path(__file__).resolve().parent.parent / "docs" / "automation" / "examples"
+
+NIGHTLY = """\
+version: 1
+name: Nightly
+on:
+  schedule:
+    frequency: daily
+    at: '02:00'
+run:
+  command: ./nightly.sh --fast
+  env:
+    API_TOKEN: ${NIGHTLY_TOKEN}
+    MODE: nightly
+  instructions: Check the dependencies.
+"""
+
+SMOKE = """\
+version: 1
+name: Smoke
+on:
+  pull_request:
+    types: [opened, synchronize, closed]
+    branches: [main, 'release/*']
+    paths: ['src/**', '**/*.toml']
+run:
+  instructions: Review the new commits.
+"""
+
+TRIAGE = """\
+version: 1
+name: Triage
+on:
+  github_issue:
+    types: [opened, labeled]
+run:
+  instructions: Suggest labels.
+"""
+
+
+def _ts(text):
+    return calendar.timegm(pwm._parse_iso(text).timetuple())
+
+
+class SchemaTests(unittest.TestCase):
+    validate = staticmethod(am.load_validator())
+
+    def _errors(self, text):
+        try:
+            am.parse_automation("o/r", Path("x.yaml"), text, self.validate)
+        except am.AutomationError as e:
+            return str(e)
+        return ""
+
+    def test_examples_are_valid(self):
+        triggers = {p.name: am.parse_automation("o/r", p, p.read_text(), self.validate).trigger
+                    for p in EXAMPLES.glob("*.yaml")}
+        self.assertEqual(triggers, {"issue_opened.yaml": "github_issue", "pr_updated.yaml": "pull_request",
+                                    "schedule_daily.yaml": "schedule"})
+
+    def test_invalid_definitions_explain_why(self):
+        base = "version: 1\nname: x\nrun: {instructions: hi}\non: "
+        self.assertIn("missing required property 'day_of_week'", self._errors(base + "{schedule: {frequency: weekly}}"))
+        self.assertIn("disallowed combination", self._errors(base + "{schedule: {frequency: daily, day_of_month: 3}}"))
+        self.assertIn("unexpected property 'extra'", self._errors(base + "{schedule: {cron: '0 * * * *', extra: 1}}"))
+        self.assertIn("at most 1", self._errors(base + "{schedule: {cron: '0 * * * *'}, github_issue: {types: [opened]}}"))
+        self.assertIn("must be one of", self._errors(base + "{github_issue: {types: [merged]}}"))
+        self.assertIn("items must be unique", self._errors(base + "{github_issue: {types: [opened, opened]}}"))
+        self.assertIn("invalid schedule", self._errors(base + "{schedule: {cron: '61 * * * *'}}"))
+        self.assertIn("invalid YAML", self._errors("version: [1"))
+        self.assertEqual(self._errors(base + "{schedule: {cron: '*/15 9-17 * * mon-fri'}}"), "")
+
+
+class CronTests(unittest.TestCase):
+    def test_next_after(self):
+        cases = [
+            ("*/15 * * * *", "2025-10-09T10:07:30Z", "2025-10-09T10:15:00Z"),
+            ("0 2 * * *", "2025-10-09T02:00:00Z", "2025-10-10T02:00:00Z"),
+            ("30 9 * * mon-fri", "2025-10-10T10:00:00Z", "2025-10-13T09:30:00Z"),  # Friday -> Monday
+            ("0 0 31 * *", "2025-09-01T00:00:00Z", "2025-10-31T00:00:00Z"),  # September has no 31st
+            ("0 0 13 * 5", "2025-10-01T00:00:00Z", "2025-10-03T00:00:00Z"),  # day OR weekday, like Vixie cron
+            ("0 12 * * 7", "2025-10-09T00:00:00Z", "2025-10-12T12:00:00Z"),  # 7 is Sunday
+            ("0 0 29 feb *", "2025-03-01T00:00:00Z", "2028-02-29T00:00:00Z"),
+        ]
+        for text, after, expected in cases:
+            self.assertEqual(am.CronExpr(text).next_after(_ts(after)), _ts(expected), text)
+
+    def test_frequency_forms(self):
+        self.assertEqual(am.schedule_cron({"frequency": "daily"}).text, "0 0 * * *")
+        self.assertEqual(am.schedule_cron({"frequency": "weekly", "at": "06:30", "day_of_week": "sun"}).text, "30 6 * * sun")
+        self.assertEqual(am.schedule_cron({"frequency": "monthly", "at": "23:05", "day_of_month": 31}).text, "5 23 31 * *")
+        for bad in ("* * * *", "5-1 * * * *", "*/0 * * * *"):
+            with self.assertRaises(ValueError):
+                am.CronExpr(bad)
+
+
+class SchedulerTests(unittest.TestCase):
+    def _automation(self, name, cron, digest="d1"):
+        return am.Automation("o/r", Path(name), name, "schedule", {}, {"instructions": "x"}, digest, am.CronExpr(cron))
+
+    def test_heap_order_and_lazy_invalidation(self):
+        now = _ts("2025-10-09T10:00:30Z")
+        sched = am.Scheduler()
+        hourly, quarter = self._automation("a.yaml", "0 * * * *"), self._automation("b.yaml", "*/15 * * * *")
+        sched.sync([hourly, quarter], now)
+        self.assertEqual(sched.next_due(), _ts("2025-10-09T10:15:00Z"))
+
+        fired = sched.pop_due(_ts("2025-10-09T11:00:00Z"))
+        self.assertEqual([(a.name, d) for a, d in fired],
+                         [("b.yaml", _ts("2025-10-09T10:15:00Z")), ("a.yaml", _ts("2025-10-09T11:00:00Z"))])
+
+        # editing b replaces its timer; removing a drops it without touching the heap
+        sched.sync([self._automation("b.yaml", "0 0 * * *", digest="d2")], _ts("2025-10-09T11:00:00Z"))
+        self.assertEqual(len(sched), 1)
+        self.assertEqual(sched.next_due(), _ts("2025-10-10T00:00:00Z"))
+
+    def test_missed_slots_catch_up_once(self):
+        quarter = self._automation("b.yaml", "*/15 * * * *")
+        last = {quarter.key: {"at": _ts("2025-10-09T08:00:00Z"), "digest": "d1"}}
+        sched = am.Scheduler()
+        sched.sync([quarter], _ts("2025-10-09T10:05:00Z"), last)
+        self.assertEqual([d for _, d in sched.pop_due(_ts("2025-10-09T10:05:00Z"))], [_ts("2025-10-09T08:15:00Z")])
+        self.assertEqual(sched.next_due(), _ts("2025-10-09T10:15:00Z"))
+
+        # a changed definition does not inherit the old run's catch-up
+        sched = am.Scheduler()
+        sched.sync([self._automation("b.yaml", "*/15 * * * *", digest="d2")], _ts("2025-10-09T10:05:00Z"), last)
+        self.assertEqual(sched.pop_due(_ts("2025-10-09T10:05:00Z")), [])
+
+    def test_redact(self):
+        text = am.redact("token=abcd1234 mode=nightly", [{"API_TOKEN": "abcd1234", "MODE": "nightly"}])
+        self.assertEqual(text, "token=*** mode=nightly")
+
+
+class RegistryCacheTests(unittest.TestCase):
+    def test_unchanged_files_are_not_recompiled_and_errors_report_once(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            folder = Path(tmp) / ".automations"
+            folder.mkdir()
+            good, bad = folder / "nightly.yaml", folder / "broken.yml"
+            good.write_text(NIGHTLY)
+            bad.write_text("version: 1\nname: broken\n")
+            for path in (good, bad):
+                pwm.os.utime(path, (1_700_000_000, 1_700_000_000))
+            registry = am.AutomationRegistry(am.load_validator())
+            now = 1_800_000_000
+
+            self.assertEqual(set(registry.refresh({"o/r": Path(tmp)}, now)), {bad})
+            self.assertEqual((registry.compiled, len(registry.by_repo["o/r"])), (2, 1))
+            self.assertEqual(registry.refresh({"o/r": Path(tmp)}, now), {})
+            self.assertEqual(registry.compiled, 2)
+
+            # a new version of the broken file is reported again; a removed file leaves the schedule
+            bad.write_text("version: 1\nname: still broken\n")
+            pwm.os.utime(bad, (1_700_000_100, 1_700_000_100))
+            good.unlink()
+            self.assertEqual(set(registry.refresh({"o/r": Path(tmp)}, now)), {bad})
+            self.assertEqual((registry.compiled, len(registry), len(registry.scheduler)), (3, 1, 0))
+
+    def test_recently_written_files_are_rechecked(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            (Path(tmp) / ".automations").mkdir()
+            path = Path(tmp) / ".automations" / "nightly.yaml"
+            path.write_text(NIGHTLY)
+            registry = am.AutomationRegistry(am.load_validator())
+            mtime = path.stat().st_mtime
+            registry.refresh({"o/r": Path(tmp)}, mtime)
+            registry.refresh({"o/r": Path(tmp)}, mtime + 0.5)
+            registry.refresh({"o/r": Path(tmp)}, mtime + 10)
+            registry.refresh({"o/r": Path(tmp)}, mtime + 20)
+            self.assertEqual(registry.compiled, 3)
+
+
+def _pull(number, sha, base="main", created_at="2025-10-09T00:00:00Z"):
+    return PullRecord(number * 10, number, f"PR {number}", "bob", sha, f"topic-{number}", base, "0" * 40, created_at, created_at)
+
+
+def _response(status, payload=None, headers=None):
+    r = pwm.requests.Response()
+    r.status_code = status
+    r._content = json.dumps(payload).encode("utf-8") if payload is not None else b""
+    r.headers.update(headers or {})
+    r.url = "https://api.test/repos/o/r/pulls"
+    return r
+
+
+class PullRequestFilterTests(unittest.TestCase):
+    def test_branches_and_paths(self):
+        automation = am.parse_automation("o/r", Path("smoke.yaml"), SMOKE, am.load_validator())
+        calls = []
+
+        def files(names):
+            return lambda: calls.append(names) or names
+
+        self.assertTrue(am.pull_request_matches(automation, "main", files(["src/app/main.py"])))
+        self.assertTrue(am.pull_request_matches(automation, "release/2.0", files(["pyproject.toml"])))
+        self.assertFalse(am.pull_request_matches(automation, "main", files(["docs/index.md"])))
+        self.assertFalse(am.pull_request_matches(automation, "develop", files(["src/x.py"])))
+        self.assertEqual(len(calls), 3)  # the branch mismatch never lists files
+
+    def test_open_pulls_are_revalidated_by_etag(self):
+        gh = pwm.GitHub("token", api="https://api.test")
+        listing = [{"number": 3, "head": {"sha": "abc", "ref": "t"}, "base": {"ref": "main"}, "user": {"login": "bob"}}]
+        gh.session.get = mock.Mock(side_effect=[_response(200, listing, {"ETag": 'W/"1"'}), _response(304)])
+        first, second = gh.list_open_pulls("o/r"), gh.list_open_pulls("o/r")
+        self.assertEqual([(p.number, p.head_sha, p.base_ref) for p in second], [(3, "abc", "main")])
+        self.assertEqual(first, second)
+        self.assertEqual(gh.session.get.call_args_list[1][1]["headers"], {"If-None-Match": 'W/"1"'})
+
+    def test_changed_files_are_cached_per_head_sha(self):
+        gh = pwm.GitHub("token", api="https://api.test")
+        gh.session.get = mock.Mock(return_value=_response(200, [{"filename": "src/a.py", "previous_filename": "a.py"}]))
+        self.assertEqual(gh.list_pull_files("o/r", 3, "abc"), ["src/a.py", "a.py"])
+        gh.list_pull_files("o/r", 3, "abc")
+        gh.list_pull_files("o/r", 3, "def")
+        self.assertEqual(gh.session.get.call_count, 2)
+
+
+class _GitHub:
+    def __init__(self, issues=(), events=()):
+        self.issues = list(issues)
+        self.events = list(events)
+        self.posted = []
+        self.pulls = []
+        self.files = {}
+        self.file_calls = []
+
+    def list_issues_since(self, repo, since):
+        return self.issues
+
+    def list_issue_events(self, repo):
+        return self.events
+
+    def get_issue(self, repo, number):
+        return {"number": number, "title": "Crash on start", "body": "It crashes.", "id": number * 100,
+                "created_at": "2025-10-09T00:00:00Z", "updated_at": "2025-10-09T00:05:00Z"}
+
+    def list_issue_comments(self, repo, number):
+        return []
+
+    def list_open_pulls(self, repo):
+        return self.pulls
+
+    def list_pull_files(self, repo, number, sha):
+        self.file_calls.append((number, sha))
+        return self.files.get(sha, [])
+
+    def post_issue_comment(self, repo, number, body):
+        self.posted.append((number, body))
+        return {}
+
+
+class WatcherAutomationTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.root = Path(self.tmp.name)
+        (self.root / ".automations").mkdir()
+        (self.root / ".automations" / "nightly.yaml").write_text(NIGHTLY)
+        (self.root / ".automations" / "triage.yml").write_text(TRIAGE)
+        (self.root / ".automations" / "smoke.yaml").write_text(SMOKE)
+        (self.root / ".automations" / "broken.yaml").write_text("version: 1\nname: broken\n")
+        self.cfg = pwm.Config(token="token", root=self.root)
+        self.cfg.codex_cmd = "mock"
+        self.cfg.automations = True
+        self.cfg.automation_log_issue = 1
+        self.cfg.write_interval = 0
+        self.st = pwm.State(self.root / "state.json")
+        self.st.ensure_repo("owner/repo", self.root)
+        self.meta = self.st.data["repos"]["owner/repo"]
+        self.repos = {"owner/repo": self.root}
+        patcher = mock.patch.object(pwm, "run_external", return_value=(0, "## Result\nused abcd1234", ""))
+        self.run_external = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _ctx(self, gh):
+        ctx = pwm.LoopContext(cfg=self.cfg, gh=gh, st=self.st, me="relay-bot",
+                              trigger_re=pwm.re.compile("codexe", pwm.re.I), outbox=pwm.build_outbox(self.cfg, gh),
+                              automations=pwm.build_automations(self.cfg))
+        with self.assertLogs("reporelay", "WARNING") as logs:
+            pwm.refresh_automations(ctx, self.repos)
+        self.assertIn("broken.yaml", "\n".join(logs.output))
+        return ctx
+
+    def test_schedule_runs_command_and_reports(self):
+        gh = _GitHub()
+        ctx = self._ctx(gh)
+        due = ctx.automations.scheduler.next_due()
+        with mock.patch.dict(pwm.os.environ, {"NIGHTLY_TOKEN": "abcd1234"}):
+            self.assertEqual(pwm.run_due_automations(ctx, self.repos, now=due), 1)
+        ctx.outbox.drain()
+
+        cmd, args, payload = self.run_external.call_args[0][:3]
+        env = self.run_external.call_args[1]["extra_env"]
+        self.assertEqual((cmd, args), ("./nightly.sh", ["--fast"]))
+        self.assertIn("Check the dependencies.", payload)
+        self.assertEqual((env["API_TOKEN"], env["MODE"], env["REPORELAY_MODEL_NAME"]), ("abcd1234", "nightly", "gpt-5-5"))
+        self.assertEqual(gh.posted[0][0], 1)
+        self.assertIn("used ***", gh.posted[0][1])
+        record = self.meta["automation_runs"]["nightly.yaml"]
+        self.assertEqual((record["at"], record["status"]), (due, "ok"))
+        self.assertGreater(ctx.automations.scheduler.next_due(), due)
+
+    def test_issue_events_fire_once_through_conversation_jobs(self):
+        self.meta["automation_events"] = {"since": "2025-10-09T00:00:00Z"}
+        opened = IssueRecord(900, 9, "Crash", "It crashes.", "bob", "open", "2025-10-09T01:00:00Z",
+                             "2025-10-09T01:00:00Z", "", False, ())
+        old = IssueRecord(800, 8, "Old", "", "bob", "open", "2025-10-01T00:00:00Z", "2025-10-09T01:00:00Z", "", False, ())
+        labeled = IssueEventRecord(55, "labeled", "2025-10-09T02:00:00Z", "bug", old)
+        closed = IssueEventRecord(56, "closed", "2025-10-09T02:00:00Z", "", old)
+        gh = _GitHub(issues=[opened, old], events=[closed, labeled])
+        ctx = self._ctx(gh)
+        for _ in range(2):
+            with mock.patch.object(pwm, "_now_utc", return_value="2025-10-09T03:00:00Z"), \
+                    mock.patch.object(pwm.time, "time", return_value=_ts("2025-10-09T03:00:00Z")):
+                pwm.poll_issue_automations(ctx, "owner/repo", self.meta, None, "2025-10-08T00:00:00Z")
+                pwm.run_ready_conversations(ctx, "owner/repo", self.meta)
+        ctx.outbox.drain()
+
+        self.assertEqual(self.run_external.call_count, 2)
+        numbers = sorted(n for n, _ in gh.posted)
+        self.assertEqual(numbers, [8, 9])
+        first_payload = self.run_external.call_args_list[0][0][2]
+        self.assertIn("Suggest labels.", first_payload)
+        self.assertEqual(self.run_external.call_args_list[0][0][1], self.cfg.codex_args)
+        self.assertEqual(self.meta["runs"]["9"]["source"], "automation")
+
+    def test_pull_request_head_tracking(self):
+        gh = _GitHub()
+        gh.files = {"b2": ["src/app.py"], "c3": ["README.md"]}
+        ctx = self._ctx(gh)
+        gh.pulls = [_pull(1, "a1")]
+        pwm.poll_pull_request_automations(ctx, "owner/repo", self.meta)  # baseline only
+        self.assertEqual(self.run_external.call_count, 0)
+
+        gh.pulls = [_pull(1, "b2")]
+        pwm.poll_pull_request_automations(ctx, "owner/repo", self.meta)
+        pwm.poll_pull_request_automations(ctx, "owner/repo", self.meta)  # unchanged head: nothing new
+        pwm.run_ready_conversations(ctx, "owner/repo", self.meta)
+        self.assertEqual(self.run_external.call_count, 1)
+        env = self.run_external.call_args[1]["extra_env"]
+        self.assertEqual((env["REPORELAY_AUTOMATION_ACTION"], env["REPORELAY_PR_HEAD_SHA"]), ("synchronize", "b2"))
+        self.assertIn("Review the new commits.", self.run_external.call_args[0][2])
+
+        # docs-only push and a PR against another branch are filtered out
+        gh.pulls = [_pull(1, "c3"), _pull(2, "d4", base="develop", created_at="2099-01-01T00:00:00Z")]
+        pwm.poll_pull_request_automations(ctx, "owner/repo", self.meta)
+        pwm.run_ready_conversations(ctx, "owner/repo", self.meta)
+        self.assertEqual(self.run_external.call_count, 1)
+        self.assertEqual(gh.file_calls, [(1, "b2"), (1, "c3")])
+
+        gh.pulls = [_pull(2, "d4", base="develop")]
+        gh.files["c3"] = ["src/app.py"]
+        pwm.poll_pull_request_automations(ctx, "owner/repo", self.meta)
+        pwm.run_ready_conversations(ctx, "owner/repo", self.meta)
+        self.assertEqual(self.run_external.call_count, 2)
+        self.assertEqual(self.run_external.call_args[1]["extra_env"]["REPORELAY_AUTOMATION_ACTION"], "closed")
+        self.assertEqual(set(self.meta["pr_heads"]["open"]), {"2"})
+
+
+if __name__ == "__main__":
+    unittest.main()
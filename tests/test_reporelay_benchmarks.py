@@ -0,0 +1,64 @@
+import json
+import unittest
+
+import requests
+
+from benchmarks import bench_e2e, bench_micro
+from benchmarks.fake_github import FakeGitHubServer
+
+
+class FakeGitHubServerTests(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeGitHubServer().start()
+        self.addCleanup(self.server.stop)
+        for n in range(5):
+            self.server.state.add_comment("o/r", 1, f"comment {n}", ts=1_700_000_000 + n)
+
+    def test_pagination_and_rate_limit_headers(self):
+        r = requests.get(f"{self.server.url}/repos/o/r/issues/comments", params={"per_page": 2, "since": "2000-01-01T00:00:00Z"})
+        self.assertEqual(len(r.json()), 2)
+        self.assertIn('rel="next"', r.headers["Link"])
+        self.assertEqual(r.headers["X-RateLimit-Resource"], "core")
+        seen = len(r.json())
+        while 'rel="next"' in r.headers.get("Link", ""):
+            r = requests.get(r.links["next"]["url"])
+            seen += len(r.json())
+        self.assertEqual(seen, 5)
+
+    def test_etag_revalidation_returns_304_without_spending_quota(self):
+        url = f"{self.server.url}/repos/o/r/issues/comments"
+        first = requests.get(url)
+        again = requests.get(url, headers={"If-None-Match": first.headers["ETag"]})
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again.headers["X-RateLimit-Remaining"], first.headers["X-RateLimit-Remaining"])
+
+
+class EndToEndBenchmarkTests(unittest.TestCase):
+    def test_small_fleet_runs_through_main(self):
+        result = bench_e2e.run_benchmark(repos=2, comments=10, cycles=2, trigger_every=5, trace_memory=False)
+        self.assertEqual(result["cycles"], 2)
+        self.assertEqual(result["result_comments"], 2)
+        self.assertEqual(result["reactions"], 4)
+        self.assertGreater(result["requests_per_cycle"], 0)
+
+    def test_compare_flags_regressions(self):
+        base = {"cycles_per_sec": 10.0, "requests_per_cycle": 20.0, "peak_traced_mb": 1.0}
+        ok = {"cycles_per_sec": 9.0, "requests_per_cycle": 21.0, "peak_traced_mb": 1.1}
+        bad = {"cycles_per_sec": 5.0, "requests_per_cycle": 40.0, "peak_traced_mb": 1.0}
+        self.assertEqual(bench_e2e.compare(ok, base, 0.2), [])
+        self.assertEqual(len(bench_e2e.compare(bad, base, 0.2)), 2)
+
+
+class MicroBenchmarkTests(unittest.TestCase):
+    def test_baseline_covers_every_case(self):
+        baseline = json.loads(bench_micro.DEFAULT_BASELINE.read_text())
+        self.assertEqual(set(baseline), set(bench_micro.cases()))
+
+    def test_compare_ignores_noise_and_flags_slowdowns(self):
+        base = {"fast": 0.0001, "slow": 0.05}
+        self.assertEqual(bench_micro.compare({"fast": 0.0015, "slow": 0.06}, base, 0.5), [])
+        self.assertEqual(len(bench_micro.compare({"fast": 0.0001, "slow": 0.2}, base, 0.5)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from RepoRelay import diffs
+from RepoRelay import watcher as pwm
+from RepoRelay.records import PullRecord
+
+DIFF = """\
+diff --git a/src/app.py b/src/app.py
+index 1111111..2222222 100644
+--- a/src/app.py
++++ b/src/app.py
+@@ -1,2 +1,3 @@
+ import os
+-print("hi")
++print("hello")
++print("world")
+diff --git a/logo.png b/logo.png
+index 3333333..4444444 100644
+Binary files a/logo.png and b/logo.png differ
+diff --git a/README.md b/README.md
+index 5555555..6666666 100644
+--- a/README.md
++++ b/README.md
+@@ -1 +1 @@
+-Old
++New
+"""
+
+BASE, HEAD = "a" * 40, "b" * 40
+
+
+class RenderTests(unittest.TestCase):
+    def test_summary(self):
+        text = diffs.render(DIFF, "summary", 10_000)
+        self.assertEqual(text.splitlines(), [
+            "3 file(s) changed, +3 -2",
+            "src/app.py (+2 -1)",
+            "logo.png (binary)",
+            "README.md (+1 -1)",
+        ])
+
+    def test_full_diff_is_cut_at_file_boundaries(self):
+        self.assertIn('+print("world")', diffs.render(DIFF, "full", 10_000))
+        text = diffs.render(DIFF, "full", 300)
+        self.assertIn('+print("world")', text)
+        self.assertNotIn("Binary files", text)
+        self.assertIn("2 more file(s)", text)
+        self.assertIn("README.md (+1 -1)", text)
+        self.assertLessEqual(len(diffs.render(DIFF, "summary", 60)), 60 + len("... and 2 more file(s)"))
+
+
+class DiffCacheTests(unittest.TestCase):
+    def test_round_trip_and_eviction(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = diffs.DiffCache(Path(tmp), max_entries=2, memory_entries=0)
+            cache.put(BASE, HEAD, DIFF)
+            self.assertEqual(diffs.DiffCache(Path(tmp)).get(BASE, HEAD), DIFF)
+            self.assertIsNone(cache.get(BASE, "c" * 40))
+            self.assertIsNone(cache.get("main", HEAD))  # only SHAs address the cache
+
+            for head in ("c" * 40, "d" * 40):
+                cache.put(BASE, head, DIFF)
+            self.assertEqual(len(list(Path(tmp).glob("*.diff.gz"))), 2)
+
+    def test_local_diff_needs_both_commits(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            def git(*args):
+                return subprocess.run(["git", "-C", tmp, "-c", "user.name=t", "-c", "user.email=t@e", *args],
+                                      capture_output=True, text=True, check=True).stdout.strip()
+            git("init", "-q")
+            (Path(tmp) / "a.txt").write_text("one\n")
+            git("add", "a.txt")
+            git("commit", "-qm", "one")
+            base = git("rev-parse", "HEAD")
+            (Path(tmp) / "a.txt").write_text("two\n")
+            git("commit", "-qam", "two")
+            head = git("rev-parse", "HEAD")
+            self.assertIn("+two", diffs.local_diff(Path(tmp), base, head))
+            self.assertIsNone(diffs.local_diff(Path(tmp), base, "f" * 40))
+
+
+class _GitHub:
+    def __init__(self):
+        self.compares = 0
+        self.posted = []
+
+    def get_issue(self, repo, number):
+        return {"number": number, "title": "Add greeting", "body": "", "id": 700, "pull_request": True,
+                "created_at": "2025-10-09T00:00:00Z", "updated_at": "2025-10-09T00:05:00Z"}
+
+    def get_pull(self, repo, number):
+        return PullRecord(70, number, "Add greeting", "bob", HEAD, "greeting", "main", BASE, "", "")
+
+    def compare_diff(self, repo, base, head):
+        self.compares += 1
+        return DIFF
+
+    def list_issue_comments(self, repo, number):
+        return []
+
+    def post_issue_comment(self, repo, number, body):
+        self.posted.append(body)
+        return {}
+
+    def add_reaction_to_comment(self, repo, comment_id, content):
+        return True
+
+
+class PayloadTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        root = Path(self.tmp.name)
+        self.cfg = pwm.Config(token="token", root=root)
+        self.cfg.codex_cmd = "mock"
+        self.cfg.pr_diff = "full"
+        self.cfg.write_interval = 0
+        self.st = pwm.State(root / "state.json")
+        self.st.ensure_repo("owner/repo", root)
+        self.meta = self.st.data["repos"]["owner/repo"]
+        self.gh = _GitHub()
+        self.ctx = pwm.LoopContext(cfg=self.cfg, gh=self.gh, st=self.st, me="relay-bot",
+                                   trigger_re=pwm.re.compile("codexe", pwm.re.I),
+                                   outbox=pwm.build_outbox(self.cfg, self.gh), diffs=pwm.build_diff_cache(self.cfg))
+        patcher = mock.patch.object(pwm, "run_external", return_value=(0, "Done.", ""))
+        self.run_external = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _trigger(self, cid, body):
+        return {"id": cid, "source": "issue_comment", "author": "alice", "body": body,
+                "comment": {"id": cid, "user": {"login": "alice"}, "created_at": "2025-10-09T01:00:00Z", "body": body}}
+
+    def test_diff_is_attached_once_per_sha_pair(self):
+        pwm.run_conversation_job(self.ctx, "owner/repo", self.meta, Path(self.tmp.name), 7, [self._trigger(1, "codexe new review")])
+        payload = self.run_external.call_args[0][2]
+        self.assertIn(f"=== PR DIFF (main {BASE[:7]}...greeting {HEAD[:7]}) ===", payload)
+        self.assertIn('+print("world")', payload)
+
+        self.cfg.resume_send_context = True
+        pwm.run_conversation_job(self.ctx, "owner/repo", self.meta, Path(self.tmp.name), 7, [self._trigger(2, "codexe resume sess-123456")])
+        self.assertIn("(unchanged since last run)", self.run_external.call_args[0][2])
+
+        pwm.run_conversation_job(self.ctx, "owner/repo", self.meta, Path(self.tmp.name), 7, [self._trigger(3, "codexe new again")])
+        self.assertIn('+print("world")', self.run_external.call_args[0][2])
+        self.assertEqual(self.gh.compares, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
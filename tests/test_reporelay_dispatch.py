@@ -0,0 +1,70 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from RepoRelay import dispatch as dp
+
+
+class DispatchBatcherTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.spool = Path(self.tmp.name) / "spool.jsonl"
+        self.sent = []
+
+    def test_start_and_finish_in_one_window_become_one_entry(self):
+        batcher = dp.DispatchBatcher(self.sent.append, self.spool)
+        batcher.emit("task_started", {"title": "o/r#1", "body": "b", "run_id": "R1", "branch": "main"})
+        batcher.emit("pr_opened", {"run_id": "R1", "pr_url": "https://github.com/o/r/pull/1"})
+        batcher.emit("task_done", {"run_id": "R1", "start_ts": "1", "end_ts": "2", "tokens_total": ""})
+        batcher.emit("task_started", {"title": "o/r#2", "run_id": "R2"})
+        self.assertTrue(batcher.flush())
+
+        self.assertEqual(len(self.sent), 1)
+        events = self.sent[0]["events"]
+        self.assertEqual([e["event_type"] for e in events], ["task_completed", "task_started"])
+        done = events[0]["client_payload"]
+        self.assertEqual(done["status"], "Done")
+        self.assertEqual(done["title"], "o/r#1")
+        self.assertEqual(done["pr_url"], "https://github.com/o/r/pull/1")
+        self.assertEqual(len(batcher), 0)
+        self.assertEqual(self.spool.read_text(), "")
+
+    def test_finish_without_buffered_start_is_sent_as_is(self):
+        events = dp.coalesce_events([{"event_type": "task_failed", "client_payload": {"run_id": "R1"}}])
+        self.assertEqual(events, [{"event_type": "task_failed", "client_payload": {"run_id": "R1"}}])
+
+    def test_undelivered_events_survive_restart(self):
+        def down(batch):
+            raise RuntimeError("hub unreachable")
+
+        batcher = dp.DispatchBatcher(down, self.spool)
+        batcher.emit("task_started", {"run_id": "R1"})
+        self.assertFalse(batcher.flush())
+
+        restarted = dp.DispatchBatcher(self.sent.append, self.spool)
+        self.assertEqual(len(restarted), 1)
+        self.assertTrue(restarted.flush())
+        self.assertEqual(self.sent[0]["events"][0]["client_payload"], {"run_id": "R1"})
+
+    def test_batches_are_capped_and_partial_failure_keeps_the_rest(self):
+        calls = []
+
+        def flaky(batch):
+            calls.append(batch)
+            if len(calls) == 2:
+                raise RuntimeError("boom")
+
+        batcher = dp.DispatchBatcher(flaky, self.spool, max_batch=2)
+        for n in range(5):
+            batcher.emit("task_link_issue", {"run_id": f"R{n}"})
+        self.assertFalse(batcher.flush())
+        self.assertEqual(len(calls[0]["events"]), 2)
+        self.assertEqual(len(batcher), 3)
+        kept = [json.loads(line)["client_payload"]["run_id"] for line in self.spool.read_text().splitlines()]
+        self.assertEqual(kept, ["R2", "R3", "R4"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from RepoRelay import fairshare
+from RepoRelay import watcher as pwm
+from RepoRelay.fairshare import Candidate, FairShare
+
+
+def _job(repo, number, author="alice", sources=("issue_comment",), labels=(), queued_at=0.0):
+    return Candidate(repo, str(number), author, tuple(sources), tuple(labels), queued_at)
+
+
+def _drain(fs, jobs, now=100.0, runtime=60.0):
+    order = []
+    jobs = list(jobs)
+    while jobs:
+        job = fs.pick(jobs, now)
+        jobs.remove(job)
+        fs.started(job, now)
+        fs.finished(job, runtime)
+        order.append((job.repo, job.number))
+        now += runtime
+    return order
+
+
+class FairShareTests(unittest.TestCase):
+    def test_busy_repo_does_not_monopolize(self):
+        jobs = [_job("busy/repo", n, author=f"u{n}") for n in range(1, 5)] + [_job("quiet/repo", 9, author="v")]
+        order = _drain(FairShare(aging=0), jobs)
+        self.assertIn(("quiet/repo", "9"), order[:2])
+
+    def test_weights_and_authors(self):
+        fs = FairShare(repo_weights={"big/repo": 3}, aging=0)
+        jobs = [_job("big/repo", n, author=f"a{n}") for n in range(1, 7)] + [_job("small/repo", n, author=f"b{n}") for n in range(1, 7)]
+        first_eight = _drain(fs, jobs)[:8]
+        self.assertEqual(sum(1 for repo, _ in first_eight if repo == "big/repo"), 6)
+
+        # one author spamming a repo alternates with another author of the same repo
+        order = _drain(FairShare(aging=0), [_job("r/r", n, author="spammer") for n in range(1, 4)] + [_job("r/r", 9, author="bob")])
+        self.assertIn(("r/r", "9"), order[:2])
+
+    def test_boosts_and_aging(self):
+        fs = FairShare(label_boosts={"priority:high": 900}, review_boost=300, aging=0)
+        plain, high = _job("r/r", 1), _job("r/r", 2, labels=("Priority:High",))
+        review = _job("r/r", 3, sources=("pr_review_comment",))
+        self.assertIs(fs.pick([plain, review, high], 0.0), high)
+        self.assertIs(fs.pick([plain, review], 0.0), review)
+
+        # a job that has waited long enough overtakes a boosted one
+        fs = FairShare(label_boosts={"priority:high": 900}, aging=1.0)
+        old, boosted = _job("r/r", 1, queued_at=0.0), _job("s/s", 2, labels=("priority:high",), queued_at=1000.0)
+        self.assertIs(fs.pick([old, boosted], 1000.0), old)
+
+    def test_idle_flows_earn_no_credit_and_stats(self):
+        fs = FairShare(aging=0)
+        for _ in range(3):
+            fs.started(_job("a/a", 1), 10.0)
+            fs.finished(_job("a/a", 1), 100.0)
+        # b/b was idle throughout: it starts at the system time, not at zero
+        self.assertEqual(fs.repos.start("b/b"), fs.repos.vtime)
+        self.assertGreater(fs.repos.vtime, 0)
+        stats = fs.stats()
+        self.assertEqual(stats["repo:a/a"], {"jobs": 3, "wait_mean": 10.0, "wait_max": 10.0})
+        self.assertIn("author:alice", stats)
+        self.assertGreaterEqual(fairshare.QUEUE_WAIT.count(queue="repo:a/a"), 3)
+
+    def test_parse_weights(self):
+        self.assertEqual(fairshare.parse_weights(" a/b=2, priority:high=900 ,"), {"a/b": 2.0, "priority:high": 900.0})
+        with self.assertRaises(ValueError):
+            fairshare.parse_weights("nope")
+
+
+class _GitHub:
+    def get_issue(self, repo, number):
+        return {"number": number, "title": "t", "body": "", "id": number, "user": {"login": "x"},
+                "created_at": "2025-10-09T00:00:00Z", "updated_at": "2025-10-09T00:00:00Z"}
+
+    def list_issue_comments(self, repo, number):
+        return []
+
+    def post_issue_comment(self, repo, number, body):
+        return {}
+
+    def add_reaction_to_comment(self, repo, comment_id, content):
+        return True
+
+
+class SchedulerLoopTests(unittest.TestCase):
+    def test_jobs_across_repos_run_in_fair_order(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            cfg = pwm.Config(token="token", root=root)
+            cfg.codex_cmd = "mock"
+            cfg.write_interval = 0
+            cfg.fair_share = True
+            st = pwm.State(root / "state.json")
+            repos = {"busy/repo": root, "quiet/repo": root}
+            for repo in repos:
+                st.ensure_repo(repo, root)
+            ctx = pwm.LoopContext(cfg=cfg, gh=_GitHub(), st=st, me="relay-bot", trigger_re=pwm.re.compile("codexe", pwm.re.I),
+                                  outbox=pwm.build_outbox(cfg, _GitHub()), fairshare=pwm.build_fairshare(cfg))
+            busy, quiet = st.data["repos"]["busy/repo"], st.data["repos"]["quiet/repo"]
+            busy["priority_labels"] = {"3": ["priority:high"]}
+            for meta, number, author in ((busy, 1, "a"), (busy, 2, "a"), (busy, 3, "b"), (quiet, 7, "c")):
+                body = "codexe new go"
+                pwm._queue_trigger(meta, number, {"id": number, "source": "issue_comment", "author": author, "body": body,
+                                                  "comment": {"id": number, "user": {"login": author}, "body": body}})
+            ran = []
+            with mock.patch.object(pwm, "run_conversation_job", side_effect=lambda c, repo, m, p, n, t: ran.append((repo, n))):
+                pwm.run_fair_share(ctx, repos)
+            self.assertEqual(ran[0], ("busy/repo", 3))
+            self.assertEqual(ran[1], ("quiet/repo", 7))
+            self.assertEqual(len(ran), 4)
+            self.assertEqual(busy["pending_triggers"], {})
+
+    def test_memory_report_sizes_without_automations(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            cfg = pwm.Config(token="token", root=root)
+            cfg.fair_share = True
+            st = pwm.State(root / "state.json")
+            ctx = pwm.LoopContext(cfg=cfg, gh=pwm.GitHub("token"), st=st, me="relay-bot",
+                                  trigger_re=pwm.re.compile("codexe", pwm.re.I), outbox=pwm.build_outbox(cfg, None),
+                                  fairshare=pwm.build_fairshare(cfg))
+            sizes = pwm.runtime_sizes(ctx)
+            self.assertEqual(sizes["fairshare.repo_clocks"], 0)
+            self.assertNotIn("automations.cached_files", sizes)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import types
+import unittest
+import urllib.request
+
+from RepoRelay import metrics as mx
+
+
+class RegistryTests(unittest.TestCase):
+    def test_exposition_format(self):
+        reg = mx.Registry()
+        hits = reg.counter("t_requests_total", "Requests.")
+        hits.inc(status=200)
+        hits.inc(2, status=304)
+        hist = reg.histogram("t_seconds", "Latency.", buckets=(1, 5))
+        hist.observe(0.5, repo="o/r")
+        hist.observe(3, repo="o/r")
+        text = reg.render()
+
+        self.assertIn("# TYPE t_requests_total counter", text)
+        self.assertIn('t_requests_total{status="304"} 2', text)
+        self.assertIn('t_seconds_bucket{repo="o/r",le="1"} 1', text)
+        self.assertIn('t_seconds_bucket{repo="o/r",le="5"} 2', text)
+        self.assertIn('t_seconds_bucket{repo="o/r",le="+Inf"} 2', text)
+        self.assertIn('t_seconds_sum{repo="o/r"} 3.5', text)
+        self.assertIn('t_seconds_count{repo="o/r"} 2', text)
+
+    def test_label_values_are_escaped(self):
+        reg = mx.Registry()
+        reg.gauge("t_gauge", "G.").set(1, name='a"b')
+        self.assertIn('t_gauge{name="a\\"b"} 1', reg.render())
+
+
+class ApiAccountingTests(unittest.TestCase):
+    def test_endpoint_label_collapses_repo_and_ids(self):
+        self.assertEqual(mx.endpoint_label("/repos/o/r/issues/12/comments"), "/repos/{repo}/issues/{id}/comments")
+        self.assertEqual(mx.endpoint_label("/repos/o/r/issues/comments?since=x"), "/repos/{repo}/issues/comments")
+        self.assertEqual(mx.endpoint_label("/graphql"), "/graphql")
+
+    def test_record_response_tracks_status_ratio_and_rate_limit(self):
+        before = mx.API_REQUESTS.value(method="GET", endpoint="/repos/{repo}/pulls/comments", status=304)
+        mx.record_response("GET", "/repos/o/r/pulls/comments", 304,
+                           {"X-RateLimit-Remaining": "4321", "X-RateLimit-Resource": "core"})
+        after = mx.API_REQUESTS.value(method="GET", endpoint="/repos/{repo}/pulls/comments", status=304)
+        self.assertEqual(after, before + 1)
+        self.assertEqual(mx.RATE_LIMIT_REMAINING.value(resource="core"), 4321)
+        self.assertGreater(mx.API_NOT_MODIFIED_RATIO.value(), 0)
+
+    def test_session_hook_records_responses(self):
+        from RepoRelay import watcher as pwm
+
+        response = types.SimpleNamespace(
+            request=types.SimpleNamespace(method="POST"),
+            url="https://api.github.com/repos/o/r/issues/3/comments",
+            status_code=201,
+            headers={},
+        )
+        labels = {"method": "POST", "endpoint": "/repos/{repo}/issues/{id}/comments", "status": 201}
+        before = mx.API_REQUESTS.value(**labels)
+        gh = pwm.GitHub("token")
+        for hook in gh.session.hooks["response"]:
+            hook(response)
+        self.assertEqual(mx.API_REQUESTS.value(**labels), before + 1)
+
+
+class ServeTests(unittest.TestCase):
+    def test_metrics_endpoint_serves_registry(self):
+        reg = mx.Registry()
+        reg.counter("t_served_total", "Served.").inc()
+        server = mx.serve(0, registry=reg)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        port = server.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as resp:
+            self.assertEqual(resp.status, 200)
+            self.assertIn("t_served_total 1", resp.read().decode("utf-8"))
+
+
+if __name__ == "__main__":
+    unittest.main()
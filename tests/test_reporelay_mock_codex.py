@@ -0,0 +1,68 @@
+import os
+import random
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+from RepoRelay import mock_codex
+from RepoRelay import watcher as pwm
+
+MOCK = Path(mock_codex.__file__).resolve()
+
+
+def _run(env=None, stdin=None):
+    full_env = {k: v for k, v in os.environ.items() if not k.startswith("MOCK_CODEX_")}
+    full_env.update(env or {})
+    proc = subprocess.run(
+        [sys.executable, str(MOCK)],
+        input=stdin.encode("utf-8") if stdin is not None else b"",
+        capture_output=True,
+        env=full_env,
+        timeout=30,
+    )
+    return proc.returncode, proc.stdout.decode("utf-8"), proc.stderr.decode("utf-8")
+
+
+class MockCodexTests(unittest.TestCase):
+    def test_default_output_is_unchanged(self):
+        self.assertEqual(_run(), (0, mock_codex.MESSAGE, ""))
+
+    def test_chatter_is_trimmed_and_session_id_extracted(self):
+        rc, out, _ = _run({"MOCK_CODEX_CHATTER": "1", "MOCK_CODEX_SESSION_ID": "sess-123456",
+                           "MOCK_CODEX_SESSION_STYLE": "resume"})
+        self.assertEqual(rc, 0)
+        self.assertIn("tokens used", out)
+        cleaned = pwm.postprocess_stdout(out, "codex")
+        self.assertTrue(cleaned.startswith("## Result"))
+        self.assertNotIn("workdir:", cleaned)
+        self.assertEqual(pwm.extract_codex_run_id(out), "sess-123456")
+
+    def test_output_size_ansi_and_exit_code(self):
+        rc, out, err = _run({"MOCK_CODEX_OUTPUT_BYTES": "5000", "MOCK_CODEX_ANSI": "1",
+                             "MOCK_CODEX_EXIT_CODES": "7:1", "MOCK_CODEX_STDERR_BYTES": "100"})
+        self.assertEqual(rc, 7)
+        self.assertIn("\x1b[", out)
+        self.assertGreaterEqual(len(out.encode("utf-8")), 5000)
+        self.assertEqual(len(err), 100)
+
+    def test_stdin_expectations(self):
+        self.assertEqual(_run({"MOCK_CODEX_EXPECT_STDIN": "any"}, stdin="")[0], 3)
+        self.assertEqual(_run({"MOCK_CODEX_EXPECT_STDIN": "contains:ISSUE"}, stdin="=== ISSUE ===")[0], 0)
+        self.assertEqual(_run({"MOCK_CODEX_EXPECT_STDIN": "none"}, stdin="payload")[0], 3)
+
+    def test_latency_and_exit_mix_sampling(self):
+        rng = random.Random(1)
+        self.assertEqual(mock_codex.sample_latency("", rng), 0.0)
+        self.assertEqual(mock_codex.sample_latency("1.5", rng), 1.5)
+        self.assertTrue(0.5 <= mock_codex.sample_latency("uniform:0.5,2", rng) <= 2)
+        self.assertGreaterEqual(mock_codex.sample_latency("normal:0,5", rng), 0.0)
+        with self.assertRaises(ValueError):
+            mock_codex.sample_latency("zipf:1", rng)
+        codes = [mock_codex.pick_exit_code("0:9,1:1", rng) for _ in range(200)]
+        self.assertEqual(set(codes), {0, 1})
+        self.assertGreater(codes.count(0), codes.count(1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+import tempfile
+import time
+import types
+import unittest
+from pathlib import Path
+
+from RepoRelay import outbox as ob
+
+
+def _http_error(status, headers=None):
+    err = Exception(f"HTTP {status}")
+    err.response = types.SimpleNamespace(status_code=status, headers=headers or {})
+    return err
+
+
+class OutboxTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = Path(self.tmp.name) / "outbox.json"
+
+    def test_ops_persist_until_delivered(self):
+        box = ob.Outbox(self.path, min_interval=0)
+        box.submit("comment", "owner/repo#1", {"body": "hi"})
+
+        reloaded = ob.Outbox(self.path, min_interval=0)
+        delivered = []
+        reloaded.register("comment", lambda op: delivered.append(op["payload"]["body"]))
+        reloaded.drain()
+        self.assertEqual(delivered, ["hi"])
+        self.assertEqual(len(ob.Outbox(self.path)), 0)
+
+    def test_failed_op_blocks_only_its_own_key(self):
+        box = ob.Outbox(self.path, min_interval=0, backoff=1000)
+        delivered = []
+
+        def handler(op):
+            if op["payload"]["n"] == 1 and op["attempts"] == 0:
+                raise _http_error(502)
+            delivered.append(op["payload"]["n"])
+
+        box.register("comment", handler)
+        box.submit("comment", "a#1", {"n": 1})
+        box.submit("comment", "a#1", {"n": 2})
+        box.submit("comment", "b#2", {"n": 3})
+
+        box._deliver(box._next_ready(time.time()))
+        # n=1 is backing off; n=2 must wait behind it, n=3 is free to go
+        self.assertEqual(box._next_ready(time.time())["payload"]["n"], 3)
+        box._deliver(box._next_ready(time.time()))
+        box.drain()
+        self.assertEqual(delivered, [3, 1, 2])
+
+    def test_permanent_client_error_is_dropped(self):
+        box = ob.Outbox(self.path, min_interval=0)
+
+        def handler(op):
+            raise _http_error(422)
+
+        box.register("dispatch", handler)
+        box.submit("dispatch", "dispatch:hub", {})
+        box.drain()
+        self.assertEqual(len(box), 0)
+
+    def test_secondary_limit_pauses_writer(self):
+        box = ob.Outbox(self.path, min_interval=0)
+        box.register("comment", lambda op: (_ for _ in ()).throw(_http_error(403, {"Retry-After": "30"})))
+        box.submit("comment", "a#1", {})
+        box._deliver(box._next_ready(time.time()))
+        self.assertGreater(box._paused_until, time.time() + 20)
+        self.assertEqual(len(box), 1)
+
+    def test_results_are_available_to_dependent_ops(self):
+        box = ob.Outbox(self.path, min_interval=0)
+        box.register("project_start", lambda op: {"item_id": "PVTI_1"})
+        seen = []
+        box.register("project_finish", lambda op: seen.append(box.result(op["after"])))
+        start = box.submit("project_start", "project:run", {})
+        box.submit("project_finish", "project:run", {}, after=start)
+        box.drain()
+        self.assertEqual(seen, [{"item_id": "PVTI_1"}])
+
+    def test_writer_thread_delivers_in_order(self):
+        box = ob.Outbox(self.path, min_interval=0)
+        delivered = []
+        box.register("comment", lambda op: delivered.append(op["payload"]["n"]))
+        box.start()
+        for n in range(5):
+            box.submit("comment", "a#1", {"n": n})
+        box.stop(timeout=5)
+        self.assertEqual(delivered, [0, 1, 2, 3, 4])
+
+
+class CommentRetryTests(unittest.TestCase):
+    def test_retry_skips_comment_that_already_landed(self):
+        from RepoRelay import watcher as pwm
+
+        class FlakyGitHub:
+            def __init__(self):
+                self.bodies = []
+
+            def post_issue_comment(self, repo, number, body):
+                self.bodies.append(body)
+                if len(self.bodies) == 1:
+                    raise _http_error(502)
+
+            def _list_issue_comments(self, repo, number):
+                return [{"body": b} for b in self.bodies]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            cfg = pwm.Config(token="token", root=Path(tmp))
+            cfg.write_interval = 0
+            gh = FlakyGitHub()
+            box = pwm.build_outbox(cfg, gh)
+            pwm._post_long_comment(box, "owner/repo", 3, "result")
+            box.drain()
+            self.assertEqual(len(gh.bodies), 1)
+            self.assertIn("<!-- reporelay:", gh.bodies[0])
+            self.assertEqual(len(box), 0)
+
+    def test_restart_after_unacknowledged_post_does_not_repost(self):
+        from RepoRelay import watcher as pwm
+
+        class GitHub:
+            def __init__(self, bodies):
+                self.bodies = bodies
+
+            def post_issue_comment(self, repo, number, body):
+                self.bodies.append(body)
+
+            def _list_issue_comments(self, repo, number):
+                return [{"body": b} for b in self.bodies]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            cfg = pwm.Config(token="token", root=Path(tmp))
+            cfg.write_interval = 0
+            bodies = []
+            box = pwm.build_outbox(cfg, GitHub(bodies))
+            pwm._post_long_comment(box, "owner/repo", 3, "result")
+            # the POST lands, then the process dies before the op is removed from disk
+            op = box._ops[0]
+            box._handlers["comment"](op)
+            self.assertEqual(len(bodies), 1)
+
+            restarted = pwm.build_outbox(cfg, GitHub(bodies))
+            self.assertEqual(len(restarted), 1)
+            restarted.drain()
+            self.assertEqual(len(bodies), 1)
+            self.assertEqual(len(restarted), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from RepoRelay import watcher as pwm
+from RepoRelay.processed import ProcessedIds
+
+
+class ProcessedIdsTests(unittest.TestCase):
+    def test_sorted_membership_and_duplicates(self):
+        ids = ProcessedIds()
+        for value, ts in ((30, 300), (10, 100), (20, 200), (10, 999)):
+            ids.add(value, ts)
+        ids.add("issue-5")  # only integer ids are tracked
+        self.assertEqual(list(ids), [10, 20, 30])
+        self.assertEqual(list(ids.stamps), [100, 200, 300])
+        self.assertIn(20, ids)
+        self.assertNotIn(25, ids)
+        self.assertNotIn("issue-5", ids)
+
+    def test_prune_by_watermark_raises_floor(self):
+        ids = ProcessedIds()
+        ids.add(10, 100)
+        ids.add(40, 400)
+        ids.add(20, 500)  # old comment edited recently
+        self.assertEqual(ids.prune(before=450), 3)
+        self.assertEqual(ids.floor, 40)
+        self.assertEqual(len(ids), 0)
+        # ids below the floor stay processed even though they were dropped
+        for value in (10, 20, 40):
+            self.assertIn(value, ids)
+        self.assertNotIn(41, ids)
+        ids.add(15, 600)
+        self.assertEqual(len(ids), 0)
+
+    def test_round_trip_and_legacy_list(self):
+        ids = ProcessedIds()
+        for i in range(1, 2000):
+            ids.add(10_000_000_000 + i * 7, 1_700_000_000 + i)
+        ids.prune(1_700_000_100)
+        encoded = json.loads(json.dumps(ids.to_json()))
+        back = ProcessedIds.load(encoded)
+        self.assertEqual((list(back), list(back.stamps), back.floor), (list(ids), list(ids.stamps), ids.floor))
+        self.assertLess(len(json.dumps(encoded)), len(json.dumps(list(ids))))
+
+        legacy = ProcessedIds.load([5, 3, 9, 3])
+        self.assertEqual(list(legacy), [3, 5, 9])
+
+
+class StateMigrationTests(unittest.TestCase):
+    def test_state_migrates_lists_and_persists_encoded(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "state.json"
+            path.write_text(json.dumps({"repos": {"o/r": {
+                "path": tmp,
+                "last_since": "2025-10-01T00:00:00Z",
+                "processed_comment_ids": [1, 2, 3],
+            }}}))
+            st = pwm.State(path)
+            st.ensure_repo("o/r", Path(tmp))
+            meta = st.data["repos"]["o/r"]
+            self.assertIsInstance(meta["processed_comment_ids"], ProcessedIds)
+            self.assertIsInstance(meta["processed_review_comment_ids"], ProcessedIds)
+            pwm._mark_processed(meta, "issue_comment", 4)
+            st.save()
+
+            raw = json.loads(path.read_text())["repos"]["o/r"]["processed_comment_ids"]
+            self.assertEqual(raw["v"], 1)
+            reloaded = pwm.State(path)
+            reloaded.ensure_repo("o/r", Path(tmp))
+            self.assertEqual(list(reloaded.data["repos"]["o/r"]["processed_comment_ids"]), [1, 2, 3, 4])
+
+    def test_memory_report_sizes_encode_processed_ids(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            cfg = pwm.Config(token="token", root=root)
+            st = pwm.State(root / "state.json")
+            st.ensure_repo("o/r", root)
+            pwm._mark_processed(st.data["repos"]["o/r"], "issue_comment", 4)
+            ctx = pwm.LoopContext(cfg=cfg, gh=pwm.GitHub("token"), st=st, me="relay-bot",
+                                  trigger_re=pwm.re.compile("codexe", pwm.re.I), outbox=pwm.build_outbox(cfg, None))
+            sizes = pwm.runtime_sizes(ctx)
+            self.assertGreater(sizes["state.json_bytes"], 0)
+            self.assertEqual(sizes["state.processed_comment_ids"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import pstats
+import signal
+import tempfile
+import tracemalloc
+import unittest
+from pathlib import Path
+
+from RepoRelay.profiling import Profiler
+
+
+class ProfilerTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = Path(self.tmp.name)
+
+    def _files(self, pattern):
+        return sorted(self.dir.glob(pattern))
+
+    def test_profiles_the_next_n_cycles(self):
+        prof = Profiler(self.dir, cycles=2)
+        prof.cycle_started()
+        self.assertFalse(prof.active)  # nothing requested yet
+        prof.cycle_finished()
+
+        prof.on_sigusr1()
+        for _ in range(2):
+            prof.cycle_started()
+            self.assertTrue(prof.active)
+            sum(i * i for i in range(1000))
+            prof.cycle_finished()
+        self.assertFalse(prof.active)
+        [path] = self._files("reporelay-profile-*.pstats")
+        self.assertGreater(pstats.Stats(str(path)).total_calls, 0)
+
+    def test_second_sigusr1_stops_early_and_close_flushes(self):
+        prof = Profiler(self.dir, cycles=10)
+        prof.on_sigusr1()
+        prof.cycle_started()
+        prof.on_sigusr1()
+        self.assertFalse(prof.active)
+        self.assertEqual(len(self._files("*.pstats")), 1)
+
+        prof.on_sigusr1()
+        prof.cycle_started()
+        prof.close()
+        self.assertEqual(len(self._files("*.pstats")), 2)
+
+    @unittest.skipUnless(hasattr(signal, "SIGUSR2"), "POSIX signals only")
+    def test_sigusr2_writes_memory_report(self):
+        was_tracing = tracemalloc.is_tracing()
+        self.addCleanup(lambda: None if was_tracing else tracemalloc.stop())
+        prof = Profiler(self.dir, sizes=lambda: {"outbox.queued": 3, "state.repos": 2}, top=5)
+        previous = signal.signal(signal.SIGUSR2, prof.on_sigusr2)
+        self.addCleanup(signal.signal, signal.SIGUSR2, previous)
+
+        os.kill(os.getpid(), signal.SIGUSR2)
+        os.kill(os.getpid(), signal.SIGUSR2)
+
+        reports = self._files("reporelay-memory-*.txt")
+        self.assertTrue(reports)
+        text = reports[-1].read_text()
+        self.assertIn("outbox.queued", text)
+        self.assertIn("## tracemalloc: current=", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import unittest
+from unittest import mock
+
+from RepoRelay import projects as pj
+
+
+class _Response:
+    def __init__(self, payload):
+        self._payload = payload
+        self.status_code = 200
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        return None
+
+
+def _project(with_agent_status=True):
+    fields = [
+        {"id": "F_status", "name": "Status", "dataType": "SINGLE_SELECT",
+         "options": [{"id": "O_prog", "name": "In progress"}, {"id": "O_done", "name": "Done"},
+                     {"id": "O_pr", "name": "PR open"}]},
+        {"id": "F_start", "name": "Start date", "dataType": "DATE"},
+        {"id": "F_end", "name": "End date", "dataType": "DATE"},
+        {"id": "F_run", "name": "Run ID", "dataType": "TEXT"},
+        {"id": "F_branch", "name": "Branch", "dataType": "TEXT"},
+        {"id": "F_issue", "name": "Issue URL", "dataType": "TEXT"},
+        {"id": "F_pr", "name": "PR URL", "dataType": "TEXT"},
+        {"id": "F_tokens", "name": "Tokens total", "dataType": "NUMBER"},
+        {"id": "F_dur", "name": "Duration minutes", "dataType": "NUMBER"},
+    ]
+    if with_agent_status:
+        fields.append({"id": "F_agent", "name": "Agent Status", "dataType": "SINGLE_SELECT",
+                       "options": [{"id": "A_prog", "name": "In Progress"}, {"id": "A_done", "name": "Done"}]})
+    return {"id": "PVT_1", "fields": {"nodes": fields}}
+
+
+class FakeSession:
+    def __init__(self, with_agent_status=True):
+        self.queries = []
+        self.with_agent_status = with_agent_status
+
+    def post(self, url, json=None, timeout=None):
+        query = json["query"]
+        self.queries.append(json)
+        if "organization(login" in query:
+            return _Response({"data": {"organization": {"projectV2": _project(self.with_agent_status)}, "user": None},
+                              "errors": [{"message": "Could not resolve to a User"}]})
+        if "createProjectV2Field" in query:
+            self.with_agent_status = True
+            return _Response({"data": {"createProjectV2Field": {"projectV2Field": {
+                "id": "F_agent", "name": "Agent Status", "dataType": "SINGLE_SELECT",
+                "options": [{"id": "A_prog", "name": "In Progress"}]}}}})
+        if "addProjectV2DraftIssue" in query:
+            return _Response({"data": {"addProjectV2DraftIssue": {"projectItem": {"id": "PVTI_9"}}}})
+        return _Response({"data": {}})
+
+
+class ProjectsClientTests(unittest.TestCase):
+    def test_resolution_is_cached_and_updates_are_batched(self):
+        session = FakeSession()
+        client = pj.ProjectsClient(session, "my-org", 3)
+        item = client.start("owner/repo#1", "run started", run_id="RUN-1", branch="main", issue_url="https://x/1")
+        client.start("owner/repo#2", "run started", run_id="RUN-2")
+
+        self.assertEqual(item, "PVTI_9")
+        lookups = [q for q in session.queries if "organization(login" in q["query"]]
+        self.assertEqual(len(lookups), 1)
+        # one lookup, then create + one batched update per start
+        self.assertEqual(len(session.queries), 5)
+        update = session.queries[2]
+        self.assertIn("u0: updateProjectV2ItemFieldValue", update["query"])
+        values = {v for k, v in update["variables"].items() if k.startswith("f")}
+        self.assertEqual(values, {"F_status", "F_agent", "F_start", "F_run", "F_branch", "F_issue"})
+        self.assertEqual(update["variables"]["v0"], {"singleSelectOptionId": "O_prog"})
+
+    def test_missing_agent_status_field_is_created_once(self):
+        session = FakeSession(with_agent_status=False)
+        client = pj.ProjectsClient(session, "my-org", 3)
+        client.pr("PVTI_1", "https://github.com/o/r/pull/4")
+        client.pr("PVTI_1", "https://github.com/o/r/pull/4")
+        creates = [q for q in session.queries if "createProjectV2Field" in q["query"]]
+        self.assertEqual(len(creates), 1)
+
+    def test_finish_sets_duration_and_tokens(self):
+        session = FakeSession()
+        client = pj.ProjectsClient(session, "my-org", 3)
+        with mock.patch.object(pj, "_to_epoch", side_effect=lambda v: {"100": 100, "now": 100 + 600}.get(v)):
+            client.finish("PVTI_1", "Done", tokens_total=42, start_ts="100", end_ts="now", run_id="RUN-1")
+        variables = session.queries[-1]["variables"]
+        by_field = {variables[k]: variables["v" + k[1:]] for k in variables if k.startswith("f")}
+        self.assertEqual(by_field["F_dur"], {"number": 10.0})
+        self.assertEqual(by_field["F_tokens"], {"number": 42.0})
+        self.assertEqual(by_field["F_status"], {"singleSelectOptionId": "O_done"})
+
+    def test_to_epoch_formats(self):
+        self.assertEqual(pj._to_epoch("1697500000"), 1697500000)
+        self.assertEqual(pj._to_epoch("2023-10-17T00:00:00Z"), 1697500800)
+        self.assertIsNone(pj._to_epoch("garbage"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+
+from RepoRelay import watcher
+from RepoRelay.records import CommentRecord, IssueRecord, ReviewCommentRecord
+
+USER = {"login": "alice", "id": 1, "avatar_url": "https://example.invalid/a.png", "type": "User", "site_admin": False}
+
+API_COMMENT = {
+    "id": 11,
+    "node_id": "IC_kw",
+    "url": "https://api.github.com/repos/o/r/issues/comments/11",
+    "html_url": "https://github.com/o/r/issues/5#issuecomment-11",
+    "issue_url": "https://api.github.com/repos/o/r/issues/5",
+    "user": USER,
+    "created_at": "2025-10-01T10:00:00Z",
+    "updated_at": "2025-10-01T10:05:00Z",
+    "author_association": "OWNER",
+    "body": "codexe please fix",
+    "reactions": {"total_count": 0, "+1": 0},
+}
+
+API_REVIEW_COMMENT = {
+    "id": 21,
+    "pull_request_url": "https://api.github.com/repos/o/r/pulls/6",
+    "html_url": "https://github.com/o/r/pull/6#discussion_r21",
+    "user": USER,
+    "created_at": "2025-10-01T11:00:00Z",
+    "updated_at": "2025-10-01T11:00:00Z",
+    "body": "codexe rename this",
+    "path": "src/app.py",
+    "line": 12,
+    "original_line": 10,
+    "side": "RIGHT",
+    "diff_hunk": "@@ -1,3 +1,3 @@\n-a\n+b",
+}
+
+API_ISSUE = {
+    "id": 31,
+    "number": 5,
+    "title": "Broken build",
+    "body": "Parent: #2\n\nDetails",
+    "user": USER,
+    "state": "open",
+    "labels": [{"name": "bug"}],
+    "created_at": "2025-09-30T09:00:00Z",
+    "updated_at": "2025-10-01T10:05:00Z",
+    "html_url": "https://github.com/o/r/issues/5",
+}
+
+
+class RecordTests(unittest.TestCase):
+    def test_projection_keeps_only_needed_fields(self):
+        c = CommentRecord.from_api(API_COMMENT)
+        self.assertEqual((c.id, c.author, c.body), (11, "alice", "codexe please fix"))
+        self.assertFalse(hasattr(c, "__dict__"))
+        self.assertNotIn("reactions", c.to_dict())
+
+        rc = ReviewCommentRecord.from_api(API_REVIEW_COMMENT)
+        self.assertEqual((rc.path, rc.line, rc.side), ("src/app.py", 12, "RIGHT"))
+
+        issue = IssueRecord.from_api(API_ISSUE)
+        self.assertFalse(issue.pull_request)
+        self.assertTrue(IssueRecord.from_api(dict(API_ISSUE, pull_request={"url": "x"})).pull_request)
+
+    def test_dict_read_compatibility(self):
+        c = CommentRecord.from_api(API_COMMENT)
+        self.assertEqual(c.get("user", {}).get("login"), "alice")
+        self.assertEqual(c["created_at"], "2025-10-01T10:00:00Z")
+        self.assertEqual(c.get("title", "none"), "none")
+        self.assertEqual(CommentRecord.from_api({"id": 1}).get("user", {}), {})
+        with self.assertRaises(KeyError):
+            IssueRecord.from_api({"id": 1})["number"]
+
+    def test_build_job_input_matches_raw_dicts(self):
+        parent = dict(API_ISSUE, number=2, title="Parent", body="Parent body")
+        raw = watcher.build_job_input("o/r", API_ISSUE, [API_COMMENT], parent, API_COMMENT, resume=False)
+        projected = watcher.build_job_input(
+            "o/r",
+            IssueRecord.from_api(API_ISSUE),
+            [CommentRecord.from_api(API_COMMENT)],
+            IssueRecord.from_api(parent),
+            CommentRecord.from_api(API_COMMENT),
+            resume=False,
+        )
+        self.assertEqual(raw, projected)
+
+    def test_watermark_and_delta_accept_records(self):
+        issue = IssueRecord.from_api(API_ISSUE)
+        comments = [CommentRecord.from_api(dict(API_COMMENT, id=i)) for i in (3, 7)]
+        mark = watcher.context_watermark(issue, comments, None)
+        self.assertEqual(mark["context_last_comment_id"], 7)
+        self.assertEqual(mark["context_body_sha"], watcher._body_digest(API_ISSUE))
+        new, body_changed, _ = watcher.select_resume_delta(dict(mark, context_last_comment_id=3), issue, comments, None)
+        self.assertEqual([c.id for c in new], [7])
+        self.assertFalse(body_changed)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from RepoRelay import related
+from RepoRelay import watcher as pwm
+from RepoRelay.records import CommentRecord, IssueRecord, ReviewCommentRecord
+
+API = "https://api.github.com/repos/owner/repo"
+
+
+def _issue(number, title, body, updated="2025-10-09T00:00:00Z"):
+    return IssueRecord(number * 10, number, title, body, "alice", "open", "2025-10-01T00:00:00Z", updated, "", False, ())
+
+
+def _comment(cid, number, body, updated="2025-10-09T00:00:00Z"):
+    return CommentRecord(cid, body, "bob", updated, updated, f"{API}/issues/{number}", "")
+
+
+@unittest.skipUnless(related.fts5_available(), "SQLite without FTS5")
+class IndexTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.index = related.ConversationIndex(Path(self.tmp.name) / "index.sqlite3")
+        self.addCleanup(self.index.close)
+        self.index.add_issues("owner/repo", [
+            _issue(1, "Crash when parsing YAML anchors", "The loader raises on aliases."),
+            _issue(2, "Add dark mode", "Theme switcher for the settings page."),
+            _issue(3, "Docs typo", "Fix spelling in the README."),
+        ])
+        self.index.add_issues("other/repo", [_issue(1, "YAML anchors crash", "Same crash elsewhere.")])
+
+    def test_ranks_threads_of_the_same_repo(self):
+        matches = self.index.related("owner/repo", "Parsing YAML with anchors crashes", 5)
+        self.assertEqual([n for n, _ in matches], [1])
+        self.assertEqual(self.index.related("owner/repo", "yaml anchors", 5, exclude=[1]), [])
+        self.assertEqual(self.index.related("owner/repo", "the and for", 5), [])
+
+    def test_comments_and_review_comments_join_their_thread(self):
+        self.index.add_comments("owner/repo", [_comment(100, 2, "The palette contrast looks wrong")])
+        review = ReviewCommentRecord(200, "contrast ratio of this palette", "carol", "", "2025-10-09T00:00:00Z",
+                                     f"{API}/pulls/4", "", "app.css", 3, 3, "RIGHT")
+        self.index.add_comments("owner/repo", [review])
+        self.assertEqual(sorted(n for n, _ in self.index.related("owner/repo", "palette contrast", 5)), [2, 4])
+        title, body, comments = self.index.thread("owner/repo", 2)
+        self.assertEqual((title, comments), ("Add dark mode", [("bob", "The palette contrast looks wrong")]))
+
+    def test_edits_replace_the_indexed_text(self):
+        self.index.add_comments("owner/repo", [_comment(100, 3, "mentions a segfault")])
+        self.index.add_comments("owner/repo", [_comment(100, 3, "nothing relevant now", "2025-10-10T00:00:00Z")])
+        self.assertEqual(self.index.related("owner/repo", "segfault", 5), [])
+        self.assertEqual(len(self.index), 5)
+
+    def test_render_shares_the_budget(self):
+        self.index.add_comments("owner/repo", [_comment(100 + i, 1, "aliases " * 200) for i in range(3)])
+        matches = self.index.related("owner/repo", "yaml anchors settings theme", 5)
+        text = related.render_related(self.index, "owner/repo", matches, 400)
+        self.assertLessEqual(len(text.encode("utf-8")), 400)
+        self.assertIn("#1: Crash when parsing YAML anchors", text)
+        self.assertIn("#2: Add dark mode", text)
+
+
+class _GitHub:
+    def get_issue(self, repo, number):
+        return {"number": number, "title": "YAML anchors break the loader", "body": "Aliases fail.", "id": 900,
+                "user": {"login": "alice"}, "created_at": "2025-10-09T00:00:00Z", "updated_at": "2025-10-09T00:05:00Z"}
+
+    def list_issue_comments(self, repo, number):
+        return []
+
+    def post_issue_comment(self, repo, number, body):
+        return {}
+
+    def add_reaction_to_comment(self, repo, comment_id, content):
+        return True
+
+
+@unittest.skipUnless(related.fts5_available(), "SQLite without FTS5")
+class PayloadTests(unittest.TestCase):
+    def test_related_threads_are_attached_without_api_calls(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            cfg = pwm.Config(token="token", root=root)
+            cfg.codex_cmd = "mock"
+            cfg.write_interval = 0
+            cfg.related_threads = 3
+            st = pwm.State(root / "state.json")
+            st.ensure_repo("owner/repo", root)
+            gh = _GitHub()
+            ctx = pwm.LoopContext(cfg=cfg, gh=gh, st=st, me="relay-bot", trigger_re=pwm.re.compile("codexe", pwm.re.I),
+                                  outbox=pwm.build_outbox(cfg, gh), index=pwm.build_index(cfg))
+            self.addCleanup(ctx.index.close)
+            ctx.index.add_issues("owner/repo", [_issue(1, "Crash when parsing YAML anchors", "Loader raises.")])
+            body = "codexe new please look"
+            trigger = {"id": 5, "source": "issue_comment", "author": "alice", "body": body,
+                       "comment": {"id": 5, "user": {"login": "alice"}, "created_at": "2025-10-09T01:00:00Z", "body": body}}
+            with mock.patch.object(pwm, "run_external", return_value=(0, "Done.", "")) as run:
+                pwm.run_conversation_job(ctx, "owner/repo", st.data["repos"]["owner/repo"], root, 8, [trigger])
+            payload = run.call_args[0][2]
+            self.assertIn("=== RELATED THREADS (top 1 from the local index) ===", payload)
+            self.assertIn("#1: Crash when parsing YAML anchors", payload)
+            # the job's own issue is indexed for later lookups
+            self.assertEqual([n for n, _ in ctx.index.related("owner/repo", "loader aliases", 5, exclude=[1])], [8])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from RepoRelay import throttle
+from RepoRelay import watcher as pwm
+from RepoRelay.processed import ProcessedIds
+from RepoRelay.throttle import TokenBuckets
+
+API = "https://api.github.com/repos/owner/repo"
+
+
+class TokenBucketTests(unittest.TestCase):
+    def test_parse_rate(self):
+        self.assertEqual(throttle.parse_rate("10/h"), (10.0, 3600.0))
+        self.assertEqual(throttle.parse_rate(" 3 / 15m "), (3.0, 900.0))
+        self.assertEqual(throttle.parse_rate("20/3600"), (20.0, 3600.0))
+        self.assertIsNone(throttle.parse_rate(""))
+        for bad in ("10", "0/h", "ten/h", "5/0"):
+            with self.assertRaises(ValueError, msg=bad):
+                throttle.parse_rate(bad)
+
+    def test_take_refill_and_notice(self):
+        store = {}
+        buckets = TokenBuckets(store, {"author": (2, 100), "repo": (3, 100)})
+        self.assertIsNone(buckets.take(["author:a", "repo:r"], 0))
+        self.assertIsNone(buckets.take(["author:a", "repo:r"], 0))
+        self.assertEqual(buckets.take(["author:a", "repo:r"], 0), ("author:a", 50))
+        # another author still draws on the repo bucket
+        self.assertIsNone(buckets.take(["author:b", "repo:r"], 0))
+        self.assertEqual(buckets.take(["author:b", "repo:r"], 0), ("repo:r", 34))
+        self.assertTrue(buckets.should_notice("author:a"))
+        self.assertFalse(buckets.should_notice("author:a"))
+
+        self.assertIsNone(buckets.take(["author:a"], 50))
+        self.assertFalse(store["author:a"]["noticed"])
+        # full buckets are forgotten; unknown kinds are unlimited
+        self.assertIsNone(buckets.take(["author:c", "team:x"], 1000))
+        self.assertNotIn("author:a", store)
+        self.assertNotIn("team:x", store)
+
+
+class IntakeTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        root = Path(self.tmp.name)
+        self.cfg = pwm.Config(token="token", root=root)
+        self.cfg.author_rate = "1/h"
+        self.st = pwm.State(root / "state.json")
+        self.st.ensure_repo("owner/repo", root)
+        self.meta = self.st.data["repos"]["owner/repo"]
+        self.ctx = pwm.LoopContext(cfg=self.cfg, gh=None, st=self.st, me="relay-bot",
+                                   trigger_re=pwm.re.compile("codexe", pwm.re.I),
+                                   outbox=pwm.build_outbox(self.cfg, None), throttle=pwm.build_throttle(self.cfg, self.st))
+
+    def _comment(self, cid, author="alice", number=5):
+        return {"id": cid, "body": "codexe new go", "user": {"login": author}, "issue_url": f"{API}/issues/{number}",
+                "created_at": "2025-10-09T00:00:00Z"}
+
+    def test_throttled_triggers_are_dropped_with_one_notice(self):
+        processed = ProcessedIds()
+        for cid in (1, 2, 3):
+            pwm.intake_issue_comment(self.ctx, "owner/repo", self.meta, self._comment(cid), processed, set())
+        pwm.intake_issue_comment(self.ctx, "owner/repo", self.meta, self._comment(4, author="bob"), processed, set())
+        self.assertEqual(sorted(t["id"] for t in self.meta["pending_triggers"]["5"]), [1, 4])
+        self.assertIn(2, processed)
+        self.assertIn(3, processed)
+        ops = [op for op in self.ctx.outbox._ops if op["kind"] in ("comment", "reaction")]
+        self.assertEqual([op["payload"].get("content") for op in ops if op["kind"] == "reaction"], ["confused", "confused"])
+        notices = [op["payload"]["body"] for op in ops if op["kind"] == "comment"]
+        self.assertEqual(len(notices), 1)
+        self.assertIn("Rate limit reached for @alice: at most 1 run(s) per 1:00:00", notices[0])
+        # the budget is part of the state file
+        self.st.save()
+        self.assertIn("author:alice", pwm.State(self.st.path).data["throttle"])
+
+    def test_throttled_issue_body_is_not_rechecked(self):
+        issue = {"id": 70, "number": 7, "title": "codexe please", "body": "", "user": {"login": "alice"},
+                 "updated_at": "2025-10-09T00:00:00Z"}
+        pwm.intake_issue_comment(self.ctx, "owner/repo", self.meta, self._comment(1), ProcessedIds(), set())
+        pwm.intake_issue(self.ctx, "owner/repo", self.meta, issue, set())
+        pwm.intake_issue(self.ctx, "owner/repo", self.meta, issue, set())
+        self.assertNotIn("7", self.meta["pending_triggers"])
+        self.assertGreaterEqual(pwm.THROTTLED.value(kind="author"), 1)
+        self.assertEqual(len([op for op in self.ctx.outbox._ops if op["kind"] == "comment"]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from RepoRelay import tracing as tr
+
+
+class TracerTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = Path(self.tmp.name) / "trace.jsonl"
+
+    def test_spans_are_written_with_run_id(self):
+        tracer = tr.Tracer(self.path)
+        trace = tracer.begin(repo="o/r", number=1)
+        with trace.span("job"):
+            with trace.span("get_issue"):
+                pass
+            trace.run_id = "RUN-1"
+        trace.finish()
+
+        records = tr.read_records(str(self.path))
+        self.assertEqual([r["span"] for r in records], ["get_issue", "job"])
+        self.assertEqual({r["run_id"] for r in records}, {"RUN-1"})
+        self.assertEqual(records[1]["attrs"]["repo"], "o/r")
+
+    def test_failed_span_records_error(self):
+        trace = tr.Tracer(self.path).begin()
+        with self.assertRaises(KeyError):
+            with trace.span("get_issue"):
+                raise KeyError("x")
+        trace.finish()
+        self.assertEqual(tr.read_records(str(self.path))[0]["attrs"]["error"], "KeyError")
+
+    def test_sampling_and_threshold(self):
+        self.assertIs(tr.Tracer(self.path, sample_rate=0).begin(), tr.NULL_TRACE)
+        self.assertIs(tr.Tracer(None).begin(), tr.NULL_TRACE)
+        tr.NULL_TRACE.run_id = "ignored"
+        self.assertEqual(tr.NULL_TRACE.run_id, "")
+
+        tracer = tr.Tracer(self.path, min_ms=1000)
+        trace = tracer.begin()
+        with trace.span("job"):
+            with trace.span("fast"):
+                pass
+        trace.finish()
+        self.assertEqual([r["span"] for r in tr.read_records(str(self.path))], ["job"])
+
+    def test_file_rotates(self):
+        tracer = tr.Tracer(self.path, max_bytes=200, backups=2)
+        for n in range(10):
+            tracer.record(f"RUN-{n}", "deliver_comment", 1.0, 2.0)
+        self.assertTrue(self.path.exists())
+        self.assertTrue(Path(f"{self.path}.1").exists())
+        self.assertTrue(Path(f"{self.path}.2").exists())
+        self.assertFalse(Path(f"{self.path}.3").exists())
+        self.assertLessEqual(self.path.stat().st_size, 200)
+
+    def test_chrome_trace_conversion(self):
+        records = [
+            {"run_id": "A", "span": "job", "ts": 10.0, "dur_ms": 5.0, "attrs": {}},
+            {"run_id": "B", "span": "job", "ts": 11.0, "dur_ms": 2.5, "attrs": {"repo": "o/r"}},
+        ]
+        events = tr.to_chrome_trace(records)["traceEvents"]
+        spans = [e for e in events if e["ph"] == "X"]
+        self.assertEqual([(e["ts"], e["dur"], e["tid"]) for e in spans], [(10000000, 5000, 1), (11000000, 2500, 2)])
+        names = {e["args"]["name"] for e in events if e["ph"] == "M"}
+        self.assertEqual(names, {"A", "B"})
+        json.dumps(events)
+
+
+if __name__ == "__main__":
+    unittest.main()
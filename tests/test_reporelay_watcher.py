@@ -1,13 +1,16 @@
 import os
 import sys
 import tempfile
+import time
 import types
 import unittest
 from pathlib import Path
 from unittest import mock
 
 
-if "requests" not in sys.modules:
+try:
+    import requests  # noqa: F401
+except ImportError:
     class _StubSession:
         def __init__(self):
             self.headers = {}
@@ -105,6 +108,295 @@ class BuildJobInputTests(unittest.TestCase):
         self.assertIn("MODE: NEW", payload)
 
 
+class ResumeDeltaTests(unittest.TestCase):
+    def setUp(self):
+        self.cfg = pwm.Config(token="token", root=Path("."))
+        self.cfg.resume_delta = True
+        self.issue = {"number": 7, "title": "Do work", "body": "original body"}
+        self.comments = [
+            {"id": 10, "created_at": "2025-10-09T00:00:00Z", "user": {"login": "alice"}, "body": "old comment"},
+            {"id": 11, "created_at": "2025-10-09T01:00:00Z", "user": {"login": "bob"}, "body": "seen comment"},
+        ]
+        self.trigger = {"id": 12, "user": {"login": "alice"}, "created_at": "2025-10-09T02:00:00Z", "body": "codexe"}
+
+    def _state(self):
+        state = {"codex_run_id": "sess123"}
+        state.update(pwm.context_watermark(self.issue, self.comments, None))
+        return state
+
+    def test_watermark_tracks_latest_comment(self):
+        state = self._state()
+        self.assertEqual(state["context_last_comment_id"], 11)
+        self.assertEqual(state["context_last_comment_at"], "2025-10-09T01:00:00Z")
+
+    def test_resume_payload_only_contains_new_comments(self):
+        comments = self.comments + [
+            {"id": 12, "created_at": "2025-10-09T02:00:00Z", "user": {"login": "carol"}, "body": "fresh comment"},
+        ]
+        payload = pwm.assemble_payload(
+            self.cfg, "owner/repo", self.issue, comments, None, self.trigger, self._state(), True, "sess123", "issue"
+        )
+        self.assertIn("fresh comment", payload)
+        self.assertNotIn("old comment", payload)
+        self.assertNotIn("original body", payload)
+        self.assertIn("(unchanged since last run)", payload)
+        self.assertIn("NEW ISSUE COMMENTS SINCE LAST RUN", payload)
+
+    def test_edited_body_is_resent(self):
+        issue = dict(self.issue, body="edited body")
+        payload = pwm.assemble_payload(
+            self.cfg, "owner/repo", issue, self.comments, None, self.trigger, self._state(), True, "sess123", "issue"
+        )
+        self.assertIn("edited body", payload)
+
+    def test_different_session_gets_full_context(self):
+        payload = pwm.assemble_payload(
+            self.cfg, "owner/repo", self.issue, self.comments, None, self.trigger, self._state(), True, "other999", "issue"
+        )
+        self.assertIn("old comment", payload)
+        self.assertIn("original body", payload)
+
+
+class FakeGitHub:
+    """In-memory stand-in for ``pwm.GitHub`` used by the poll loop tests."""
+
+    def __init__(self, comments=(), review_comments=(), issues=None):
+        self.comments = list(comments)
+        self.review_comments = list(review_comments)
+        self.issues = dict(issues or {})
+        self.posted = []
+        self.reactions = []
+        self.review_reactions = []
+        self.calls = []
+
+    def list_issue_comments_since(self, repo, since_iso, per_page=100):
+        return list(self.comments)
+
+    def list_review_comments_since(self, repo, since_iso, per_page=100):
+        return list(self.review_comments)
+
+    def list_issues_since(self, repo, since_iso, per_page=100):
+        return list(self.issues.values())
+
+    def get_issue(self, repo, number):
+        self.calls.append(("get_issue", number))
+        return self.issues[number]
+
+    def list_issue_comments(self, repo, number):
+        self.calls.append(("list_issue_comments", number))
+        return [c for c in self.comments if c["issue_url"].endswith(f"/{number}")]
+
+    def post_issue_comment(self, repo, number, body):
+        self.posted.append((number, body))
+        return {}
+
+    def add_reaction_to_comment(self, repo, comment_id, content):
+        self.reactions.append(comment_id)
+        return True
+
+    def add_reaction_to_review_comment(self, repo, comment_id, content):
+        self.review_reactions.append(comment_id)
+        return True
+
+    def repository_dispatch(self, repo, event_type, payload):
+        return None
+
+
+def _comment(cid, number, body, created_at="2025-10-09T00:00:00Z", login="alice"):
+    return {
+        "id": cid,
+        "issue_url": f"https://api.github.com/repos/owner/repo/issues/{number}",
+        "user": {"login": login},
+        "created_at": created_at,
+        "body": body,
+    }
+
+
+class PollLoopTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        root = Path(self.tmp.name)
+        self.cfg = pwm.Config(token="token", root=root)
+        self.cfg.codex_cmd = "mock"
+        self.cfg.default_resume = False
+        self.st = pwm.State(root / "state.json")
+        self.st.ensure_repo("owner/repo", root)
+        self.meta = self.st.data["repos"]["owner/repo"]
+        patcher = mock.patch.object(pwm, "run_external", return_value=(0, "## Result\nDone", ""))
+        self.run_external = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_ctx(self, gh):
+        self.cfg.write_interval = 0
+        outbox = pwm.build_outbox(self.cfg, gh)
+        return pwm.LoopContext(
+            cfg=self.cfg,
+            gh=gh,
+            st=self.st,
+            me="relay-bot",
+            trigger_re=pwm.re.compile("codexe", pwm.re.I),
+            outbox=outbox,
+        )
+
+
+class TriggerCoalescingTests(PollLoopTestCase):
+    def test_multiple_triggers_on_one_thread_run_once(self):
+        gh = FakeGitHub(
+            comments=[
+                _comment(1, 5, "codexe fix the tests", "2025-10-09T00:00:01Z"),
+                _comment(2, 5, "codexe also update docs", "2025-10-09T00:00:02Z"),
+                _comment(3, 5, "codexe and the changelog", "2025-10-09T00:00:03Z"),
+                _comment(4, 5, "unrelated chatter", "2025-10-09T00:00:04Z"),
+            ],
+            issues={5: {"number": 5, "title": "Thread", "body": "", "id": 500}},
+        )
+        ctx = self.make_ctx(gh)
+        pwm.poll_repo(ctx, "owner/repo", self.meta)
+        ctx.outbox.drain()
+
+        self.assertEqual(self.run_external.call_count, 1)
+        payload = self.run_external.call_args[0][2]
+        for text in ("fix the tests", "also update docs", "and the changelog"):
+            self.assertIn(text, payload)
+        self.assertIn("TRIGGER COMMENT BODIES (3", payload)
+        self.assertEqual(sorted(gh.reactions), [1, 2, 3])
+        self.assertEqual(len(gh.posted), 1)
+        processed = self.meta["processed_comment_ids"]
+        self.assertEqual([cid for cid in range(1, 6) if cid in processed], [1, 2, 3, 4])
+        self.assertEqual(self.meta["pending_triggers"], {})
+        self.assertEqual(self.meta["runs"]["5"]["coalesced"], 3)
+
+    def test_debounce_window_defers_run(self):
+        self.cfg.coalesce_seconds = 60
+        gh = FakeGitHub(
+            comments=[_comment(1, 5, "codexe go")],
+            issues={5: {"number": 5, "title": "Thread", "body": "", "id": 500}},
+        )
+        pwm.poll_repo(self.make_ctx(gh), "owner/repo", self.meta)
+        self.assertEqual(self.run_external.call_count, 0)
+        self.assertIn("5", self.meta["pending_triggers"])
+        self.assertNotIn(1, self.meta["processed_comment_ids"])
+
+        later = self.meta["pending_triggers"]["5"][0]["queued_at"] + 61
+        self.assertEqual(pwm.ready_conversations(self.meta, 60, now=later), ["5"])
+
+    def test_latest_explicit_intent_wins(self):
+        self.assertEqual(pwm.merge_intents(["codexe new", "codexe please"]), ("new", None))
+        self.assertEqual(pwm.merge_intents(["codexe new", "codexe resume abc123"]), ("resume", "abc123"))
+
+
+class JobMetricsTests(PollLoopTestCase):
+    def test_job_run_records_metrics(self):
+        from RepoRelay import metrics
+
+        exits = metrics.JOB_EXITS.value(code=0)
+        parts = metrics.COMMENT_PARTS.value()
+        latency = metrics.TRIGGER_LATENCY.count(repo="owner/repo")
+        gh = FakeGitHub(
+            comments=[_comment(1, 5, "codexe go", "2025-10-09T00:00:01Z")],
+            issues={5: {"number": 5, "title": "Thread", "body": "", "id": 500}},
+        )
+        pwm.poll_repo(self.make_ctx(gh), "owner/repo", self.meta)
+
+        self.assertEqual(metrics.JOB_EXITS.value(code=0), exits + 1)
+        self.assertEqual(metrics.COMMENT_PARTS.value(), parts + 1)
+        self.assertEqual(metrics.TRIGGER_LATENCY.count(repo="owner/repo"), latency + 1)
+
+    def test_job_phases_are_traced_by_run_id(self):
+        from RepoRelay import tracing
+
+        self.cfg.trace_path = str(Path(self.tmp.name) / "trace.jsonl")
+        gh = FakeGitHub(
+            comments=[_comment(1, 5, "codexe go")],
+            issues={5: {"number": 5, "title": "Thread", "body": "", "id": 500}},
+        )
+        ctx = self.make_ctx(gh)
+        ctx.tracer = pwm.build_tracer(self.cfg)
+        ctx.outbox = pwm.build_outbox(self.cfg, gh, ctx.tracer)
+        pwm.poll_repo(ctx, "owner/repo", self.meta)
+        ctx.outbox.drain()
+
+        records = tracing.read_records(self.cfg.trace_path)
+        spans = [r["span"] for r in records]
+        for name in ("get_issue", "list_issue_comments", "assemble_payload", "run_external",
+                     "postprocess_stdout", "queue_comment", "job", "deliver_comment"):
+            self.assertIn(name, spans)
+        self.assertEqual({r["run_id"] for r in records}, {self.meta["runs"]["5"]["run_id"]})
+
+
+class _FakeResponse:
+    def __init__(self, payload, status_code=200, headers=None):
+        self._payload = payload
+        self.status_code = status_code
+        self.headers = headers or {}
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        return None
+
+
+class SingleflightTests(unittest.TestCase):
+    def setUp(self):
+        self.gh = pwm.GitHub("token")
+        self.gets = []
+
+        def fake_get(url, params=None, timeout=None, **kwargs):
+            self.gets.append(url)
+            if url.endswith("/comments"):
+                return _FakeResponse([{"id": 1}])
+            return _FakeResponse({"number": int(url.rsplit("/", 1)[1])})
+
+        self.gh.session.get = fake_get
+        self.gh.session.post = lambda *a, **k: _FakeResponse({}, 201)
+
+    def test_repeated_gets_share_one_request_within_cycle(self):
+        self.gh.begin_cycle()
+        self.gh.get_issue("owner/repo", 5)
+        self.gh.get_issue("owner/repo", 5)
+        self.gh.list_issue_comments("owner/repo", 5)
+        self.gh.list_issue_comments("owner/repo", 5)
+        self.assertEqual(len(self.gets), 2)
+        self.gh.end_cycle()
+
+        self.gh.get_issue("owner/repo", 5)
+        self.assertEqual(len(self.gets), 3)
+
+    def test_posting_invalidates_thread_entries(self):
+        self.gh.begin_cycle()
+        self.gh.list_issue_comments("owner/repo", 5)
+        self.gh.post_issue_comment("owner/repo", 5, "hello")
+        self.gh.list_issue_comments("owner/repo", 5)
+        self.assertEqual(len(self.gets), 2)
+
+    def test_concurrent_callers_share_in_flight_request(self):
+        import threading
+
+        release = threading.Event()
+        calls = []
+
+        def slow_fetch():
+            calls.append(1)
+            release.wait(2)
+            return {"number": 9}
+
+        self.gh.begin_cycle()
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.gh._singleflight(("k",), slow_fetch)))
+            for _ in range(4)
+        ]
+        for t in threads:
+            t.start()
+        release.set()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"number": 9}] * 4)
+
+
 class ResumeDetectionTests(unittest.TestCase):
     def test_extract_resume_flag(self):
         self.assertTrue(pwm.extract_resume_flag("Please resume"))
@@ -124,6 +416,46 @@ class IntentParsingTests(unittest.TestCase):
     def test_resume_without_id_case_insensitive(self):
         self.assertEqual(pwm.extract_intent("CoDeXe RESUME"), ("resume", None))
 
+    def test_keyword_must_follow_trigger_on_same_line(self):
+        self.assertEqual(pwm.extract_intent("new idea\ncodexe please"), ("default", None))
+        self.assertEqual(pwm.extract_intent("codexe\nnew"), ("default", None))
+        self.assertEqual(pwm.extract_intent("hi\ncodexe resume x resume abc1234"), ("resume", "abc1234"))
+        self.assertEqual(pwm.extract_intent("codexe resume\nabc1234"), ("resume", "abc1234"))
+
+    def test_cancel_intent_is_the_word_after_the_trigger(self):
+        self.assertEqual(pwm.extract_intent("codexe cancel"), ("cancel", None))
+        self.assertEqual(pwm.extract_intent("Oops.\nCODEXE  Cancel please"), ("cancel", None))
+        self.assertEqual(pwm.extract_intent("codexe new: cancel the old flag"), ("new", None))
+
+
+class PathologicalInputTests(unittest.TestCase):
+    """Inputs that made the old regexes or splitting quadratic must stay fast."""
+
+    def assertFast(self, fn, budget=2.0):
+        started = time.perf_counter()
+        result = fn()
+        self.assertLess(time.perf_counter() - started, budget)
+        return result
+
+    def test_parent_lookup_with_long_whitespace_runs(self):
+        body = "intro\n" + " \n" * 200_000 + "parent of this is #12"
+        self.assertEqual(self.assertFast(lambda: pwm.find_parent_issue_number(body)), 12)
+        self.assertEqual(pwm.find_parent_issue_number("Parent:\n  #7"), 7)
+
+    def test_intent_with_many_mentions_on_one_line(self):
+        text = "codexe " * 50_000 + "resume abc123456"
+        self.assertEqual(self.assertFast(lambda: pwm.extract_intent(text)), ("resume", "abc123456"))
+
+    def test_split_large_text_without_breaks(self):
+        text = "x" * (5 * 1024 * 1024)
+        parts = self.assertFast(lambda: pwm._split_for_github_comments(text))
+        self.assertEqual("".join(parts), text)
+        self.assertTrue(all(len(p) <= 65000 for p in parts))
+
+    def test_run_id_in_large_transcript(self):
+        text = "exec\nbash -lc 'ls'\n" * 500_000 + "Run ID: RUN-123456\n"
+        self.assertEqual(self.assertFast(lambda: pwm.extract_codex_run_id(text)), "RUN-123456")
+
 
 class RunIdExtractionTests(unittest.TestCase):
     def test_extracts_from_run_id_line(self):
@@ -136,6 +468,28 @@ class RunIdExtractionTests(unittest.TestCase):
     def test_extracts_from_json_blob(self):
         self.assertEqual(pwm.extract_codex_run_id('{"id": "xyz_42"}'), "xyz_42")
 
+    def test_matches_the_reference_patterns(self):
+        def reference(text):
+            for pat in pwm._RUN_ID_PATTERNS:
+                match = pat.search(text)
+                if match:
+                    return match.group(1)
+            return None
+
+        cases = [
+            "mysession: session=abcdef12",
+            "xrun id: run_id: abcdef12",
+            "xrun id: abcdef12",
+            "Session = ABC-123456 and run-id: zzzzzz99",
+            "resume with codex resume 123456\nRun ID: later-1",
+            "preresume with: codex resume 123456",
+            '{"id": "xyz_42"} then session: abcdefgh',
+            "sessionid: short session:toolongbutok",
+            "nothing here",
+        ]
+        for text in cases:
+            self.assertEqual(pwm.extract_codex_run_id(text), reference(text), text)
+
 
 class CommandSelectionTests(unittest.TestCase):
     def setUp(self):
@@ -290,6 +644,84 @@ class WatermarkComputationTests(unittest.TestCase):
         self.assertEqual(result, "2025-10-02T00:00:00Z")
 
 
+    def test_server_date_with_overlap_wins_over_batch(self):
+        result = pwm._compute_new_since(
+            "2025-10-01T00:00:00Z",
+            ([{"updated_at": "2025-10-09T04:00:00Z"}],),
+            server_date="2025-10-09T05:00:00Z",
+            overlap=10,
+        )
+        self.assertEqual(result, "2025-10-09T04:59:50Z")
+
+    def test_watermark_never_moves_backwards(self):
+        previous = "2025-10-09T05:00:00Z"
+        self.assertEqual(pwm._compute_new_since(previous, (), "2025-10-09T05:00:03Z", overlap=5), previous)
+
+    def test_server_time_parses_http_date(self):
+        self.assertEqual(pwm._server_time({"Date": "Thu, 09 Oct 2025 05:00:00 GMT"}), "2025-10-09T05:00:00Z")
+        self.assertIsNone(pwm._server_time({"Date": "garbage"}))
+        self.assertIsNone(pwm._server_time({}))
+
+
+class ClockedGitHub(FakeGitHub):
+    """``FakeGitHub`` with GitHub's ``since`` filtering and a controllable server clock."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.server_now = "2025-10-09T00:00:00Z"
+        self.last_list_date = None
+        self.fetched = []
+
+    def list_issue_comments_since(self, repo, since_iso, per_page=100):
+        self.last_list_date = self.server_now
+        batch = [c for c in self.comments if c["updated_at"] >= since_iso]
+        self.fetched.append((since_iso, [c["id"] for c in batch]))
+        return batch
+
+    def list_review_comments_since(self, repo, since_iso, per_page=100):
+        self.last_list_date = self.server_now
+        return [c for c in self.review_comments if c["updated_at"] >= since_iso]
+
+
+class ServerClockWatermarkTests(PollLoopTestCase):
+    def _add(self, gh, cid, ts, body="chatter"):
+        gh.comments.append(dict(_comment(cid, 5, body, ts), updated_at=ts))
+
+    def test_watermark_follows_server_clock_despite_local_skew(self):
+        self.cfg.since_overlap_seconds = 5
+        gh = ClockedGitHub(issues={5: {"number": 5, "title": "Thread", "body": "", "id": 500}})
+        self.meta["last_since"] = "2025-10-09T00:00:00Z"
+        self._add(gh, 1, "2025-10-09T00:00:10Z")
+        gh.server_now = "2025-10-09T00:01:00Z"
+        ctx = self.make_ctx(gh)
+        # the local clock runs an hour fast; it must not be used for the watermark
+        with mock.patch.object(pwm, "_now_utc", return_value="2025-10-09T01:00:00Z"):
+            pwm.poll_repo(ctx, "owner/repo", self.meta)
+            self.assertEqual(self.meta["last_since"], "2025-10-09T00:00:55Z")
+
+            # a late-visible comment stamped inside the overlap and a new trigger are both seen
+            self._add(gh, 2, "2025-10-09T00:00:57Z", "codexe late but visible")
+            self._add(gh, 3, "2025-10-09T00:01:30Z")
+            gh.server_now = "2025-10-09T00:02:00Z"
+            pwm.poll_repo(ctx, "owner/repo", self.meta)
+        ctx.outbox.drain()
+
+        self.assertEqual(gh.fetched[1], ("2025-10-09T00:00:55Z", [2, 3]))
+        self.assertEqual(self.run_external.call_count, 1)
+        self.assertIn("late but visible", self.run_external.call_args[0][2])
+        self.assertEqual(self.meta["last_since"], "2025-10-09T00:01:55Z")
+
+    def test_quiet_cycles_refetch_nothing(self):
+        gh = ClockedGitHub()
+        self.meta["last_since"] = "2025-10-09T00:00:00Z"
+        self._add(gh, 1, "2025-10-09T00:00:10Z")
+        ctx = self.make_ctx(gh)
+        for minute in range(1, 4):
+            gh.server_now = f"2025-10-09T00:0{minute}:00Z"
+            pwm.poll_repo(ctx, "owner/repo", self.meta)
+        self.assertEqual([ids for _, ids in gh.fetched], [[1], [], []])
+
+
 class SubprocessEnvTests(unittest.TestCase):
     def test_build_subprocess_env_scrubs_github_token(self):
         with mock.patch.dict(
@@ -316,5 +748,141 @@ class SubprocessEnvTests(unittest.TestCase):
             self.assertEqual(env.get("GITHUB_TOKEN"), "secret")
 
 
+class _CancelGitHub(FakeGitHub):
+    def __init__(self, cancel_comment, review=False, **kwargs):
+        super().__init__(**kwargs)
+        self.cancel_comment = cancel_comment
+        self.review = review
+        self.polls = []
+
+    def poll_thread_comments(self, repo, number, since_iso, etag="", review=False):
+        self.polls.append(review)
+        return ([self.cancel_comment] if review == self.review else []), "etag"
+
+
+class CancelTests(PollLoopTestCase):
+    def test_cancel_stops_the_running_job_and_posts_partial_output(self):
+        self.cfg.cancel_poll_seconds = 0.01
+        gh = _CancelGitHub(
+            _comment(2, 5, "codexe cancel", "2025-10-09T00:00:05Z", login="bob"),
+            comments=[_comment(1, 5, "codexe go", "2025-10-09T00:00:01Z")],
+            issues={5: {"number": 5, "title": "Thread", "body": "", "id": 500}},
+        )
+
+        def run(*args, cancel=None, stopped=None, **kwargs):
+            self.assertTrue(cancel.wait(5))
+            stopped.set()
+            return -15, "half done", ""
+
+        self.run_external.side_effect = run
+        ctx = self.make_ctx(gh)
+        pwm.poll_repo(ctx, "owner/repo", self.meta)
+        ctx.outbox.drain()
+        self.assertIn("was cancelled by @bob. Output so far:\n\nhalf done", gh.posted[-1][1])
+        self.assertEqual(self.meta["issue_runs"]["5"]["status"], "cancelled")
+        self.assertEqual(self.meta["runs"]["5"]["status"], "cancelled")
+        self.assertEqual(gh.reactions, [2])
+        self.assertIn(2, self.meta["processed_comment_ids"])
+        self.assertNotIn(True, gh.polls)
+
+    def test_cancel_after_the_command_finished_keeps_the_result(self):
+        self.cfg.cancel_poll_seconds = 0.01
+        gh = _CancelGitHub(
+            _comment(2, 5, "codexe cancel", "2025-10-09T00:00:05Z", login="bob"),
+            comments=[_comment(1, 5, "codexe go", "2025-10-09T00:00:01Z")],
+            issues={5: {"number": 5, "title": "Thread", "body": "", "id": 500}},
+        )
+
+        def run(*args, cancel=None, stopped=None, **kwargs):
+            # the cancel lands after the command exited on its own: run_external never stopped it
+            self.assertTrue(cancel.wait(5))
+            return 0, "## Result\nDone", ""
+
+        self.run_external.side_effect = run
+        ctx = self.make_ctx(gh)
+        pwm.poll_repo(ctx, "owner/repo", self.meta)
+        ctx.outbox.drain()
+        self.assertNotIn("was cancelled", gh.posted[-1][1])
+        self.assertIn("Done", gh.posted[-1][1])
+        self.assertEqual(self.meta["issue_runs"]["5"]["status"], "ok")
+
+    def test_review_comment_cancels_a_running_pull_request_job(self):
+        self.cfg.cancel_poll_seconds = 0.01
+        gh = _CancelGitHub(
+            {"id": 3, "body": "codexe cancel", "user": {"login": "bob"}, "created_at": "2025-10-09T00:00:05Z",
+             "pull_request_url": "https://api.github.com/repos/owner/repo/pulls/5"},
+            review=True,
+            comments=[_comment(1, 5, "codexe go", "2025-10-09T00:00:01Z")],
+            issues={5: {"number": 5, "title": "PR", "body": "", "id": 500, "pull_request": {"url": "https://api.github.com/repos/owner/repo/pulls/5"}}},
+        )
+
+        def run(*args, cancel=None, stopped=None, **kwargs):
+            self.assertTrue(cancel.wait(5))
+            stopped.set()
+            return -15, "", ""
+
+        self.run_external.side_effect = run
+        ctx = self.make_ctx(gh)
+        pwm.poll_repo(ctx, "owner/repo", self.meta)
+        ctx.outbox.drain()
+        self.assertIn("was cancelled by @bob.", gh.posted[-1][1])
+        self.assertEqual(self.meta["pr_runs"]["5"]["status"], "cancelled")
+        self.assertEqual((gh.reactions, gh.review_reactions), ([], [3]))
+        self.assertIn(3, self.meta["processed_review_comment_ids"])
+
+    def test_cancel_at_intake_drops_queued_triggers(self):
+        self.cfg.coalesce_seconds = 60
+        gh = FakeGitHub(comments=[_comment(1, 5, "codexe go", "2025-10-09T00:00:01Z")])
+        ctx = self.make_ctx(gh)
+        pwm.poll_repo(ctx, "owner/repo", self.meta)
+        self.assertIn("5", self.meta["pending_triggers"])
+        gh.comments.append(_comment(2, 5, "codexe cancel", "2025-10-09T00:00:02Z"))
+        pwm.poll_repo(ctx, "owner/repo", self.meta)
+        ctx.outbox.drain()
+        self.assertEqual(self.meta["pending_triggers"], {})
+        self.assertEqual(self.run_external.call_count, 0)
+        self.assertEqual(gh.reactions, [2])
+        self.assertIn(1, self.meta["processed_comment_ids"])
+
+
+class RunExternalCancelTests(unittest.TestCase):
+    def test_cancel_kills_the_process_group_and_keeps_output(self):
+        script = (
+            "import subprocess, sys, time\n"
+            "subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])\n"
+            "print('partial', flush=True)\n"
+            "time.sleep(60)\n"
+        )
+        cancel, stopped = pwm.threading.Event(), pwm.threading.Event()
+        timer = pwm.threading.Timer(1.0, cancel.set)
+        timer.start()
+        self.addCleanup(timer.cancel)
+        started = time.monotonic()
+        with tempfile.TemporaryDirectory() as tmp:
+            rc, out, _err = pwm.run_external(sys.executable, ["-c", script], None, 60, Path(tmp), cancel=cancel, grace=1.0,
+                                             stopped=stopped)
+        # the grandchild holds stdout too, so returning at all means the whole group is gone
+        self.assertLess(time.monotonic() - started, 20)
+        self.assertEqual(out.strip(), "partial")
+        self.assertNotEqual(rc, 0)
+        self.assertTrue(stopped.is_set())
+
+    def test_cancel_after_exit_does_not_mark_the_run_stopped(self):
+        cancel, stopped = pwm.threading.Event(), pwm.threading.Event()
+        with tempfile.TemporaryDirectory() as tmp:
+            rc, out, _err = pwm.run_external(sys.executable, ["-c", "print('done')"], None, 30, Path(tmp),
+                                             cancel=cancel, stopped=stopped)
+        cancel.set()
+        time.sleep(0.6)
+        self.assertEqual((rc, out.strip()), (0, "done"))
+        self.assertFalse(stopped.is_set())
+
+    def test_timeout_still_reports_124(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            rc, out, err = pwm.run_external(sys.executable, ["-c", "import time; time.sleep(30)"], "", 1, Path(tmp), grace=0.5)
+        self.assertEqual((rc, out), (124, ""))
+        self.assertIn("timed out after 1s", err)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,166 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import requests
+
+from RepoRelay import watcher as pwm
+from RepoRelay import webhook as wh
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "webhooks"
+SECRET = "s3cret"
+
+
+def _fixture(name):
+    data = json.loads((FIXTURES / name).read_text())
+    return data["event"], data["delivery"], json.dumps(data["payload"]).encode("utf-8")
+
+
+class _GitHub:
+    """Just enough of ``pwm.GitHub`` for jobs started by replayed deliveries."""
+
+    def __init__(self):
+        self.posted = []
+        self.reactions = []
+
+    def get_issue(self, repo, number):
+        issue = {"number": number, "title": "Flaky tests", "body": "", "id": number * 100,
+                 "created_at": "2025-10-09T00:00:00Z", "updated_at": "2025-10-09T00:05:00Z"}
+        if number == 6:
+            issue["pull_request"] = {"url": "https://api.github.com/repos/owner/repo/pulls/6"}
+        return issue
+
+    def list_issue_comments(self, repo, number):
+        return []
+
+    def post_issue_comment(self, repo, number, body):
+        self.posted.append((number, body))
+        return {}
+
+    def add_reaction_to_comment(self, repo, comment_id, content):
+        self.reactions.append(comment_id)
+        return True
+
+    add_reaction_to_review_comment = add_reaction_to_comment
+
+
+class SignatureTests(unittest.TestCase):
+    def test_verify_signature(self):
+        body = b'{"action": "created"}'
+        good = wh.signature(SECRET.encode(), body)
+        self.assertTrue(wh.verify_signature(SECRET.encode(), body, good))
+        self.assertFalse(wh.verify_signature(SECRET.encode(), body + b" ", good))
+        self.assertFalse(wh.verify_signature(SECRET.encode(), body, None))
+        self.assertFalse(wh.verify_signature(b"", body, good))
+
+    def test_normalize_fixtures(self):
+        cases = {
+            "issue_comment.created.json": ("issue_comment", 7001),
+            "pull_request_review_comment.created.json": ("pr_review_comment", 8001),
+            "issues.opened.json": ("issue", 900),
+        }
+        for name, (source, record_id) in cases.items():
+            event, delivery, body = _fixture(name)
+            item = wh.normalize(event, json.loads(body), delivery)
+            self.assertEqual((item.repo, item.source, item.record.id), ("owner/repo", source, record_id))
+        closed = wh.normalize("issues", dict(json.loads(_fixture("issues.opened.json")[2]), action="closed"))
+        self.assertEqual((closed.source, closed.action), ("issue", "closed"))
+        self.assertIsNone(wh.normalize("issue_comment", {"action": "deleted", "repository": {"full_name": "o/r"}}))
+        self.assertIsNone(wh.normalize("push", {"action": "created"}))
+
+
+class ReceiverHTTPTests(unittest.TestCase):
+    def setUp(self):
+        self.receiver = wh.WebhookReceiver(SECRET, port=0)
+        self.receiver.start()
+        self.addCleanup(self.receiver.stop)
+        self.url = f"http://127.0.0.1:{self.receiver.port}/"
+
+    def _post(self, event, body, sig):
+        headers = {"X-GitHub-Event": event, "X-GitHub-Delivery": "d-1", "Content-Type": "application/json"}
+        if sig:
+            headers["X-Hub-Signature-256"] = sig
+        return requests.post(self.url, data=body, headers=headers, timeout=5)
+
+    def test_signed_delivery_is_queued(self):
+        event, _, body = _fixture("issue_comment.created.json")
+        r = self._post(event, body, wh.signature(SECRET.encode(), body))
+        self.assertEqual(r.status_code, 202)
+        item = self.receiver.get(timeout=1)
+        self.assertEqual(item.record.body, "codexe please fix the flaky test")
+
+    def test_bad_signature_and_ping(self):
+        event, _, body = _fixture("issue_comment.created.json")
+        self.assertEqual(self._post(event, body, "sha256=" + "0" * 64).status_code, 401)
+        self.assertEqual(self._post(event, body, None).status_code, 401)
+        ping = b'{"zen": "Keep it logically awesome."}'
+        self.assertEqual(self._post("ping", ping, wh.signature(SECRET.encode(), ping)).status_code, 200)
+        self.assertIsNone(self.receiver.get(timeout=0))
+
+
+class ReplayTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        root = Path(self.tmp.name)
+        self.cfg = pwm.Config(token="token", root=root)
+        self.cfg.codex_cmd = "mock"
+        self.cfg.default_resume = False
+        self.cfg.write_interval = 0
+        self.st = pwm.State(root / "state.json")
+        self.st.ensure_repo("owner/repo", root)
+        self.repos = {"owner/repo": root}
+        self.gh = _GitHub()
+        self.ctx = pwm.LoopContext(
+            cfg=self.cfg, gh=self.gh, st=self.st, me="relay-bot",
+            trigger_re=pwm.re.compile("codexe", pwm.re.I), outbox=pwm.build_outbox(self.cfg, self.gh),
+        )
+        self.receiver = wh.WebhookReceiver(SECRET)
+        patcher = mock.patch.object(pwm, "run_external", return_value=(0, "## Result\nDone", ""))
+        self.run_external = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _replay(self, name, times=1):
+        event, delivery, body = _fixture(name)
+        for _ in range(times):
+            self.assertEqual(self.receiver.accept(event, body, wh.signature(SECRET.encode(), body), delivery)[0], 202)
+
+    def _drain(self):
+        pwm.drain_webhook_events(self.ctx, self.receiver, self.repos, pwm.time.monotonic() + 0.2, {"flag": False})
+        self.ctx.outbox.drain()
+
+    def test_redelivered_comment_runs_once(self):
+        self._replay("issue_comment.created.json", times=2)
+        self._drain()
+        self.assertEqual(self.run_external.call_count, 1)
+        self.assertIn("codexe please fix the flaky test", self.run_external.call_args[0][2])
+        self.assertEqual(self.gh.reactions, [7001])
+        self.assertIn(7001, self.st.data["repos"]["owner/repo"]["processed_comment_ids"])
+
+        # a later redelivery hits the processed ids, as the reconciliation poll would
+        self._replay("issue_comment.created.json")
+        self._drain()
+        self.assertEqual(self.run_external.call_count, 1)
+
+    def test_review_comment_and_issue_events(self):
+        self._replay("pull_request_review_comment.created.json")
+        self._replay("issues.opened.json")  # ignored unless REPORELAY_MATCH_TARGET=issue_or_comments
+        self._drain()
+        self.assertEqual(self.run_external.call_count, 1)
+        self.assertIn("path=src/app.py", self.run_external.call_args[0][2])
+
+        self.cfg.match_target = "issue_or_comments"
+        self._replay("issues.opened.json")
+        self._drain()
+        self.assertEqual(self.run_external.call_count, 2)
+
+    def test_events_for_unknown_repos_are_ignored(self):
+        event, delivery, body = _fixture("issue_comment.created.json")
+        item = wh.normalize(event, dict(json.loads(body), repository={"full_name": "someone/else"}), delivery)
+        self.assertFalse(pwm.handle_webhook_event(self.ctx, item, self.repos))
+
+
+if __name__ == "__main__":
+    unittest.main()